@@ -28,5 +28,5 @@ if __name__ == '__main__':
         args.i
     )
 
-    rf = corp.raw_frequency(args.n, args.t, args.b)
-    rf.take_freq(args.k.split(","), args.n)
\ No newline at end of file
+    rf = corp.raw_frequency(args.n, args.k.split(","), args.t, args.d, args.b)
+    rf.take_frequencies()
\ No newline at end of file
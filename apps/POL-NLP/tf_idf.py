@@ -34,7 +34,7 @@ if __name__ == '__main__':
         date_key=args.d
     )
 
-    results = [tfidf.top_n(k.lower(), int(args.n)) for k in args.k.split(",")]
+    results = tfidf.top_n([k.lower() for k in args.k.split(",")], int(args.n))
 
     for r in results:
         r.display()
@@ -0,0 +1,267 @@
+import tqdm
+import numpy as np
+
+from array import array
+from collections.abc import Mapping
+
+from corpus.utils import *
+
+
+CACHE_DIR = ".corpus_cache"
+CACHE_VERSION = 1
+DEFAULT_FIELDS = ['Text', 'Stemmed', 'Filtered', 'Filtered Stemmed']
+
+
+class CachedVolume(Mapping):
+    """
+    Read-only view of a single volume stored in a CorpusCache. Metadata fields
+    are held in memory, token fields are decoded from the memory-mapped id
+    arrays only when they are accessed.
+    """
+
+    def __init__(self, cache, index: int):
+
+        self.cache = cache
+        self.index = index
+
+    def __getitem__(self, key):
+
+        meta = self.cache.volume_table[self.index][2]
+
+        if key in meta:
+            return meta[key]
+
+        if key in self.cache.ids and key not in self.cache.volume_table[self.index][3]:
+            return self.cache.tokens(key, self.index)
+
+        raise KeyError(key)
+
+    def __iter__(self):
+
+        missing = self.cache.volume_table[self.index][3]
+
+        for k in self.cache.volume_table[self.index][2]:
+            yield k
+
+        for f in self.cache.fields:
+            if f not in missing:
+                yield f
+
+    def __len__(self):
+
+        return sum(1 for _ in self)
+
+
+class CorpusCache:
+    """
+    Integer-encoded columnar store of a corpus. Holds a vocabulary shared by all
+    cached text fields, one flat memory-mapped token id array (and offsets array)
+    per field, and a volume table with the non-list fields (Date, Author, Title, ...)
+    of every volume.
+    """
+
+    def __init__(self, in_dir: str, header: dict, vocab: np.ndarray, volume_table: list):
+
+        self.in_dir = in_dir
+        self.header = header
+        self.fields = header["fields"]
+        self.files = header["files"]
+        self.vocab = vocab
+        self.volume_table = volume_table
+
+        # non-list fields held in the volume table, e.g. Date, Author & Title
+        self.meta_fields = set(k for v in volume_table for k in v[2])
+
+        self.ids = {}
+        self.offsets = {}
+
+        path = self.cache_path(in_dir)
+
+        for i, f in enumerate(self.fields):
+
+            ids_path = "{0}/{1}.ids".format(path, i)
+
+            if os.path.getsize(ids_path) > 0:
+                self.ids[f] = np.memmap(ids_path, dtype=np.int32, mode='r')
+            else:
+                self.ids[f] = np.zeros(0, dtype=np.int32)
+
+            self.offsets[f] = np.load("{0}/{1}.offsets.npy".format(path, i), mmap_mode='r')
+
+    @staticmethod
+    def cache_path(in_dir: str):
+        """
+        Location of the cache for a corpus directory.
+        """
+
+        return os.path.join(in_dir, CACHE_DIR)
+
+    @classmethod
+    def load(cls, in_dir: str):
+        """
+        Load the cache for a corpus, returns None if none has been built.
+        """
+
+        path = cls.cache_path(in_dir)
+
+        if not os.path.exists("{}/header.json".format(path)):
+            return None
+
+        with open("{}/header.json".format(path), 'r', encoding='utf8') as in_file:
+            header = json.load(in_file)
+
+        if header.get("version") != CACHE_VERSION:
+            return None
+
+        with open("{}/vocab.json".format(path), 'r', encoding='utf8') as in_file:
+            terms = json.load(in_file)
+            vocab = np.empty(len(terms), dtype=object)
+            vocab[:] = terms
+
+        with open("{}/volumes.json".format(path), 'r', encoding='utf8') as in_file:
+            volume_table = json.load(in_file)
+
+        return cls(in_dir, header, vocab, volume_table)
+
+    @classmethod
+    def build(cls, in_dir: str, fields: [list, None] = None):
+        """
+        Convert a directory of JSON volumes into a columnar cache, stored in a
+        hidden directory at the root of the corpus.
+        """
+
+        if fields is None:
+            fields = DEFAULT_FIELDS
+
+        path = cls.cache_path(in_dir)
+        build_out(path)
+
+        vocab = {}
+        terms = []
+        volume_table = []
+        files = {}
+
+        streams = [open("{0}/{1}.ids".format(path, i), 'wb') for i in range(len(fields))]
+        offsets = [array('q', [0]) for _ in fields]
+
+        print("Building corpus cache at {}".format(path))
+
+        try:
+            for json_doc in tqdm.tqdm(list_volume_files(in_dir)):
+
+                stat = file_stat(in_dir, json_doc)
+                json_data = read_volume_file(in_dir, json_doc)
+
+                if json_data is None:
+                    continue
+
+                first = len(volume_table)
+
+                for k in list(json_data.keys()):
+
+                    volume = json_data[k]
+                    meta = {kk: v for kk, v in volume.items() if not isinstance(v, (list, dict))}
+                    missing = []
+
+                    for i, f in enumerate(fields):
+
+                        if isinstance(volume.get(f), list):
+                            ids = cls._encode(volume[f], vocab, terms)
+                            streams[i].write(ids.tobytes())
+                            offsets[i].append(offsets[i][-1] + len(ids))
+
+                        else:
+                            missing.append(f)
+                            offsets[i].append(offsets[i][-1])
+
+                    volume_table.append([json_doc, k, meta, missing])
+
+                files[json_doc] = [first, len(volume_table)] + stat
+
+        finally:
+            for s in streams:
+                s.close()
+
+        for i in range(len(fields)):
+            np.save("{0}/{1}.offsets.npy".format(path, i), np.frombuffer(offsets[i], dtype=np.int64))
+
+        with open("{}/vocab.json".format(path), 'w', encoding='utf8') as out_file:
+            json.dump(terms, out_file, ensure_ascii=False)
+
+        with open("{}/volumes.json".format(path), 'w', encoding='utf8') as out_file:
+            json.dump(volume_table, out_file, ensure_ascii=False)
+
+        # header is written last, so an interrupted build is never loaded
+        with open("{}/header.json".format(path), 'w', encoding='utf8') as out_file:
+            json.dump({"version": CACHE_VERSION, "fields": fields, "files": files}, out_file, ensure_ascii=False)
+
+        return cls.load(in_dir)
+
+    @staticmethod
+    def _encode(tokens: list, vocab: dict, terms: list):
+        """
+        Map a list of tokens to an array of vocabulary ids, extending the vocabulary as needed.
+        """
+
+        ret = np.empty(len(tokens), dtype=np.int32)
+
+        for i, t in enumerate(tokens):
+
+            tid = vocab.get(t)
+
+            if tid is None:
+                tid = vocab[t] = len(terms)
+                terms.append(t)
+
+            ret[i] = tid
+
+        return ret
+
+    def is_fresh(self, json_doc: str):
+        """
+        Check whether a volume file is cached and unchanged since the cache was built.
+        """
+
+        entry = self.files.get(json_doc)
+
+        if entry is None:
+            return False
+
+        try:
+            return entry[2:] == file_stat(self.in_dir, json_doc)
+        except OSError:
+            return False
+
+    def covers(self, fields: [set, list, None]):
+        """
+        Check whether every one of a set of fields is cached, either as a token field or as
+        metadata. None, for readers that need every field of a volume, is never covered.
+        """
+
+        if fields is None:
+            return False
+
+        return set(fields) <= set(self.fields) | self.meta_fields
+
+    def token_ids(self, field: str, index: int):
+        """
+        Return the memory-mapped token id array of a field for a single volume.
+        """
+
+        return self.ids[field][self.offsets[field][index]:self.offsets[field][index + 1]]
+
+    def tokens(self, field: str, index: int):
+        """
+        Decode the tokens of a field for a single volume.
+        """
+
+        return self.vocab[self.token_ids(field, index)].tolist()
+
+    def volumes(self, json_doc: str):
+        """
+        Return (key, volume) pairs for all cached volumes in a file.
+        """
+
+        first, last = self.files[json_doc][0], self.files[json_doc][1]
+
+        return [(self.volume_table[i][1], CachedVolume(self, i)) for i in range(first, last)]
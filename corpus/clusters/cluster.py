@@ -1,117 +1,334 @@
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from scipy.cluster.hierarchy import dendrogram, linkage, fcluster
 from sklearn import manifold
+from sklearn.decomposition import PCA
 from kneed import KneeLocator
+from multiprocessing import Pool
+from collections.abc import Mapping
 
+import hashlib
 import numpy as np
 import matplotlib.pyplot as plt
 
 from corpus.results import *
 
+try:
+    import openTSNE
+except ImportError:
+    openTSNE = None
 
-class AuthorCluster:
+
+# values of k per warm-started run of the elbow search, fixed so that results don't depend on the number of workers
+WARM_START_RUN = 8
+
+# periods given too few authors to search for a knee, or with no knee, get this many clusters
+DEFAULT_NUM_CLUSTERS = 3
+
+
+def _seed_centers(mat: np.ndarray, centers: [np.ndarray, None], k: int, rng: np.random.Generator):
     """
-    Base class for author-partitioned corpus clusters.
+    Extend a set of cluster centers to <k> centers by greedy k-means++ seeding: each new
+    center is the best, by resulting inertia, of a few rows of mat sampled with probability
+    proportional to their squared distance to the nearest existing center. Without any
+    centers, this is k-means++ seeding from scratch.
     """
 
-    def __init__(self, scores_record: [str, ScoreMatResults]):
+    if centers is None or len(centers) == 0:
+        centers = mat[[rng.integers(len(mat))]]
 
-        if isinstance(scores_record, ScoreMatResults):
-            self.scores_mat = scores_record.d["scores"]
-            self.year_list = scores_record.y
-            self.key_list = scores_record.k
+    centers = centers[:k]
+    d2 = np.full(len(mat), np.inf)
 
-        elif isinstance(scores_record, str):
-            self.load_scores_from_file(scores_record)
+    for c in centers:
+        d2 = np.minimum(d2, ((mat - c) ** 2).sum(axis=1))
+
+    new = [centers]
+    n_trials = 2 + int(np.log(k))
 
+    for _ in range(k - len(centers)):
+
+        total = d2.sum()
+
+        if total > 0:
+            trials = rng.choice(len(mat), size=n_trials, p=d2 / total)
         else:
-            raise Exception("Must pass either ScoreMatResults object or filepath to ScoreMatResults JSON.\n")
+            trials = rng.integers(len(mat), size=1)
 
-        params = self.setup_vectors()
+        trial_d2 = [np.minimum(d2, ((mat - mat[i]) ** 2).sum(axis=1)) for i in trials]
+        best = int(np.argmin([t.sum() for t in trial_d2]))
 
-        self.nonzero_authors = params["NONZERO_AUTHORS"]
-        self.nonzero_mat = params["NONZERO_MAT"]
-        self.omitted_authors = params["OMITTED_AUTHORS"]
+        new.append(mat[[trials[best]]])
+        d2 = trial_d2[best]
 
-        self.tsne = self.compute_tsne()
+    return np.concatenate(new)
 
-    def load_scores_from_file(self, path):
+
+def _fit_ks(args):
+    """
+    Worker for the elbow search. Fits k means for an increasing run of values of k,
+    returning (k, inertia, centers) for each. With warm starts, each fit is initialized
+    from the centers of the previous one (or of init_centers), plus new seeded centers.
+    """
+
+    mat, ks, init_centers, warm_start, mini_batch, seed = args
+
+    rng = np.random.default_rng(seed)
+    centers = init_centers
+    ret = []
+
+    for k in ks:
+
+        if warm_start:
+            init = _seed_centers(mat, centers, k, rng)
+        else:
+            init = 'k-means++'
+
+        random_state = int(rng.integers(2 ** 31))
+
+        if mini_batch:
+            model = MiniBatchKMeans(n_clusters=k, init=init, n_init=1, random_state=random_state)
+        else:
+            model = KMeans(n_clusters=k, init=init, n_init=1, random_state=random_state)
+
+        model.fit(mat)
+        centers = model.cluster_centers_
+        ret.append((k, float(model.inertia_), centers))
+
+    return ret
+
+
+def _embed(args):
+    """
+    Worker for Embeddings. Embed the rows of a score matrix in two dimensions.
+    """
+
+    mat, method = args
+
+    if method == 'tsne':
+        return manifold.TSNE(n_components=2, init='pca', random_state=0).fit_transform(mat)
+
+    if method == 'opentsne':
+        return np.asarray(openTSNE.TSNE(n_components=2, random_state=0, n_jobs=1).fit(mat))
+
+    # matrices with a single keyword or author have fewer than two components, padded with zeros
+    n = min(2, mat.shape[0], mat.shape[1])
+    ret = np.zeros((mat.shape[0], 2))
+    ret[:, :n] = PCA(n_components=n).fit_transform(mat)
+
+    return ret
+
+
+class Embeddings(Mapping):
+    """
+    Two dimensional embeddings of each period's author score matrix, for graphing
+    clusters. Nothing is computed until a period's embedding is first accessed, at
+    which point every period is embedded, across <workers> processes.
+
+    method is one of 'tsne' (scikit-learn's Barnes-Hut t-SNE), 'opentsne' (openTSNE's
+    FFT-accelerated t-SNE, much faster on large periods, if installed) or 'pca'.
+    Given a cache_path, embeddings are saved to and loaded from a compressed NumPy
+    archive, which is ignored once the score matrices it was computed from change.
+    """
+
+    methods = ('tsne', 'opentsne', 'pca')
+
+    def __init__(self, mats: dict, method: str = 'tsne', workers: int = 1, cache_path: [str, None] = None):
+
+        if method not in self.methods:
+            raise Exception("{0} is not an embedding, choose one of {1}.\n".format(method, ", ".join(self.methods)))
+
+        if method == 'opentsne' and openTSNE is None:
+            raise Exception("openTSNE is not installed.\n")
+
+        # filter out empty entries
+        self.mats = {y: m for y, m in mats.items() if len(m) > 0}
+        self.method = method
+        self.workers = workers
+        self.cache_path = cache_path
+
+        self.embeddings = None
+
+    def key(self):
         """
-        Load dictionary that stores author matrices from JSON file.
+        Hash of the score matrices and embedding method.
         """
 
-        with open(path, 'r', encoding='utf8') as in_file:
-
-            data = json.load(in_file)
+        h = hashlib.sha1(self.method.encode('utf8'))
 
-            self.scores_mat = data["scores"]
-            self.year_list = data["metadata"]["YEARS"]
-            self.key_list = data["metadata"]["KEYS"]
+        for y in self.mats.keys():
+            mat = np.asarray(self.mats[y], dtype=np.float64)
+            h.update(json.dumps([str(y), list(mat.shape)]).encode('utf8'))
+            h.update(mat.tobytes())
 
-        return self
+        return h.hexdigest()
 
-    @staticmethod
-    def check_nonzero(word_scores):
+    def _load(self, key: str):
         """
-        Check whether all word scores for an entry are 0.
+        Load embeddings from cache_path, or return None if there are none for these score matrices.
         """
 
-        return sum([t[1] > 0 for t in word_scores.items()])
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return None
 
-    @staticmethod
-    def format_scores_entry(word_scores):
+        with np.load(self.cache_path) as data:
+
+            if str(data["key"]) != key:
+                return None
+
+            return {y: data["period_{}".format(y)] for y in self.mats.keys()}
+
+    def _save(self, key: str):
         """
-        Transform dict of word scores to a list.
+        Write embeddings to cache_path. Embeddings that can't be written are silently not cached.
         """
 
-        return [word_scores[k] for k in sorted(word_scores.keys())]
+        arrays = {"period_{}".format(y): e for y, e in self.embeddings.items()}
 
-    def setup_vectors(self):
+        try:
+            np.savez_compressed(self.cache_path, key=np.array(key), **arrays)
+        except OSError:
+            pass
+
+        return self
+
+    def compute(self):
         """
-        Set up vectors corresponding to authors with at least one positive score
-        for all keywords, and omitted authors who have all scores == 0.
+        Embed every period, unless embeddings for these score matrices are cached.
         """
 
-        ret = {}
+        key = self.key()
 
-        nonzero_authors = {}
-        nonzero_mat = {}
-        omitted = {}
+        self.embeddings = self._load(key)
 
-        for y in self.scores_mat.keys():
+        if self.embeddings is not None:
+            return self
 
-            ret[y] = {}
-            omitted[y] = []
+        years = list(self.mats.keys())
+        args = [(np.asarray(self.mats[y], dtype=np.float64), self.method) for y in years]
 
-            for a in self.scores_mat[y].keys():
+        print("Computing {0} embeddings of {1} periods".format(self.method, len(years)))
 
-                if self.check_nonzero(self.scores_mat[y][a]):
-                    ret[y][a] = self.format_scores_entry(self.scores_mat[y][a])
+        if self.workers > 1 and len(years) > 1:
+            with Pool(min(self.workers, len(years))) as pool:
+                results = pool.map(_embed, args)
+        else:
+            results = [_embed(a) for a in args]
 
-                else:
-                    omitted[y].append(a)
+        self.embeddings = dict(zip(years, results))
 
-            nonzero_authors[y] = sorted(ret[y].keys())
-            nonzero_mat[y] = [ret[y][a] for a in nonzero_authors[y]]
+        if self.cache_path is not None:
+            self._save(key)
 
-        return {"NONZERO_AUTHORS": nonzero_authors, "NONZERO_MAT": nonzero_mat, "OMITTED_AUTHORS": omitted}
+        return self
 
-    def compute_tsne(self):
+    def __getitem__(self, year):
+
+        if year not in self.mats:
+            raise KeyError(year)
+
+        if self.embeddings is None:
+            self.compute()
+
+        return self.embeddings[year]
+
+    def __iter__(self):
+
+        return iter(self.mats)
+
+    def __len__(self):
+
+        return len(self.mats)
+
+
+def _link(args):
+    """
+    Worker for HierarchicalAuthorCluster.set_z. Compute the linkage matrix of a score matrix,
+    returning (Z, members). Matrices with more than max_leaves rows are first reduced to
+    max_leaves k means micro-clusters, and linkage is run on their centroids. members then
+    maps each row to its micro-cluster (a leaf of Z), and is otherwise None.
+    """
+
+    mat, method, max_leaves = args
+
+    if max_leaves is None or len(mat) <= max_leaves:
+        return linkage(mat, method=method), None
+
+    km = MiniBatchKMeans(n_clusters=max_leaves, n_init=1, random_state=0).fit(mat)
+
+    # micro-clusters left empty aren't leaves
+    used, members = np.unique(km.labels_, return_inverse=True)
+
+    return linkage(km.cluster_centers_[used], method=method), members
+
+
+class AuthorCluster:
+    """
+    Base class for author-partitioned corpus clusters.
+    """
+
+    def __init__(self, scores_record: [str, ScoreMatResults], embedding: str = 'tsne', workers: int = 1):
+
+        cache_path = None
+
+        if isinstance(scores_record, ScoreMatResults):
+            self.scores = scores_record
+
+        elif isinstance(scores_record, str):
+            self.load_scores_from_file(scores_record)
+            cache_path = "{0}.{1}.npz".format(os.path.splitext(scores_record)[0], embedding)
+
+        else:
+            raise Exception("Must pass either ScoreMatResults object or filepath to ScoreMatResults JSON or NPZ.\n")
+
+        self.year_list = self.scores.y
+        self.key_list = self.scores.k
+
+        params = self.setup_vectors()
+
+        self.nonzero_authors = params["NONZERO_AUTHORS"]
+        self.nonzero_mat = params["NONZERO_MAT"]
+        self.omitted_authors = params["OMITTED_AUTHORS"]
+
+        # computed on first access, i.e. when results are graphed
+        self.tsne = Embeddings(self.nonzero_mat, embedding, workers, cache_path)
+
+    def load_scores_from_file(self, path):
         """
-        Compute TSNE for each year period.
+        Load author score matrices from a JSON or NPZ file.
         """
 
-        ret = {}
+        self.scores = ScoreMatResults.from_file(path)
 
-        for y in self.nonzero_mat.keys():
+        return self
 
-            # filter out empty entries
-            if len(self.nonzero_mat[y]) > 0:
+    def setup_vectors(self):
+        """
+        Set up matrices of authors with at least one positive score
+        for all keywords, and arrays of omitted authors who have all scores == 0.
+        """
 
-                tsne = manifold.TSNE(n_components=2, init='pca', random_state=0)
-                ret[y] = tsne.fit_transform(self.nonzero_mat[y])
+        nonzero_authors = {}
+        nonzero_mat = {}
+        omitted = {}
 
-        return ret
+        for y in self.scores.mats.keys():
+
+            mat = self.scores.mats[y]
+            authors = self.scores.authors[y]
+            nonzero = (mat > 0).any(axis=1)
+
+            nonzero_authors[y] = authors[nonzero]
+            nonzero_mat[y] = mat[nonzero]
+            omitted[y] = authors[~nonzero]
+
+        return {"NONZERO_AUTHORS": nonzero_authors, "NONZERO_MAT": nonzero_mat, "OMITTED_AUTHORS": omitted}
+
+    def compute_tsne(self):
+        """
+        Compute embeddings for each year period.
+        """
+
+        return self.tsne.compute().embeddings
 
     def _dict_from_clusters_list(self, num_clusters_list: list):
         """
@@ -133,19 +350,140 @@ class KMeansAuthorCluster(AuthorCluster):
     K Means clustering for author-partitioned corpus clusters.
     """
 
-    def __init__(self, scores_record):
+    def __init__(self, scores_record, embedding: str = 'tsne', workers: int = 1):
+
+        super(KMeansAuthorCluster, self).__init__(scores_record, embedding, workers)
+
+    @staticmethod
+    def _k_schedule(max_ks: int, schedule: str):
+        """
+        Values of k to evaluate, out of 1 ... max_ks - 1. The linear schedule takes every
+        value, the geometric (and the first round of the bisection) schedule takes
+        values spaced by a factor of about 1.25.
+        """
+
+        if schedule == 'linear':
+            return list(range(1, max_ks))
+
+        if schedule in ('geometric', 'bisection'):
+            num = int(np.ceil(np.log(max_ks - 1) / np.log(1.25))) + 1
+            return sorted(set(int(round(k)) for k in np.geomspace(1, max_ks - 1, num)))
+
+        raise Exception("{} is not a k schedule, choose one of linear, geometric or bisection.\n".format(schedule))
+
+    @staticmethod
+    def _knee(fits: dict):
+        """
+        Find the knee of the inertia curve over the values of k fitted so far, or None if there isn't one.
+        """
+
+        ks = sorted(fits.keys())
+
+        try:
+            return KneeLocator(ks, [fits[k][0] for k in ks], curve='convex', direction='decreasing').knee
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _fit(pool: [Pool, None], mat: np.ndarray, runs: list, warm_start: bool, mini_batch: bool,
+             seed: [int, None], fits: dict):
+        """
+        Fit each run of values of k, given as (ks, initial centers), across a pool of processes if
+        one is given, adding (inertia, centers) for each k to fits.
+        """
+
+        seeds = np.random.SeedSequence(seed).spawn(len(runs))
+        args = [
+            (mat, ks, centers, warm_start, mini_batch, int(s.generate_state(1)[0]))
+            for (ks, centers), s in zip(runs, seeds)
+        ]
+
+        results = pool.map(_fit_ks, args) if pool is not None else [_fit_ks(a) for a in args]
+
+        for run in results:
+            for k, inertia, centers in run:
+                fits[k] = (inertia, centers)
+
+        return fits
 
-        super(KMeansAuthorCluster, self).__init__(scores_record)
+    def _search(self, pool: [Pool, None], mat: np.ndarray, schedule: str, warm_start: bool,
+                mini_batch: bool, seed: [int, None]):
+        """
+        Find the number of clusters at the knee of the inertia curve of a single period.
+        """
+
+        ks = self._k_schedule(int(len(mat) / 4), schedule)
+
+        # contiguous runs of k, so that each fit within a run is warm-started from the last
+        runs = [([int(k) for k in ks[i:i + WARM_START_RUN]], None) for i in range(0, len(ks), WARM_START_RUN)]
+        fits = self._fit(pool, mat, runs, warm_start, mini_batch, seed, {})
+
+        knee = self._knee(fits)
+
+        while schedule == 'bisection' and knee is not None:
+
+            # evaluate midpoints between the knee and its neighbours, until they're adjacent
+            ks = sorted(fits.keys())
+            i = ks.index(knee)
+            mids = set((knee + ks[j]) // 2 for j in (i - 1, i + 1) if 0 <= j < len(ks))
+            mids = sorted(m for m in mids if m not in fits)
+
+            if len(mids) == 0:
+                break
+
+            runs = []
+
+            for m in mids:
+                lower = [k for k in ks if k < m]
+                runs.append(([m], fits[lower[-1]][1] if warm_start and len(lower) > 0 else None))
+
+            self._fit(pool, mat, runs, warm_start, mini_batch, seed, fits)
+
+            knee = self._knee(fits)
+
+        return knee
 
-    def generate_num_clusters(self):
+    @staticmethod
+    def _cache_key(mat: np.ndarray, params: dict):
+        """
+        Hash of a score matrix and the parameters of a search over it.
         """
-        Generate ideal number of clusters for K Means.
+
+        h = hashlib.sha1()
+        h.update(json.dumps([list(mat.shape), params], sort_keys=True).encode('utf8'))
+        h.update(np.ascontiguousarray(mat).tobytes())
+
+        return h.hexdigest()
+
+    def generate_num_clusters(self, schedule: str = 'linear', workers: int = 1, mini_batch: [int, None] = None,
+                              warm_start: bool = True, seed: [int, None] = None, cache_path: [str, None] = None):
+        """
+        Generate ideal number of clusters for K Means, at the knee (elbow) of the curve of
+        k means inertia against the number of clusters, for k up to a quarter of the number
+        of authors.
+
+        schedule sets which values of k are fitted: every one ('linear'), a geometric
+        progression ('geometric'), or a geometric progression refined by bisection around
+        its knee ('bisection'). Fits are spread over <workers> processes. With warm_start,
+        each fit is initialized from the centers found for the previous value of k, rather
+        than fitted from scratch. Periods with at least <mini_batch> authors are clustered
+        with MiniBatchKMeans. Given a seed, the result doesn't depend on the number of
+        workers. If cache_path is given, the chosen number of clusters is cached in a JSON
+        file there, against a hash of each period's score matrix and the search parameters.
 
         TODO: Right now, entries with too few datapoints are automatically
         given num_clusters=3. This needs to be replaced with something more intelligent.
         """
 
         ret = {}
+        cache = {}
+
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf8') as in_file:
+                cache = json.load(in_file)
+
+        params = {"schedule": schedule, "mini_batch": mini_batch, "warm_start": warm_start, "seed": seed}
+        pending = {}
 
         for y in self.nonzero_mat.keys():
 
@@ -155,25 +493,38 @@ class KMeansAuthorCluster(AuthorCluster):
                 # filter entries that are too small for clustering
                 if max_ks > 4:
 
-                    all_ks = [i for i in range(1, max_ks)]
-                    errors = np.zeros(max_ks-1)
+                    mat = np.asarray(self.nonzero_mat[y], dtype=np.float64)
+                    mb = mini_batch is not None and len(mat) >= mini_batch
+                    key = self._cache_key(mat, dict(params, mini_batch=mb))
 
-                    for k in all_ks:
+                    if key in cache:
+                        ret[y] = cache[key]
+                    else:
+                        pending[y] = (key, mat, mb)
 
-                        temp_kmeans = KMeans(init='k-means++', n_clusters=k)
-                        temp_kmeans.fit_predict(self.nonzero_mat[y])
-                        errors[k-1] = temp_kmeans.inertia_
+                else:
+                    ret[y] = DEFAULT_NUM_CLUSTERS
 
-                    try:
-                        kn = KneeLocator(all_ks, errors, curve='convex', direction='decreasing')
-                        ret[y] = kn.knee
-                    except ValueError:
-                        ret[y] = 3
+        if len(pending) == 0:
+            return {y: ret[y] for y in self.nonzero_mat.keys() if y in ret}
 
-                else:
-                    ret[y] = 3
+        pool = Pool(workers) if workers > 1 else None
 
-        return ret
+        try:
+            for y, (key, mat, mb) in pending.items():
+                knee = self._search(pool, mat, schedule, warm_start, mb, seed)
+                ret[y] = cache[key] = int(knee) if knee is not None else DEFAULT_NUM_CLUSTERS
+
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if cache_path is not None:
+            with open(cache_path, 'w', encoding='utf8') as out_file:
+                json.dump(cache, out_file)
+
+        return {y: ret[y] for y in self.nonzero_mat.keys() if y in ret}
 
     def _cluster(self, num_clusters_dict: dict):
         """
@@ -190,13 +541,17 @@ class KMeansAuthorCluster(AuthorCluster):
 
         return ret
 
-    def fit_clusters(self, num_clusters: [list, None] = None):
+    def fit_clusters(self, num_clusters: [list, None] = None, schedule: str = 'linear', workers: int = 1,
+                     mini_batch: [int, None] = None, seed: [int, None] = None, cache_path: [str, None] = None):
         """
-        Fit K Means cluster and return ClusterResults object.
+        Fit K Means cluster and return ClusterResults object. Without num_clusters, the number
+        of clusters of each period is found by generate_num_clusters, given the other arguments.
         """
 
         if num_clusters is None:
-            num_clusters_dict = self.generate_num_clusters()
+            num_clusters_dict = self.generate_num_clusters(
+                schedule=schedule, workers=workers, mini_batch=mini_batch, seed=seed, cache_path=cache_path
+            )
 
         else:
             num_clusters_dict = self._dict_from_clusters_list(num_clusters)
@@ -209,30 +564,40 @@ class KMeansAuthorCluster(AuthorCluster):
 class HierarchicalAuthorCluster(AuthorCluster):
     """
     Hierarchical clustering for author-partitioned corpus clusters.
+
+    Linkage over n authors takes O(n^2) memory. Given max_leaves, periods with more
+    authors than that are first reduced to max_leaves k means micro-clusters, linkage
+    is run on their centroids (unweighted by their sizes), and each author takes the
+    cluster of its micro-cluster. Periods are linked across <workers> processes.
     """
 
-    def __init__(self, scores_record):
+    def __init__(self, scores_record, embedding: str = 'tsne', workers: int = 1, max_leaves: [int, None] = None):
 
-        super(HierarchicalAuthorCluster, self).__init__(scores_record)
+        super(HierarchicalAuthorCluster, self).__init__(scores_record, embedding, workers)
+
+        self.workers = workers
+        self.max_leaves = max_leaves
 
         self.z = None
+        self.members = None
 
     def set_z(self, method: [str, None] = 'ward'):
         """
         Set Z values for each year period.
         """
 
-        ret = {}
+        # filter out empty entries
+        years = [y for y in self.nonzero_mat.keys() if len(self.nonzero_mat[y]) > 0]
+        args = [(self.nonzero_mat[y], method, self.max_leaves) for y in years]
 
-        for y in self.nonzero_mat.keys():
-
-            # filter out empty entries
-            if len(self.nonzero_mat[y]) > 0:
-
-                nonzero_np = np.array([np.array(i) for i in self.nonzero_mat[y]])
-                ret[y] = linkage(nonzero_np, method=method)
+        if self.workers > 1 and len(years) > 1:
+            with Pool(min(self.workers, len(years))) as pool:
+                results = pool.map(_link, args)
+        else:
+            results = [_link(a) for a in args]
 
-        self.z = ret
+        self.z = {y: r[0] for y, r in zip(years, results)}
+        self.members = {y: r[1] for y, r in zip(years, results)}
 
         return self
 
@@ -249,6 +614,10 @@ class HierarchicalAuthorCluster(AuthorCluster):
             if len(self.nonzero_mat[y]) > 0:
                 ret[y] = fcluster(self.z[y], cutoffs_dict[y], 'distance')
 
+                # labels of micro-clusters, assigned back to their authors
+                if self.members[y] is not None:
+                    ret[y] = ret[y][self.members[y]]
+
         return ret
 
     def fit_clusters(self, cutoffs_list: list):
@@ -264,25 +633,56 @@ class HierarchicalAuthorCluster(AuthorCluster):
 
         return ClusterResults(labels, self.tsne, self.nonzero_authors, self.omitted_authors, self.key_list)
 
-    def _generate_dendrograms(self, out_dir, y):
+    def _leaf_labels(self, y):
+        """
+        Label each leaf of a period's dendrogram with its author or, for micro-clusters, its
+        first author and the number of others.
+        """
+
+        authors = self.nonzero_authors[y]
+
+        if self.members[y] is None:
+            return authors.tolist()
+
+        ret = []
+
+        for leaf in range(len(self.z[y]) + 1):
+
+            leaf_authors = authors[self.members[y] == leaf]
+            ret.append("{0} (+{1})".format(leaf_authors[0], len(leaf_authors) - 1))
+
+        return ret
+
+    def _generate_dendrograms(self, out_dir, y, truncate: [int, None] = None):
         """
         Generate dendrogram plot and save to file.
         """
 
-        authors_np = [i for i in self.nonzero_authors[y]]
+        authors_np = self._leaf_labels(y)
+
+        if truncate is not None and len(authors_np) > truncate:
+
+            # only the last <truncate> merges are drawn, leaves show the number of authors under them
+            figlen = truncate / 9
+            fig = plt.figure(figsize=(15, figlen))
+            dn = dendrogram(self.z[y], orientation='left', truncate_mode='lastp', p=truncate, leaf_font_size=9)
+
+        else:
 
-        figlen = len(self.nonzero_mat[y]) / 9
-        fig = plt.figure(figsize=(15, figlen))
+            figlen = len(authors_np) / 9
+            fig = plt.figure(figsize=(15, figlen))
 
-        # matplotlib is awful
-        dn = dendrogram(self.z[y], orientation='left', labels=authors_np, leaf_font_size=9)
+            # matplotlib is awful
+            dn = dendrogram(self.z[y], orientation='left', labels=authors_np, leaf_font_size=9)
 
         plt.tight_layout()
         plt.savefig("{0}/{1}".format(out_dir, str(y)), dpi=200)
+        plt.close(fig)
 
-    def generate_dendrograms(self, out_dir):
+    def generate_dendrograms(self, out_dir, truncate: [int, None] = 500):
         """
-        Generate all dendrogram plots and save to directory.
+        Generate all dendrogram plots and save to directory. Dendrograms with more
+        than <truncate> leaves are truncated to their top <truncate> clusters.
         """
 
         build_out(out_dir)
@@ -294,4 +694,4 @@ class HierarchicalAuthorCluster(AuthorCluster):
 
             # filter out empty entries
             if len(self.nonzero_mat[y]) > 0:
-                self._generate_dendrograms(out_dir, y)
+                self._generate_dendrograms(out_dir, y, truncate)
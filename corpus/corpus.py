@@ -1,21 +1,110 @@
 import nltk
-import tqdm
 
 from corpus.nlp import frequency, tf_idf, topic_model, raw_frequency
+from corpus.cache import CorpusCache
+from corpus.index import InvertedIndex
+from corpus.result_cache import ResultCache, DEFAULT_MAX_BYTES
+from corpus.scan import CorpusScanner, VolumeConsumer
 from corpus.utils import *
 
 
+class KeysConsumer(VolumeConsumer):
+    """
+    Collects the set of keys used across the volumes of a corpus.
+    """
+
+    def __init__(self):
+
+        self.keys = set()
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        for k in volume.keys():
+            self.keys.add(k)
+
+
+class SubCorpusConsumer(VolumeConsumer):
+    """
+    Writes snippets around keyword occurrences to a sub-corpus during a corpus scan.
+    """
+
+    def __init__(self, corpus, output_dir: str, key_list: list, text_type: str,
+                 date_key: str, doc_size: int, y_min: int, y_max: int, hits: [dict, None] = None):
+
+        self.corpus = corpus
+        self.output_dir = output_dir
+        self.key_list = key_list
+        self.key_set = set(key_list)
+        self.n = corpus.detect_n(key_list)
+        self.text_type = text_type
+        self.date_key = date_key
+        self.doc_size = doc_size
+        self.y_min = y_min
+        self.y_max = y_max
+        self.hits = hits
+
+        self.index = 0
+        self.subindex = 0
+        self.file_numbers = None
+
+    def fields(self):
+
+        return [self.text_type, self.date_key, "Title", "Author"]
+
+    def start(self):
+
+        # number files by their place in the whole corpus, so that output names
+        # don't depend on whether only the files holding keywords are read
+        self.file_numbers = {f: i + 1 for i, f in enumerate(list_volume_files(self.corpus.in_dir))}
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        self.index = self.file_numbers[json_doc]
+
+        year = int(volume[self.date_key])
+
+        if self.y_min <= year <= self.y_max:
+
+            title = volume["Title"]
+            author = volume["Author"]
+
+            if self.hits is not None and (json_doc, key) not in self.hits:
+                return
+
+            text = list(nltk.ngrams(volume[self.text_type], self.n))
+
+            if self.hits is None:
+                positions = [i for i in range(len(text)) if text[i] in self.key_set]
+            else:
+                positions = self.hits[(json_doc, key)]
+
+            for i in positions:
+
+                self.subindex += 1
+                out_text = text[(i - int(self.doc_size/2)):(i + int(self.doc_size/2))]
+
+                self.corpus._write_extract(
+                    self.output_dir, self.key_list, year, self.index,
+                    self.subindex, title, author, out_text
+                )
+
+
 class Corpus:
     """
     Base class for NLP sub-classes. Defines name of corpus, input path to directory
     of volumes, name of text field to be analyzed, list of years to group the corpus
     over, and (optionally) a list of key words to be analyzed.
+
+    With use_cache, analysis results are cached in a hidden directory at the root of
+    the corpus (see result_cache.ResultCache), bounded to cache_size bytes, and
+    repeated calls with unchanged volumes & parameters return the cached result.
     """
 
-    def __init__(self, name: str, in_dir: str):
+    def __init__(self, name: str, in_dir: str, use_cache: bool = False, cache_size: [int, None] = DEFAULT_MAX_BYTES):
 
         self.name = name
         self.in_dir = in_dir
+        self.cache = ResultCache.for_corpus(in_dir, cache_size) if use_cache else None
 
     def debug_str(self):
         """
@@ -24,50 +113,75 @@ class Corpus:
 
         return '{0} at {1}'.format(self.name, self.in_dir)
 
-    def _debug_corpus_keys(self, json_doc):
+    def scan(self, consumers: list):
         """
-        Display keys from the JSON volumes in a corpus
+        Read and parse each volume in the corpus once, feeding it to every consumer
+        in a list. Consumers are obtained from analysis objects, e.g.:
+
+            corp.scan([freq.frequency_consumer(1), tfidf.dictionary_consumer()])
         """
 
-        ret = []
+        CorpusScanner(self.in_dir, consumers).run()
 
-        with open(self.in_dir + "/" + json_doc, 'r', encoding='utf8') as in_file:
+        return self
 
-            try:
+    def build_cache(self, fields: [list, None] = None):
+        """
+        Convert the corpus into an integer-encoded columnar cache. Once built, all
+        analyses read unchanged volumes from the cache instead of parsing JSON.
+        fields defaults to Text, Stemmed, Filtered & Filtered Stemmed.
+        """
 
-                json_data = json.load(in_file)
-                for k in list(json_data.keys()):
-                    for kk in json_data[k].keys():
-                        ret.append(kk)
+        CorpusCache.build(self.in_dir, fields)
 
-            except json.decoder.JSONDecodeError:
+        return self
 
-                print("Error loading file {}".format(json_doc))
+    def build_index(self, text_types: [list, None] = None):
+        """
+        Build a positional inverted index for each of a list of text fields (Text by default).
+        Keyword queries (Tfidf.top_n, build_sub_corpus & RawFrequency) on an indexed field
+        then read only the volumes containing their keywords, for as long as the corpus
+        is unchanged.
+        """
 
-        return ret
+        if text_types is None:
+            text_types = ['Text']
 
-    def debug_corpus_keys(self):
+        for t in text_types:
+            InvertedIndex.build(self.in_dir, t)
+
+        return self
+
+    def clear_result_cache(self):
         """
-        Display keys from the JSON volumes in a corpus
+        Remove every cached analysis result of this corpus, whether or not it currently uses the cache.
         """
 
-        ret_keys = set()
+        if self.cache is not None:
+            self.cache.clear()
+        else:
+            ResultCache.for_corpus(self.in_dir).clear()
 
-        for subdir, dirs, files in os.walk(self.in_dir):
-            for json_doc in tqdm.tqdm(files):
-                if json_doc[0] != ".":
+        return self
 
-                    k = self._debug_corpus_keys(json_doc)
-                    for kk in k:
-                        ret_keys.add(kk)
+    def debug_corpus_keys(self):
+        """
+        Display keys from the JSON volumes in a corpus
+        """
+
+        consumer = KeysConsumer()
+        self.scan([consumer])
 
-        for k in ret_keys:
+        for k in consumer.keys:
             print(k)
 
     def frequency(self, name: str, year_list: list, text_type: str = 'Text',
-                  date_key: [None, str] = "Date", stop_words: [list, set, str, None] = None):
+                  date_key: [None, str] = "Date", stop_words: [list, set, str, None] = None,
+                  workers: int = 1, max_n: int = 1):
         """
         Measure keyword frequency as a percentage of total words across a corpus.
+        With workers > 1, frequency records are built across that many processes.
+        Counts for every n-gram length up to max_n are built in a single pass.
         """
 
         f = frequency.Frequency(
@@ -76,15 +190,22 @@ class Corpus:
             text_type,
             year_list,
             date_key,
-            stop_words
+            stop_words,
+            workers,
+            max_n,
+            self.cache
         )
 
         return f
 
     def tf_idf(self, name: str, year_list: list, text_type: str = 'Text',
-               date_key: [None, str] = "Date", stop_words: [list, set, None] = None):
+               date_key: [None, str] = "Date", stop_words: [list, set, None] = None,
+               corpus_dir: [str, None] = None, no_below: [int, None] = None, no_above: [float, None] = None,
+               keep_n: [int, None] = None):
         """
         Find documents with highest TF-IDF scores w/r/t a keyword within a corpus.
+        With corpus_dir set, bag of words corpora are streamed to disk there. With
+        any of no_below, no_above or keep_n set, each period's vocabulary is pruned.
         """
 
         t = tf_idf.Tfidf(
@@ -93,12 +214,18 @@ class Corpus:
             text_type,
             year_list,
             date_key,
-            stop_words
+            stop_words,
+            corpus_dir,
+            no_below,
+            no_above,
+            keep_n,
+            self.cache
         )
 
         return t
 
-    def raw_frequency(self, name: str, text_type: str = 'Text', date_key: str = "Date", binary: bool = False):
+    def raw_frequency(self, name: str, keys: list, text_type: str = 'Text', date_key: str = "Date",
+                      binary: bool = False):
         """
         Build raw frequency tables for a corpus. Returned object is used for
         difference in proportions testing.
@@ -108,15 +235,21 @@ class Corpus:
             name,
             self.in_dir,
             text_type,
+            keys,
+            binary,
             date_key,
-            binary
+            self.cache
         )
 
         return rf
 
-    def topic_model(self, name: str, year_list: list, text_type: str = 'Text', stop_words: [list, set, None] = None):
+    def topic_model(self, name: str, year_list: list, text_type: str = 'Text', date_key: [str, None] = "Date",
+                    stop_words: [list, set, None] = None, corpus_dir: [str, None] = None,
+                    no_below: [int, None] = None, no_above: [float, None] = None, keep_n: [int, None] = None):
         """
         Build generic Topic Model object, on which lda_model() or lsi_model() can be called.
+        With corpus_dir set, bag of words corpora are streamed to disk there. With
+        any of no_below, no_above or keep_n set, each period's vocabulary is pruned.
         """
 
         t = topic_model.TopicModel(
@@ -124,16 +257,26 @@ class Corpus:
             self.in_dir,
             text_type,
             year_list,
-            stop_words
+            date_key,
+            stop_words,
+            corpus_dir,
+            no_below,
+            no_above,
+            keep_n,
+            self.cache
         )
 
         return t
 
     def lda_model(self, name: str, year_list: list, text_type: str = 'Text', num_topics: [int, None] = 10,
                   date_key: [str, None] = "Date", passes: [int, None] = 1, seed: [int, None] = None,
-                  stop_words: [list, set, str, None] = None):
+                  stop_words: [list, set, str, None] = None, workers: int = 1, multicore: bool = False,
+                  corpus_dir: [str, None] = None, no_below: [int, None] = None, no_above: [float, None] = None,
+                  keep_n: [int, None] = None):
         """
-        Build LDA Topic Models for each period within a corpus.
+        Build LDA Topic Models for each period within a corpus. With workers > 1,
+        periods are trained concurrently, or with multicore=True, one after another
+        with gensim's multicore LDA.
         """
 
         t = topic_model.TopicModel(
@@ -142,15 +285,23 @@ class Corpus:
             text_type,
             year_list,
             date_key,
-            stop_words
+            stop_words,
+            corpus_dir,
+            no_below,
+            no_above,
+            keep_n,
+            self.cache
         )
 
-        return t.lda_model(num_topics, passes, seed)
+        return t.lda_model(num_topics, passes, seed, workers, multicore)
 
     def lsi_model(self, name: str, year_list: list, text_type: str = 'Text', num_topics: [int, None] = 10,
-                  stochastic=False, date_key: [str, None] = "Date", stop_words: [list, set, None] = None):
+                  stochastic=False, date_key: [str, None] = "Date", stop_words: [list, set, None] = None,
+                  seed: [int, None] = None, workers: int = 1, corpus_dir: [str, None] = None,
+                  no_below: [int, None] = None, no_above: [float, None] = None, keep_n: [int, None] = None):
         """
-        Build LSI Topic Models for each period within a corpus.
+        Build LSI Topic Models for each period within a corpus. With workers > 1,
+        periods are trained concurrently.
         """
 
         t = topic_model.TopicModel(
@@ -159,10 +310,15 @@ class Corpus:
             text_type,
             year_list,
             date_key,
-            stop_words
+            stop_words,
+            corpus_dir,
+            no_below,
+            no_above,
+            keep_n,
+            self.cache
         )
 
-        return t.lsi_model(num_topics, stochastic)
+        return t.lsi_model(num_topics, stochastic, seed, workers)
 
     @staticmethod
     def detect_n(keys: list):
@@ -211,11 +367,14 @@ class Corpus:
             )
 
     def build_sub_corpus(self, name: str, output_dir: str, key_list: list, text_type: str = 'Text',
-                         date_key: [None, str] = "Year Published", doc_size: int = 20, y_range: [list, None] = None):
+                         date_key: [None, str] = "Year Published", doc_size: int = 20, y_range: [list, None] = None,
+                         use_index: bool = True):
         """
         From a larger corpus, construct a sub-corpus containing
         only instances from a list of keywords, with a user-specified
-        amount of words around the occurrence.
+        amount of words around the occurrence. When an up to date inverted
+        index of the text field has been built, only volumes containing
+        keywords are read.
         """
 
         build_out(output_dir)
@@ -227,43 +386,23 @@ class Corpus:
             y_min = y_range[0]
             y_max = y_range[1]
 
-        index = 0
-        subindex = 0
-
         key_list = build_keys(key_list)
 
-        for subdir, dirs, files in os.walk(self.in_dir):
-
-            print("Building sub-corpora.\n")
+        print("Building sub-corpora.\n")
 
-            for jsondoc in tqdm.tqdm(files):
-                if jsondoc[0] != ".":
+        index = InvertedIndex.load(self.in_dir, text_type) if use_index else None
 
-                    with open(self.in_dir + "/" + jsondoc, 'r', encoding='utf8') as in_file:
-
-                        index += 1
-                        jsonfile = json.load(in_file)
-
-                        for k in list(jsonfile.keys()):
-
-                            jsondata = jsonfile[k]
-                            year = int(jsondata[date_key])
-
-                            if y_min <= year <= y_max:
-
-                                title = jsondata["Title"]
-                                author = jsondata["Author"]
-                                text = list(nltk.ngrams(jsondata[text_type], self.detect_n(key_list)))
-
-                                for i in range(len(text)):
-                                    if text[i] in set(key_list):
+        if index is not None and index.is_fresh():
+            hits = index.hits(key_list)
+            files = sorted(set(f for f, _ in hits.keys()))
+        else:
+            hits = None
+            files = None
 
-                                        subindex += 1
-                                        out_text = text[(i - int(doc_size/2)):(i + int(doc_size/2))]
+        consumer = SubCorpusConsumer(self, output_dir, key_list, text_type, date_key, doc_size, y_min, y_max, hits)
+        CorpusScanner(self.in_dir, [consumer]).run(files)
 
-                                        self._write_extract(
-                                            output_dir, key_list, year, index,
-                                            subindex, title, author, out_text
-                                        )
+        if self.cache is None:
+            return Corpus(name, output_dir, False)
 
-        return Corpus(name, output_dir)
+        return Corpus(name, output_dir, True, self.cache.max_bytes)
@@ -0,0 +1,184 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+class JsonDecoder:
+    """
+    Decodes volume files with the standard library's json module. Given a list of
+    fields, each volume is projected onto those fields as soon as it is decoded, so
+    the token lists of unused fields are freed one volume at a time instead of being
+    held for the whole file.
+    """
+
+    name = 'json'
+
+    @staticmethod
+    def available():
+
+        return True
+
+    @staticmethod
+    def _project(volume: dict, fields: [set, None]):
+        """
+        Keep only the given fields of a volume.
+        """
+
+        if fields is None:
+            return volume
+
+        return {k: v for k, v in volume.items() if k in fields}
+
+    def decode(self, data: bytes, fields: [set, None] = None):
+        """
+        Decode the contents of a volume file into a dictionary of volumes, each
+        holding only <fields> if given. Raises ValueError if data isn't valid JSON.
+        """
+
+        if fields is None:
+            return json.loads(data.decode('utf8'))
+
+        def hook(pairs):
+
+            obj = dict(pairs)
+
+            # volumes are the only objects holding a projected field, so the
+            # top level object (and anything nested in a dropped field) is kept
+            if any(k in fields for k in obj):
+                return self._project(obj, fields)
+
+            return obj
+
+        return json.loads(data.decode('utf8'), object_pairs_hook=hook)
+
+
+class OrjsonDecoder(JsonDecoder):
+    """
+    Decodes volume files with orjson, several times faster than the standard
+    library. orjson has no lazy decoding, so volumes are projected once decoded.
+    """
+
+    name = 'orjson'
+
+    @staticmethod
+    def available():
+
+        return orjson is not None
+
+    def decode(self, data: bytes, fields: [set, None] = None):
+
+        json_data = orjson.loads(data)
+
+        if fields is None:
+            return json_data
+
+        return {k: self._project(v, fields) if isinstance(v, dict) else v for k, v in json_data.items()}
+
+
+class SimdjsonDecoder(JsonDecoder):
+    """
+    Decodes volume files with pysimdjson. Documents are parsed lazily, so with a list
+    of fields, only those fields of each volume are ever converted to Python objects.
+    """
+
+    name = 'simdjson'
+
+    def __init__(self):
+
+        self.parser = simdjson.Parser() if simdjson is not None else None
+
+    @staticmethod
+    def available():
+
+        return simdjson is not None
+
+    @staticmethod
+    def _convert(value):
+        """
+        Convert a lazily parsed value to Python objects.
+        """
+
+        if isinstance(value, simdjson.Object):
+            return value.as_dict()
+
+        if isinstance(value, simdjson.Array):
+            return value.as_list()
+
+        return value
+
+    def decode(self, data: bytes, fields: [set, None] = None):
+
+        doc = self.parser.parse(data)
+
+        if fields is None or not isinstance(doc, simdjson.Object):
+            return self._convert(doc)
+
+        ret = {}
+
+        # every value is converted before the parser is reused, which invalidates the document
+        for k in doc.keys():
+
+            volume = doc[k]
+
+            if not isinstance(volume, simdjson.Object):
+                ret[k] = self._convert(volume)
+                continue
+
+            ret[k] = {}
+
+            for f in fields:
+                try:
+                    ret[k][f] = self._convert(volume[f])
+                except KeyError:
+                    pass
+
+        return ret
+
+
+DECODERS = {d.name: d for d in [SimdjsonDecoder, OrjsonDecoder, JsonDecoder]}
+
+_default = None
+
+
+def get_decoder(name: [str, None] = None):
+    """
+    Return a decoder by name ('simdjson', 'orjson' or 'json'). Without a name, returns
+    the default decoder: the one set with set_decoder, or else the fastest installed.
+    """
+
+    global _default
+
+    if name is None:
+
+        if _default is None:
+            _default = next(d for d in DECODERS.values() if d.available())()
+
+        return _default
+
+    if name not in DECODERS:
+        raise Exception("{0} is not a JSON decoder, choose one of {1}.\n".format(name, ", ".join(DECODERS.keys())))
+
+    if not DECODERS[name].available():
+        raise Exception("{} is not installed.\n".format(name))
+
+    return DECODERS[name]()
+
+
+def set_decoder(name: str):
+    """
+    Set the decoder used to read volume files by default.
+    """
+
+    global _default
+
+    _default = get_decoder(name)
+
+    return _default
@@ -1,13 +1,22 @@
-import statsmodels.api
 import scipy.stats
 
+import numpy as np
+
+from statsmodels.stats.multitest import multipletests
+
 from corpus.utils import *
-from corpus.results import DiffPropResults
+from corpus.results import DiffPropResults, DiffPropBatchResults
+
+
+# row of the aggregate counts, over all of a corpus's keywords, in batch results
+TOTAL = "All keywords"
 
 
 class DiffProportions:
     """
-    Measure difference in proportions between two corpora.
+    Measure difference in proportions between corpora. take_difference compares
+    two corpora over all of their keywords, take_differences compares every pair
+    of any number of corpora, over each shared keyword and in aggregate, at once.
     """
 
     def __init__(self, name: str, corpora: list, year_list: list):
@@ -15,6 +24,7 @@ class DiffProportions:
         self.name = name
         self.corpora = corpora
         self.year_list = year_list
+        self.periods = PeriodMapper(year_list)
         self.binary = False
 
         self.check_binary()
@@ -37,82 +47,151 @@ class DiffProportions:
 
     def check_corpora(self):
         """
-        Ensure that only two corpora have been passed.
+        Ensure that at least two corpora have been passed.
         """
 
-        assert(len(self.corpora) == 2)
+        assert(len(self.corpora) >= 2)
 
-    def _build_samples(self, corpus):
+    def shared_keywords(self):
         """
-        Build a dictionary of samples data for each corpus.
+        Keywords tracked by every corpus.
         """
 
-        p = num_dict(self.year_list)
-        n = num_dict(self.year_list)
+        keywords = [' '.join(k) for k in self.corpora[0].keys]
 
-        freq = corpus.freq_dict
+        for corpus in self.corpora[1:]:
+            tracked = set(' '.join(k) for k in corpus.keys)
+            keywords = [k for k in keywords if k in tracked]
+
+        return keywords
+
+    def _sample_arrays(self, corpus, keywords: list):
+        """
+        Count the successes & trials of a corpus in each period, for each keyword and for
+        all of the corpus's keywords together. Returns a (len(keywords) + 1) x periods array
+        of successes, with the aggregate counts last, and a trials array for each row.
+        """
 
-        for doc in freq.keys():
+        freq = corpus.freq_dict
+        docs = list(freq.keys())
+        num_periods = len(self.periods)
+        num_rows = len(keywords) + 1
 
-            year = freq[doc]['Date']
+        dates = np.array([freq[doc]['Date'] for doc in docs], dtype=np.int64)
 
-            if self.year_list[0] < year < self.year_list[-1]:
-                target = determine_year(year, self.year_list)
-                key_records = freq[doc]['Frequencies']
+        # per-keyword counts, with the sum over all of the corpus's keywords as the last column
+        counts = np.array(
+            [[freq[doc]['Frequencies'].get(k, 0) for k in keywords] + [sum(freq[doc]['Frequencies'].values())]
+             for doc in docs], dtype=np.int64
+        ).reshape(len(docs), num_rows)
 
-                if self.binary:
-                    n[target] += 1
+        if self.binary:
+            # a document counts once towards the sample, and once towards
+            # the successes if the keyword (any of the keywords) occurs in it
+            trials = np.ones(len(docs), dtype=np.int64)
+            counts = (counts > 0).astype(np.int64)
 
-                    for k in key_records:
+        else:
+            trials = np.array([freq[doc]['Text Length'] for doc in docs], dtype=np.int64)
 
-                        if key_records[k] == 1:
-                            p[target] += 1
-                            break
+        # period index of every document at once, documents outside of every period are dropped
+        idx = self.periods.indices(dates)
+        keep = idx >= 0
 
-                else:
-                    n[target] += freq[doc]['Text Length']
+        n = np.bincount(idx[keep], weights=trials[keep], minlength=num_periods)
 
-                    for k in key_records:
-                        p[target] += key_records[k]
+        # one bincount over (period, row) cells for every keyword at once
+        cells = (idx[keep][:, np.newaxis] * num_rows + np.arange(num_rows)).ravel()
+        k = np.bincount(cells, weights=counts[keep].ravel(), minlength=num_periods * num_rows)
 
-        return p, n
+        return k.reshape(num_periods, num_rows).T, np.tile(n, (num_rows, 1))
 
     @staticmethod
-    def diff_props_test(k1, n1, k2, n2):
+    def z_tests(k1: np.ndarray, n1: np.ndarray, k2: np.ndarray, n2: np.ndarray):
         """
-        Take difference of proportions
+        Pooled two-sided z-tests of the difference between proportions k1 / n1 and k2 / n2,
+        elementwise over arrays of counts. Returns arrays of z scores and p values, which
+        are nan where either sample is empty or both proportions are 0 or 1.
         """
 
-        (z, p_value) = statsmodels.api.stats.proportions_ztest(
-            [k1, k2], [n1, n2], alternative='two-sided', prop_var=False
-        )
+        k1, n1, k2, n2 = (np.asarray(a, dtype=np.float64) for a in (k1, n1, k2, n2))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
 
-        return [z, p_value]
+            pooled = (k1 + k2) / (n1 + n2)
+            se = np.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+            z = (k1 / n1 - k2 / n2) / se
+
+        z[~np.isfinite(z)] = np.nan
+
+        return z, 2 * scipy.stats.norm.sf(np.abs(z))
 
     def take_difference(self):
         """
         Take difference in proportions between two corpora.
         """
 
-        sample_records = {}
-
-        names = [corpus.name for corpus in self.corpora]
+        if len(self.corpora) != 2:
+            raise Exception("take_difference compares exactly two corpora, use take_differences for more.\n")
 
-        for corpus in self.corpora:
-            sample_records[corpus.name] = self._build_samples(corpus)
+        (k1, n1), (k2, n2) = [self._sample_arrays(corpus, []) for corpus in self.corpora]
 
-        x1, n1 = sample_records[names[0]][0], sample_records[names[0]][1]
-        x2, n2 = sample_records[names[1]][0], sample_records[names[1]][1]
+        # every period at once, over the aggregate counts
+        z, p = self.z_tests(k1[-1], n1[-1], k2[-1], n2[-1])
+        sig = scipy.stats.norm.cdf(z)
 
         critical = scipy.stats.norm.ppf(1-(0.05/2))
 
         diff_props = list_dict(self.year_list)
         diff_props['Critical'] = critical
 
-        for year in self.year_list[:-1]:
-            vals = self.diff_props_test(x1[year], n1[year], x2[year], n2[year])
-            z, p = vals[0], vals[1]
-            sig = scipy.stats.norm.cdf(z)
-            diff_props[year] = [z, p, sig]
+        for i, year in enumerate(self.year_list[:-1]):
+            diff_props[year] = [z[i], p[i], sig[i]]
 
         return DiffPropResults(diff_props, self.year_list, self.name)
+
+    def take_differences(self, keywords: [list, None] = None, correction: [str, None] = 'holm',
+                         alpha: float = 0.05):
+        """
+        Take differences in proportions between every pair of corpora, in every period,
+        for each keyword (by default, those tracked by every corpus) and for all of each
+        corpus's keywords together. p values are adjusted for multiple comparisons over
+        all of the tests at once, with any method of statsmodels' multipletests (e.g.
+        'bonferroni', 'holm' or 'fdr_bh'), or not at all if correction is None.
+        """
+
+        names = [corpus.name for corpus in self.corpora]
+
+        if keywords is None:
+            keywords = self.shared_keywords()
+
+        rows = list(keywords) + [TOTAL]
+
+        # corpora x rows x periods
+        samples = [self._sample_arrays(corpus, list(keywords)) for corpus in self.corpora]
+        k = np.stack([s[0] for s in samples])
+        n = np.stack([s[1] for s in samples])
+
+        # every pair of corpora at once, pairs x rows x periods
+        pairs = [(i, j) for i in range(len(names)) for j in range(i + 1, len(names))]
+        first = np.array([i for i, _ in pairs])
+        second = np.array([j for _, j in pairs])
+
+        z, p = self.z_tests(k[first], n[first], k[second], n[second])
+
+        p_adjusted = p.copy()
+        reject = np.zeros(p.shape, dtype=bool)
+        tested = ~np.isnan(p)
+
+        if correction is not None and tested.any():
+            reject[tested], p_adjusted[tested], _, _ = multipletests(p[tested], alpha=alpha, method=correction)
+        else:
+            reject[tested] = p[tested] < alpha
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            props = k / n
+
+        return DiffPropBatchResults(
+            self.name, names, rows, self.year_list, [(names[i], names[j]) for i, j in pairs],
+            props, z, p, p_adjusted, reject, correction, alpha
+        )
@@ -0,0 +1,338 @@
+import numpy as np
+
+from array import array
+
+from corpus.scan import CorpusScanner, VolumeConsumer
+from corpus.utils import *
+
+
+INDEX_DIR = ".corpus_index"
+INDEX_VERSION = 2
+
+
+class IndexConsumer(VolumeConsumer):
+    """
+    Collects the token stream of a text field during a corpus scan, for building an InvertedIndex.
+    """
+
+    def __init__(self, text_type: str):
+
+        self.text_type = text_type
+
+        self.vocab = None
+        self.terms = None
+        self.ids = None
+        self.lengths = None
+        self.volume_table = None
+
+    def start(self):
+
+        self.vocab = {}
+        self.terms = []
+        self.ids = array('q')
+        self.lengths = array('q')
+        self.volume_table = []
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        tokens = volume.get(self.text_type)
+
+        if not isinstance(tokens, list):
+            tokens = []
+
+        for t in tokens:
+
+            tid = self.vocab.get(t)
+
+            if tid is None:
+                tid = self.vocab[t] = len(self.terms)
+                self.terms.append(t)
+
+            self.ids.append(tid)
+
+        self.lengths.append(len(tokens))
+        self.volume_table.append(
+            [json_doc, key, {k: v for k, v in volume.items() if not isinstance(v, (list, dict))}]
+        )
+
+
+class InvertedIndex:
+    """
+    Positional inverted index over a single text field of a corpus. For each term,
+    holds every (volume, position) at which it occurs, ordered by volume and position.
+    The vocabulary is stored sorted, as a blob of UTF-8 encoded terms and an array of
+    offsets into it, and is memory-mapped on load with the postings, so looking up a
+    term reads only the terms of its binary search and its own postings. The volume table holds the file,
+    key and non-list fields (Date, Author, Title, ...) of every indexed volume.
+    """
+
+    def __init__(self, in_dir: str, text_type: str, header: dict):
+
+        self.in_dir = in_dir
+        self.text_type = text_type
+        self.header = header
+        self.files = header["files"]
+
+        path = self.index_path(in_dir, text_type)
+
+        self.vocab_ptr = np.load("{}/vocab_ptr.npy".format(path), mmap_mode='r')
+        self.term_ptr = np.load("{}/term_ptr.npy".format(path), mmap_mode='r')
+        self.vols = np.load("{}/vols.npy".format(path), mmap_mode='r')
+        self.positions = np.load("{}/positions.npy".format(path), mmap_mode='r')
+        self.lengths = np.load("{}/lengths.npy".format(path), mmap_mode='r')
+
+        # an empty file can't be memory-mapped
+        if self.vocab_ptr[-1] > 0:
+            self.vocab_blob = np.load("{}/vocab.npy".format(path), mmap_mode='r')
+        else:
+            self.vocab_blob = np.zeros(0, dtype=np.uint8)
+
+        self._volume_table = None
+
+    @staticmethod
+    def index_path(in_dir: str, text_type: str):
+        """
+        Location of the index of a text field for a corpus directory.
+        """
+
+        return os.path.join(in_dir, INDEX_DIR, text_type.replace(' ', '_'))
+
+    @classmethod
+    def load(cls, in_dir: str, text_type: str = 'Text'):
+        """
+        Load the index of a text field, returns None if none has been built.
+        """
+
+        path = cls.index_path(in_dir, text_type)
+
+        if not os.path.exists("{}/header.json".format(path)):
+            return None
+
+        with open("{}/header.json".format(path), 'r', encoding='utf8') as in_file:
+            header = json.load(in_file)
+
+        if header.get("version") != INDEX_VERSION or header.get("text_type") != text_type:
+            return None
+
+        return cls(in_dir, text_type, header)
+
+    @classmethod
+    def build(cls, in_dir: str, text_type: str = 'Text'):
+        """
+        Index a text field of a corpus, stored in a hidden directory at the root of the corpus.
+        """
+
+        path = cls.index_path(in_dir, text_type)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        build_out(path)
+
+        print("Building inverted index of {0} at {1}".format(text_type, path))
+
+        # files are stat'ed before they are read, so any change made during the build marks the index stale
+        files = list_volume_files(in_dir)
+        manifest = {f: file_stat(in_dir, f) for f in files}
+
+        consumer = IndexConsumer(text_type)
+        CorpusScanner(in_dir, [consumer]).run(files)
+
+        lengths = np.array(consumer.lengths, dtype=np.int64)
+        ids = np.array(consumer.ids, dtype=np.int64)
+
+        # renumber terms in sorted order, so lookups can binary search the vocabulary
+        terms = consumer.terms
+        order = np.array(sorted(range(len(terms)), key=terms.__getitem__), dtype=np.int64)
+
+        # terms are stored as one UTF-8 blob and offsets, sorting strings sorts their UTF-8 encodings
+        encoded = [terms[i].encode('utf8') for i in order]
+        vocab = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        vocab_ptr = np.concatenate([[0], np.cumsum([len(e) for e in encoded], dtype=np.int64)]).astype(np.int64)
+
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order))
+        ids = ranks[ids]
+
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        vols = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        positions = (np.arange(len(ids)) - np.repeat(offsets[:-1], lengths)).astype(np.int32)
+
+        # a stable sort keeps each term's postings in (volume, position) order
+        postings = np.argsort(ids, kind='stable')
+        term_ptr = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength=len(terms)))]).astype(np.int64)
+
+        np.save("{}/vocab.npy".format(path), vocab)
+        np.save("{}/vocab_ptr.npy".format(path), vocab_ptr)
+        np.save("{}/term_ptr.npy".format(path), term_ptr)
+        np.save("{}/vols.npy".format(path), vols[postings])
+        np.save("{}/positions.npy".format(path), positions[postings])
+        np.save("{}/lengths.npy".format(path), lengths)
+
+        with open("{}/volumes.json".format(path), 'w', encoding='utf8') as out_file:
+            json.dump(consumer.volume_table, out_file, ensure_ascii=False)
+
+        # header is written last, so an interrupted build is never loaded
+        with open("{}/header.json".format(path), 'w', encoding='utf8') as out_file:
+            json.dump(
+                {"version": INDEX_VERSION, "text_type": text_type, "files": manifest},
+                out_file, ensure_ascii=False
+            )
+
+        return cls.load(in_dir, text_type)
+
+    @property
+    def volume_table(self):
+        """
+        [file, key, non-list fields] of each indexed volume, loaded on first use.
+        """
+
+        if self._volume_table is None:
+            with open("{}/volumes.json".format(self.index_path(self.in_dir, self.text_type)), 'r',
+                      encoding='utf8') as in_file:
+                self._volume_table = json.load(in_file)
+
+        return self._volume_table
+
+    @property
+    def num_volumes(self):
+
+        return len(self.lengths)
+
+    def is_fresh(self):
+        """
+        Check whether the corpus is unchanged since the index was built, i.e. that no
+        volume file has been added, removed or modified.
+        """
+
+        files = list_volume_files(self.in_dir)
+
+        if len(files) != len(self.files):
+            return False
+
+        try:
+            return all(self.files.get(f) == file_stat(self.in_dir, f) for f in files)
+        except OSError:
+            return False
+
+    @property
+    def num_terms(self):
+
+        return len(self.vocab_ptr) - 1
+
+    def term(self, i: int):
+        """
+        The term at a position of the sorted vocabulary.
+        """
+
+        return self._term_bytes(i).decode('utf8')
+
+    def _term_bytes(self, i: int):
+
+        return self.vocab_blob[self.vocab_ptr[i]:self.vocab_ptr[i + 1]].tobytes()
+
+    def _term_id(self, term: str):
+        """
+        Position of a term in the sorted vocabulary, or -1 if it isn't indexed.
+        """
+
+        target = term.encode('utf8')
+        lo, hi = 0, self.num_terms
+
+        while lo < hi:
+
+            mid = (lo + hi) // 2
+
+            if self._term_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < self.num_terms and self._term_bytes(lo) == target:
+            return lo
+
+        return -1
+
+    def postings(self, term: str):
+        """
+        Return the volumes and positions at which a term occurs.
+        """
+
+        i = self._term_id(term)
+
+        if i < 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+
+        return (
+            np.asarray(self.vols[self.term_ptr[i]:self.term_ptr[i + 1]]),
+            np.asarray(self.positions[self.term_ptr[i]:self.term_ptr[i + 1]])
+        )
+
+    def phrase(self, keyword: [tuple, list, str]):
+        """
+        Return the volumes and start positions at which an n-gram (a tuple of
+        terms, or a single term) occurs, ordered by volume and position.
+        """
+
+        if isinstance(keyword, str):
+            keyword = (keyword,)
+
+        vols, positions = self.postings(keyword[0])
+        starts = (vols.astype(np.int64) << 32) | positions
+
+        for i in range(1, len(keyword)):
+
+            if len(starts) == 0:
+                break
+
+            v, p = self.postings(keyword[i])
+            starts = starts[np.isin(starts + i, (v.astype(np.int64) << 32) | p)]
+
+        return (starts >> 32).astype(np.int64), (starts & 0xFFFFFFFF).astype(np.int64)
+
+    def counts(self, keyword: [tuple, list, str]):
+        """
+        Number of occurrences of an n-gram in each indexed volume.
+        """
+
+        vols, _ = self.phrase(keyword)
+
+        return np.bincount(vols, minlength=self.num_volumes)
+
+    def hits(self, keywords: list):
+        """
+        Map (file, key) of each volume containing any of a list of n-grams to the
+        sorted start positions of their occurrences.
+        """
+
+        vols = []
+        positions = []
+
+        for k in keywords:
+            v, p = self.phrase(k)
+            vols.append(v)
+            positions.append(p)
+
+        if len(vols) == 0:
+            return {}
+
+        vols = np.concatenate(vols)
+        positions = np.concatenate(positions)
+
+        order = np.lexsort((positions, vols))
+        vols = vols[order]
+        positions = positions[order]
+
+        ret = {}
+        bounds = np.flatnonzero(np.diff(vols)) + 1
+
+        for v, p in zip(np.split(vols, bounds), np.split(positions, bounds)):
+            if len(v) > 0:
+                entry = self.volume_table[int(v[0])]
+                ret[(entry[0], entry[1])] = np.unique(p).tolist()
+
+        return ret
+
+    def files_with(self, keywords: list):
+        """
+        Sorted list of the files holding a volume that contains any of a list of n-grams.
+        """
+
+        return sorted(set(f for f, _ in self.hits(keywords).keys()))
@@ -0,0 +1,170 @@
+import os
+import json
+import numpy as np
+
+from array import array
+from scipy.sparse import csr_matrix
+
+
+class AuthorMatrix:
+    """
+    Term counts of every author within a single period, held as a sparse author x term
+    CSR matrix. Row i holds the summed bag of words of all documents by authors[i].
+    """
+
+    def __init__(self, authors: list, matrix: csr_matrix):
+
+        self.authors = authors
+        self.matrix = matrix
+
+    @classmethod
+    def from_bows(cls, bows: dict, num_terms: int):
+        """
+        Build from a dictionary mapping each author to a (possibly unmerged) bag of words list.
+        """
+
+        builder = AuthorMatrixBuilder()
+
+        for author, bow in bows.items():
+            builder.add(author, bow)
+
+        return builder.build(num_terms)
+
+    @staticmethod
+    def index_dtype(matrix: csr_matrix):
+        """
+        Dtype that scipy keeps the index arrays of a matrix in: int32 when its number of
+        non-zero entries and dimensions fit, int64 otherwise. Index arrays of any other
+        dtype are copied when a matrix is built, so they couldn't be memory-mapped.
+        """
+
+        if max(matrix.nnz, *matrix.shape) < np.iinfo(np.int32).max:
+            return np.int32
+
+        return np.int64
+
+    def save(self, path: str):
+        """
+        Write the matrix's arrays to .npy files prefixed with path, so that they can be memory-mapped back.
+        """
+
+        dtype = self.index_dtype(self.matrix)
+
+        np.save("{}.data.npy".format(path), self.matrix.data)
+        np.save("{}.indices.npy".format(path), self.matrix.indices.astype(dtype, copy=False))
+        np.save("{}.indptr.npy".format(path), self.matrix.indptr.astype(dtype, copy=False))
+
+    @classmethod
+    def load(cls, path: str, authors: list, num_terms: int):
+        """
+        Load a matrix written by save(). Its arrays are memory-mapped rather than read.
+        """
+
+        matrix = csr_matrix(
+            (
+                np.load("{}.data.npy".format(path), mmap_mode='r'),
+                np.load("{}.indices.npy".format(path), mmap_mode='r'),
+                np.load("{}.indptr.npy".format(path), mmap_mode='r')
+            ),
+            shape=(len(authors), num_terms), copy=False
+        )
+
+        return cls(authors, matrix)
+
+
+class AuthorMatrixBuilder:
+    """
+    Accumulates the bags of words of a period's documents and the author of each,
+    then groups them by author into an AuthorMatrix.
+    """
+
+    def __init__(self):
+
+        self.authors = []
+        self.codes = {}
+        self.doc_authors = array('q')
+        self.indptr = array('q', [0])
+        self.indices = array('q')
+        self.data = array('q')
+
+    def add(self, author: str, bow: list):
+        """
+        Add the bag of words of a single document by author.
+        """
+
+        code = self.codes.get(author)
+
+        if code is None:
+            code = self.codes[author] = len(self.authors)
+            self.authors.append(author)
+
+        for term_id, count in bow:
+            self.indices.append(term_id)
+            self.data.append(count)
+
+        self.indptr.append(len(self.indices))
+        self.doc_authors.append(code)
+
+    def build(self, num_terms: int):
+        """
+        Group documents by author, summing their counts.
+        """
+
+        num_docs = len(self.doc_authors)
+
+        docs = csr_matrix(
+            (
+                np.array(self.data, dtype=np.int64),
+                np.array(self.indices, dtype=np.int64),
+                np.array(self.indptr, dtype=np.int64)
+            ),
+            shape=(num_docs, num_terms)
+        )
+
+        # author x document indicator matrix, multiplying by it sums the rows of each author
+        group = csr_matrix(
+            (np.ones(num_docs, dtype=np.int64), (np.array(self.doc_authors, dtype=np.int64), np.arange(num_docs))),
+            shape=(len(self.authors), num_docs)
+        )
+
+        matrix = csr_matrix(group @ docs)
+        matrix.sort_indices()
+
+        return AuthorMatrix(list(self.authors), matrix)
+
+
+def save_author_matrices(matrices: dict, out_dir: str):
+    """
+    Write a dictionary of AuthorMatrix objects, keyed by year period, to a directory.
+    """
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    header = {"years": [], "authors": {}, "num_terms": {}}
+
+    for year, m in matrices.items():
+
+        m.save("{0}/{1}".format(out_dir, year))
+
+        header["years"].append(year)
+        header["authors"][str(year)] = m.authors
+        header["num_terms"][str(year)] = m.matrix.shape[1]
+
+    with open("{}/header.json".format(out_dir), 'w', encoding='utf8') as out_file:
+        json.dump(header, out_file, ensure_ascii=False)
+
+
+def load_author_matrices(in_dir: str):
+    """
+    Load a dictionary of AuthorMatrix objects written by save_author_matrices.
+    """
+
+    with open("{}/header.json".format(in_dir), 'r', encoding='utf8') as in_file:
+        header = json.load(in_file)
+
+    return {
+        year: AuthorMatrix.load(
+            "{0}/{1}".format(in_dir, year), header["authors"][str(year)], header["num_terms"][str(year)]
+        )
+        for year in header["years"]
+    }
@@ -1,8 +1,94 @@
 import tqdm
 import nltk
 import math
+import zipfile
+import hashlib
+import numpy as np
+
+from multiprocessing import Pool
+from scipy.sparse import csr_matrix
 
 from corpus.results import *
+from corpus.result_cache import ResultCache, cached_result
+from corpus.scan import CorpusScanner, VolumeConsumer
+from corpus.nlp.period_counts import PeriodCounts, PeriodCountsBuilder
+
+
+class FrequencyConsumer(VolumeConsumer):
+    """
+    Builds the frequency record of a Frequency object for one or more
+    values of n during a corpus scan, over the given list of files (or the
+    whole corpus).
+    """
+
+    def __init__(self, frequency, ns: list, files: [list, None] = None):
+
+        self.frequency = frequency
+        self.ns = ns
+        self.files = files
+        self.frequency_lists = None
+        self.manifest = None
+
+    def fields(self):
+
+        return [self.frequency.text_type, self.frequency.date_key]
+
+    def start(self):
+
+        self.frequency_lists = {
+            n: {year: PeriodCountsBuilder() for year in self.frequency.year_list[:-1]} for n in self.ns
+        }
+
+        # every file is stat'ed before it is read, so files yielding no volumes aren't re-read by update()
+        files = self.files if self.files is not None else list_volume_files(self.frequency.in_dir)
+        self.manifest = {f: file_stat(self.frequency.in_dir, f) for f in files}
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        self.frequency._update_frequency_lists(self.frequency_lists, volume, json_doc)
+
+    def counts(self):
+        """
+        Return the counts built during the scan, keyed by n and year period.
+        """
+
+        return {n: {year: b.build() for year, b in lists.items()} for n, lists in self.frequency_lists.items()}
+
+    def finish(self):
+
+        self.frequency.frequency_record = self.counts()
+        self.frequency.manifest = self.manifest
+        self.frequency.record_digest = self.frequency._digest(
+            "built", sorted(self.frequency.frequency_record.keys()), self.manifest
+        )
+
+
+class PartialFrequencyConsumer(FrequencyConsumer):
+    """
+    Builds frequency counts over a shard of a corpus, to be merged with
+    the counts built over the other shards.
+    """
+
+    def finish(self):
+
+        pass
+
+
+def _partial_frequency_lists(args):
+    """
+    Worker for parallel frequency record construction, builds frequency counts over a shard of files.
+    Only the configuration counts depend on is passed to workers, not the Frequency object and its record.
+    """
+
+    config, ns, files = args
+    in_dir, text_type, year_list, date_key, stop_words, max_n = config
+
+    frequency = Frequency("shard", in_dir, text_type, year_list, date_key, stop_words, max_n=max_n)
+
+    consumer = PartialFrequencyConsumer(frequency, ns, files)
+    CorpusScanner(frequency.in_dir, [consumer], progress=False).run(files)
+
+    return consumer.counts(), consumer.manifest
 
 
 class Frequency:
@@ -12,26 +98,88 @@ class Frequency:
     can be either individual words or n-grams for any n, but must
     use a consistent value of n within a particular list.
 
-    TODO: need to store n-gram val with self.frequency record, detect n
-    with calls to take_freq, and recalculate self.frequency record if n
-    has changed
+    The frequency record maps each value of n and each period to a PeriodCounts
+    object, which stores per-document n-gram counts as a sparse document x term
+    matrix. Counts for every n up to max_n are built in a single pass, so queries
+    mixing keywords of different lengths are served without rescanning the corpus.
+    The manifest records the mtime and size of each file in the record, so
+    that update() can ingest only volumes that were added or changed.
     """
 
     def __init__(self, name: str, in_dir: str, text_type: str, year_list: list,
-                 date_key: str, stop_words: [list, set, str, None] = None):
+                 date_key: str, stop_words: [list, set, str, None] = None, workers: int = 1,
+                 max_n: int = 1, cache: [ResultCache, None] = None):
 
         self.name = name
         self.in_dir = in_dir
         self.text_type = text_type
         self.year_list = year_list
+        self.periods = PeriodMapper(year_list)
         self.date_key = date_key
         self.stop_words = setup_stop_words(stop_words)
+        self.workers = workers
+        self.max_n = max_n
+        self.cache = cache
 
         self.frequency_record = None
+        self.manifest = None
 
-    def frequency_from_file(self, file_path: str):
+        # identifies the frequency record in memory, for the result cache
+        self.record_digest = None
+
+    @staticmethod
+    def _digest(*parts):
         """
-        Load a precomputed frequency distribution record from a json file.
+        Hash of a sequence of JSON-serializable parts.
+        """
+
+        return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf8')).hexdigest()
+
+    @staticmethod
+    def _file_digest(file_path: str):
+        """
+        Hash of the contents of a file.
+        """
+
+        h = hashlib.sha1()
+
+        with open(file_path, 'rb') as in_file:
+            for chunk in iter(lambda: in_file.read(1 << 20), b''):
+                h.update(chunk)
+
+        return h.hexdigest()
+
+    @staticmethod
+    def _record_n(freq_dict: dict):
+        """
+        Detect value of n for the n-grams stored in a single-n frequency record.
+        """
+
+        for year in freq_dict.keys():
+            for k in freq_dict[year].terms:
+                return len(k.split())
+
+        return 1
+
+    @staticmethod
+    def _pack_json(obj):
+        """
+        Encode a JSON-serializable object as a byte array for storage in an npz archive.
+        """
+
+        return np.frombuffer(json.dumps(obj, ensure_ascii=False).encode('utf8'), dtype=np.uint8)
+
+    @staticmethod
+    def _unpack_json(arr: np.ndarray):
+        """
+        Decode a JSON object stored with _pack_json.
+        """
+
+        return json.loads(arr.tobytes().decode('utf8'))
+
+    def _frequency_from_json(self, file_path: str):
+        """
+        Load a frequency record written as JSON by earlier versions of write_freq.
         """
 
         with open(file_path, 'r', encoding='utf8') as in_file:
@@ -42,52 +190,97 @@ class Frequency:
 
             for year in json_data.keys():
 
-                freq_dict[int(year)] = {}
-                freq_dict[int(year)]['NUM_DOCS'] = json_data[year]['NUM_DOCS']
-                freq_dict[int(year)]['TOTAL_WORDS'] = json_data[year]['TOTAL_WORDS']
-                freq_dict[int(year)]['FDIST'] = json_data[year]['FDIST']
+                freq_dict[int(year)] = PeriodCounts.from_lists(
+                    json_data[year]['FDIST'], json_data[year]['NUM_DOCS'], json_data[year]['TOTAL_WORDS']
+                )
 
-            self.frequency_record = freq_dict
+        return {self._record_n(freq_dict): freq_dict}
 
-        return self
+    def _frequency_from_npz(self, file_path: str):
+        """
+        Load a frequency record written by write_freq.
+        """
 
-    def write_freq(self, out_path: str):
+        record = {}
+
+        with np.load(file_path) as arrays:
+
+            meta = self._unpack_json(arrays['meta'])
+
+            # archives holding a single value of n don't prefix their arrays with it
+            prefixes = {n: '{}_'.format(n) for n in meta['ns']} if 'ns' in meta else {None: ''}
+
+            for n, prefix in prefixes.items():
+
+                freq_dict = {}
+
+                for year in meta['years']:
+
+                    key = '{0}{1}_'.format(prefix, year)
+
+                    matrix = csr_matrix(
+                        (arrays[key + 'data'], arrays[key + 'indices'], arrays[key + 'indptr']),
+                        shape=tuple(arrays[key + 'shape'])
+                    )
+
+                    freq_dict[year] = PeriodCounts(
+                        self._unpack_json(arrays[key + 'terms']), matrix, arrays[key + 'lengths'],
+                        self._unpack_json(arrays[key + 'docs'])
+                    )
+
+                record[n if n is not None else self._record_n(freq_dict)] = freq_dict
+
+        return record, meta['manifest']
+
+    def frequency_from_file(self, file_path: str):
         """
-        Write this object's frequency records to file for later use.
+        Load a precomputed frequency distribution record from file. Records in the
+        JSON format written by earlier versions of write_freq are also accepted.
         """
 
-        if self.frequency_record is None:
-            raise Exception("No frequency record to write.\n")
+        if zipfile.is_zipfile(file_path):
+            record, manifest = self._frequency_from_npz(file_path)
+        else:
+            record, manifest = self._frequency_from_json(file_path), None
 
-        j_file = json.dumps(
-            self.frequency_record,
-            sort_keys=True,
-            indent=4,
-            separators=(',', ': '),
-            ensure_ascii=False
-        )
+        self.frequency_record = record
+        self.manifest = manifest
+        self.record_digest = self._digest("file", self._file_digest(file_path))
 
-        with open(out_path, 'w', encoding='utf8') as out_file:
-            out_file.write(j_file)
+        return self
 
-    def _clean_records(self, freq_rec):
+    def write_freq(self, out_path: str):
         """
-        Convert keys in frequency record from tuples to strings.
+        Write this object's frequency records to file for later use. Records are
+        stored as compressed sparse arrays in a NumPy npz archive.
         """
 
-        freq_dict = {}
+        if self.frequency_record is None:
+            raise Exception("No frequency record to write.\n")
 
-        for year in self.year_list[:-1]:
+        ns = sorted(self.frequency_record.keys())
+        years = list(self.frequency_record[ns[0]].keys())
 
-            freq_dict[year] = {}
-            freq_dict[year]['NUM_DOCS'] = freq_rec[year]['NUM_DOCS']
-            freq_dict[year]['TOTAL_WORDS'] = freq_rec[year]['TOTAL_WORDS']
-            freq_dict[year]['FDIST'] = {}
+        arrays = {
+            'meta': self._pack_json({'ns': ns, 'years': years, 'manifest': self.manifest})
+        }
 
-            for k in freq_rec[year]['FDIST'].keys():
-                freq_dict[year]['FDIST'][' '.join(k)] = freq_rec[year]['FDIST'][k]
+        for n in ns:
+            for year, counts in self.frequency_record[n].items():
 
-        return freq_dict
+                key = '{0}_{1}_'.format(n, year)
+
+                arrays[key + 'data'] = counts.matrix.data
+                arrays[key + 'indices'] = counts.matrix.indices
+                arrays[key + 'indptr'] = counts.matrix.indptr
+                arrays[key + 'shape'] = np.array(counts.matrix.shape, dtype=np.int64)
+                arrays[key + 'lengths'] = counts.lengths
+                arrays[key + 'terms'] = self._pack_json(counts.terms)
+                arrays[key + 'docs'] = self._pack_json(counts.docs)
+
+        # write through a file object so numpy doesn't append .npz to out_path
+        with open(out_path, 'wb') as out_file:
+            np.savez_compressed(out_file, **arrays)
 
     def detect_n(self, keys):
         """
@@ -105,107 +298,198 @@ class Frequency:
 
         return lengths.pop()
 
-    def _update_frequency_lists(self, frequency_lists: dict, json_data, n: int):
+    def _update_frequency_lists(self, frequency_lists: dict, json_data, json_doc: [str, None] = None):
         """
-        Update frequency lists with text from a volume.
+        Update frequency counts for each value of n with text from a volume read from json_doc.
         """
 
-        try:
-            year = int(json_data[self.date_key])
-        except KeyError:
-            year = int(json_data[self.date_key])
+        year = int(json_data[self.date_key])
 
-        if self.year_list[0] <= year < self.year_list[-1]:
+        if self.periods.contains(year):
 
-            text = list(nltk.ngrams(json_data[self.text_type], n))
+            tokens = json_data[self.text_type]
+            target = self.periods.period(year)
 
-            for i in range(len(text) - 1, -1, -1):
-                if text[i] in self.stop_words:
-                    del text[i]
+            for n in frequency_lists.keys():
 
-            target = determine_year(year, self.year_list)
-            fdist = nltk.FreqDist(text)
+                text = list(nltk.ngrams(tokens, n))
 
-            if frequency_lists[target] == 0:
+                for i in range(len(text) - 1, -1, -1):
+                    if text[i] in self.stop_words:
+                        del text[i]
 
-                frequency_lists[target] = {}
-                for kw in fdist:
-                    frequency_lists[target]['FDIST'] = {}
-                    frequency_lists[target]['FDIST'][kw] = [fdist[kw]]
-                frequency_lists[target]['NUM_DOCS'] = 1
-                frequency_lists[target]['TOTAL_WORDS'] = len(text)
+                fdist = nltk.FreqDist(text)
 
-            else:
+                frequency_lists[n][target].add(fdist, len(text), json_doc)
+
+        return self
 
-                for kw in fdist:
+    def frequency_consumer(self, n: [int, list, None] = None):
+        """
+        Return a consumer that builds this object's frequency record when passed to
+        Corpus.scan() alongside other analyses. n may be a single value or a list,
+        counts for every n from 1 to max_n are built by default.
+        """
 
-                    try:
-                        frequency_lists[target]['FDIST'][kw].append(fdist[kw])
-                    except KeyError:
-                        frequency_lists[target]['FDIST'][kw] = [fdist[kw]]
+        if n is None:
+            ns = list(range(1, self.max_n + 1))
+        elif isinstance(n, int):
+            ns = [n]
+        else:
+            ns = sorted(set(n))
 
-                frequency_lists[target]['NUM_DOCS'] += 1
-                frequency_lists[target]['TOTAL_WORDS'] += len(text)
+        return FrequencyConsumer(self, ns)
 
-        return self
+    def _build_counts_parallel(self, ns: list, files: list, workers: int):
+        """
+        Shard a list of files across a pool of processes and merge their partial frequency counts.
+        """
+
+        # several contiguous shards per worker keeps the pool busy when shards are uneven
+        shard_size = max(1, math.ceil(len(files) / (workers * 4)))
+        config = (self.in_dir, self.text_type, self.year_list, self.date_key, self.stop_words, self.max_n)
+        shards = [(config, ns, files[i:i + shard_size]) for i in range(0, len(files), shard_size)]
+
+        partials = {n: {year: [] for year in self.year_list[:-1]} for n in ns}
+        manifest = {}
+
+        with Pool(workers) as pool:
+            for partial, partial_manifest in tqdm.tqdm(pool.imap(_partial_frequency_lists, shards), total=len(shards)):
+                for n in ns:
+                    for year in partials[n].keys():
+                        partials[n][year].append(partial[n][year])
+                manifest.update(partial_manifest)
+
+        # concatenating shards in file order reproduces the record of a serial pass
+        record = {
+            n: {year: PeriodCounts.concatenate(partials[n][year]) for year in partials[n].keys()} for n in ns
+        }
 
-    def set_frequency_record(self, n):
+        return record, manifest
+
+    def _build_counts(self, ns: list, files: [list, None], workers: int):
         """
-        Calculate frequency distributions per period.
+        Build frequency counts for a list of values of n, and a manifest,
+        over a list of files (or the whole corpus) in a single pass.
         """
 
-        frequency_lists = num_dict(self.year_list)
-        frequency_lists["__N__"] = n
+        if files is None:
+            files = list_volume_files(self.in_dir)
+
+        if workers > 1:
+            return self._build_counts_parallel(ns, files, workers)
+
+        consumer = PartialFrequencyConsumer(self, ns, files)
+        CorpusScanner(self.in_dir, [consumer]).run(files)
+
+        return consumer.counts(), consumer.manifest
+
+    def set_frequency_record(self, n: [int, list, None] = None, workers: [int, None] = None):
+        """
+        Calculate frequency distributions per period, for a single value of n or a list
+        of them (every n from 1 to max_n by default). With workers > 1, the corpus is
+        split across that many processes, the result is identical to a serial pass.
+        """
+
+        if workers is None:
+            workers = self.workers
 
         print("Calculating frequency records.\n")
 
-        for subdir, dirs, files in os.walk(self.in_dir):
-            for json_doc in tqdm.tqdm(files):
-                if json_doc[0] != ".":
+        self.frequency_record, self.manifest = self._build_counts(self.frequency_consumer(n).ns, None, workers)
+        self.record_digest = self._digest("built", sorted(self.frequency_record.keys()), self.manifest)
 
-                    with open(os.path.join(self.in_dir, json_doc), 'r', encoding='utf8') as in_file:
+    def update(self, workers: [int, None] = None):
+        """
+        Bring the frequency record up to date with the corpus directory: volumes from files
+        that were removed or changed since the record was built are retracted, and volumes
+        from new or changed files are ingested. Unchanged files are not read.
+        """
+
+        if self.frequency_record is None:
+            raise Exception("No frequency record to update, build or load one first.\n")
+
+        if self.manifest is None:
+            raise Exception("Frequency record has no file manifest and cannot be updated, rebuild it instead.\n")
+
+        if workers is None:
+            workers = self.workers
+
+        current = {f: file_stat(self.in_dir, f) for f in list_volume_files(self.in_dir)}
+
+        stale = set(f for f in self.manifest.keys() if current.get(f) != self.manifest[f])
+        added = sorted(f for f in current.keys() if f not in self.manifest or f in stale)
+
+        print("Updating frequency records: {0} files to retract, {1} files to ingest.\n"
+              .format(len(stale), len(added)))
+
+        record = {
+            n: {year: self.frequency_record[n][year].drop_docs(stale) for year in self.frequency_record[n].keys()}
+            for n in self.frequency_record.keys()
+        }
+        manifest = {f: self.manifest[f] for f in self.manifest.keys() if f not in stale}
+
+        if len(added) > 0:
 
-                        try:
-                            json_data = json.load(in_file)
-                            for k in list(json_data.keys()):
+            counts, added_manifest = self._build_counts(sorted(record.keys()), added, workers)
 
-                                self._update_frequency_lists(frequency_lists, json_data[k], n)
-                        except json.decoder.JSONDecodeError:
+            for n in record.keys():
+                for year in record[n].keys():
+                    record[n][year] = record[n][year].merge(counts[n][year])
+
+            manifest.update(added_manifest)
+
+        self.frequency_record = record
+        self.manifest = manifest
+        self.record_digest = self._digest("updated", self.record_digest, self.manifest)
+
+        return self
+
+    def _check_record(self, n: int):
+        """
+        Return the frequency record for n-grams. If it's missing, counts for n and every
+        value of n already held (or up to max_n) are rebuilt together in a single pass.
+        """
+
+        if self.frequency_record is None:
+            self.set_frequency_record(sorted(set(range(1, self.max_n + 1)) | {n}))
 
-                            print("Error loading file {}".format(json_doc))
+        elif n not in self.frequency_record:
+            self.set_frequency_record(sorted(set(self.frequency_record.keys()) | {n}))
 
-        self.frequency_record = self._clean_records(frequency_lists)
+        return self.frequency_record[n]
 
+    def _cache_params(self):
+        """
+        Parameters of this object that results depend on, for the result cache. Results
+        depend on the frequency record in memory, which may have been loaded from a file
+        or updated, so its digest is included.
+        """
+
+        return {"name": self.name, "record": self.record_digest}
+
+    @cached_result()
     def take_freq(self, keys, name):
         """
         Calculate keyword frequencies for each period from frequency records
         """
 
-        n = self.detect_n(keys)
-
-        if self.frequency_record is None:
-            self.set_frequency_record(n)
-        elif self.frequency_record["__N__"] != n:
-            self.set_frequency_record(n)
+        freq = self._check_record(self.detect_n(keys))
 
         num_docs = num_dict(self.year_list)
-        freq = self.frequency_record
         results = num_dict(self.year_list, keys, 1)
 
         for year in self.year_list[:-1]:
 
-            if freq[year]['TOTAL_WORDS'] > 0:
+            if freq[year].total_words > 0:
+
+                sums, found = freq[year].key_sums(keys)
 
-                total = 0
-                for k in keys:
-                    try:
-                        total += sum(freq[year]['FDIST'][k])
-                        results[year][k] = sum(freq[year]['FDIST'][k]) / freq[year]['TOTAL_WORDS']
-                    except KeyError:
-                        pass
+                for i in np.flatnonzero(found):
+                    results[year][keys[i]] = float(sums[i] / freq[year].total_words)
 
-                num_docs[year] = freq[year]['NUM_DOCS']
-                results[year]['TOTAL'] = total / freq[year]['TOTAL_WORDS']
+                num_docs[year] = freq[year].num_docs
+                results[year]['TOTAL'] = float(sums.sum() / freq[year].total_words)
 
         return FrequencyResults(results, num_docs, 'Global frequency (%)', name)
 
@@ -215,35 +499,30 @@ class Frequency:
         """
 
         num_docs = num_dict(self.year_list)
-        freq = self.frequency_record
+        freq = self.frequency_record[self.detect_n(keys)]
         results = num_dict(self.year_list, keys, 1)
 
         for year in self.year_list[:-1]:
 
-            if freq[year]['TOTAL_WORDS'] > 0:
+            if freq[year].total_words > 0:
 
-                total = 0
-                for k in keys:
-                    try:
-                        total += sum(freq[year]['FDIST'][k])
-                        results[year][k] = sum(freq[year]['FDIST'][k]) / freq[year]['NUM_DOCS']
-                    except KeyError:
-                        pass
+                sums, found = freq[year].key_sums(keys)
 
-                num_docs[year] = freq[year]['NUM_DOCS']
-                results[year]['TOTAL'] = total / freq[year]['NUM_DOCS']
+                for i in np.flatnonzero(found):
+                    results[year][keys[i]] = float(sums[i] / freq[year].num_docs)
+
+                num_docs[year] = freq[year].num_docs
+                results[year]['TOTAL'] = float(sums.sum() / freq[year].num_docs)
 
         return results, num_docs
 
+    @cached_result()
     def take_average_freq(self, keys, name):
         """
         Calculate average keyword frequency per document from frequency records.
         """
 
-        n = self.detect_n(keys)
-
-        if self.frequency_record is None:
-            self.set_frequency_record(n)
+        self._check_record(self.detect_n(keys))
 
         results, num_docs = self._take_average_freq(keys)
 
@@ -255,81 +534,63 @@ class Frequency:
         """
 
         averages, num_docs = self._take_average_freq(keys)
-        freq = self.frequency_record
+        freq = self.frequency_record[self.detect_n(keys)]
         results = num_dict(self.year_list, keys, 1)
 
         for year in self.year_list[:-1]:
 
-            variances_all_keys = []
+            if freq[year].total_words > 0:
 
-            if freq[year]['TOTAL_WORDS'] > 0:
+                avg = np.array([averages[year][k] for k in keys], dtype=np.float64)
+                dev, df, found = freq[year].key_variances(keys, avg)
 
-                for k in keys:
-                    try:
-                        var = [math.pow((f - averages[year][k]), 2) for f in freq[year]['FDIST'][k]]
-                        variances_all_keys.extend(var)
-                        results[year][k] = sum(var) / len(var)
-                    except KeyError:
-                        pass
+                for i in np.flatnonzero(found):
+                    results[year][keys[i]] = float(dev[i] / df[i])
 
-            results[year]['TOTAL'] = sum(variances_all_keys) / len(variances_all_keys)
+                if df.sum() > 0:
+                    results[year]['TOTAL'] = float(dev[found].sum() / df.sum())
 
         return results, num_docs
 
+    @cached_result()
     def take_variance(self, keys, name):
 
-        n = self.detect_n(keys)
-
-        if self.frequency_record is None:
-            self.set_frequency_record(n)
+        self._check_record(self.detect_n(keys))
 
         results, num_docs = self._take_variance(keys)
 
         return FrequencyResults(results, num_docs, 'Variance', name)
 
     @staticmethod
-    def _top_n(fdist, num: int, total_words: int):
+    def _top_n(counts: PeriodCounts, num: int):
         """
-        Helper to top_n. Returns a list of lists, with each
-        list representing the top n words for a given period.
+        Helper to top_n. Returns a list of (n-gram, percentage of
+        all n-grams) tuples for the top <num> n-grams in a period.
         """
 
-        keys = []
-
-        s = [(k, fdist[k]) for k in sorted(fdist, key=fdist.get, reverse=True)]
-        top = s[:num]
-
-        for tup in top:
-            keys.append((tup[0], round((tup[1] / total_words) * 100, 4)))
-
-        return keys
+        return [(k, round((v / counts.total_words) * 100, 4)) for k, v in counts.top(num)]
 
+    @cached_result()
     def top_n(self, n, num: int = 10):
         """
         Construct a dictionary that stores the top
         <num> n-grams per period across a corpus.
         """
 
-        if self.frequency_record is None:
-            self.set_frequency_record(n)
+        freq = self._check_record(n)
 
         num_docs = num_dict(self.year_list)
         n_words = list_dict(self.year_list)
-        freq = self.frequency_record
 
         print("Calculating top {0} words per period".format(str(num)))
 
         for year in self.year_list[:-1]:
 
-            num_docs[year] = freq[year]['NUM_DOCS']
+            num_docs[year] = freq[year].num_docs
 
-            if freq[year]['NUM_DOCS'] > num:
-                n_words[year].extend(
-                    self._top_n(freq[year]['FDIST'], num, freq[year]['TOTAL_WORDS'])
-                )
+            if freq[year].num_docs > num:
+                n_words[year].extend(self._top_n(freq[year], num))
             else:
-                n_words[year].extend(
-                    self._top_n(freq[year]['FDIST'], freq[year]['NUM_DOCS'], freq[year]['TOTAL_WORDS'])
-                )
+                n_words[year].extend(self._top_n(freq[year], freq[year].num_docs))
 
         return TopResults(n_words, num_docs, self.name)
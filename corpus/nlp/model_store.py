@@ -0,0 +1,161 @@
+import hashlib
+
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from corpus.utils import *
+
+
+STORE_VERSION = 1
+
+
+def corpus_fingerprint(in_dir: str):
+    """
+    Hash of the path, modification time and size of every volume file in a corpus.
+    It changes whenever a volume file is added, removed or modified.
+    """
+
+    h = hashlib.sha1()
+
+    for f in list_volume_files(in_dir):
+        h.update(json.dumps([f] + file_stat(in_dir, f)).encode('utf8'))
+
+    return h.hexdigest()
+
+
+def stop_words_hash(stop_words: [set, list]):
+    """
+    Hash of a collection of stop words, independent of their order.
+    """
+
+    return hashlib.sha1(json.dumps(sorted(stop_words), ensure_ascii=False).encode('utf8')).hexdigest()
+
+
+class LazyPeriods(Mapping):
+    """
+    Read-only mapping from year periods to models saved on disk. A period's model is
+    loaded (memory-mapped where gensim allows it) the first time it is accessed, and
+    at most <max_loaded> periods are held at once, evicting the least recently used.
+    """
+
+    def __init__(self, paths: dict, loader, max_loaded: [int, None] = None):
+
+        self.paths = paths
+        self.loader = loader
+        self.max_loaded = max_loaded
+        self.loaded = OrderedDict()
+
+    def __getitem__(self, year):
+
+        if year in self.loaded:
+            self.loaded.move_to_end(year)
+            return self.loaded[year]
+
+        if year not in self.paths:
+            raise KeyError(year)
+
+        model = self.loader(self.paths[year], mmap='r')
+        self.loaded[year] = model
+
+        if self.max_loaded is not None and len(self.loaded) > self.max_loaded:
+            self.loaded.popitem(last=False)
+
+        return model
+
+    def __iter__(self):
+
+        return iter(self.paths)
+
+    def __len__(self):
+
+        return len(self.paths)
+
+
+class ModelStore:
+    """
+    Versioned on-disk store of per-period models. Each entry lives in its own
+    subdirectory of the store, named by a key that hashes everything the models
+    depend on (store version, corpus fingerprint, text field, year list, stop words
+    and any other parameters), so entries for different inputs sit side by side.
+    """
+
+    def __init__(self, root: str):
+
+        self.root = root
+
+    @staticmethod
+    def key(header: dict):
+        """
+        Key of the entry described by a header.
+        """
+
+        return hashlib.sha1(json.dumps(header, sort_keys=True).encode('utf8')).hexdigest()[:16]
+
+    @staticmethod
+    def header(fingerprint: str, text_type: str, year_list: list, stop_words: [set, list],
+               params: [dict, None] = None):
+        """
+        Describe an entry of the store.
+        """
+
+        return {
+            "version": STORE_VERSION,
+            "fingerprint": fingerprint,
+            "text_type": text_type,
+            "year_list": list(year_list),
+            "stop_words": stop_words_hash(stop_words),
+            "params": params if params is not None else {}
+        }
+
+    def entry_path(self, header: dict):
+        """
+        Location of the entry described by a header.
+        """
+
+        return os.path.join(self.root, self.key(header))
+
+    def has(self, header: dict):
+        """
+        Check whether the store holds a complete entry for a header.
+        """
+
+        return os.path.exists("{}/header.json".format(self.entry_path(header)))
+
+    def save(self, header: dict, groups: dict):
+        """
+        Write an entry. groups maps a group name (e.g. 'tfidf') to a dictionary of
+        per-period gensim objects. Other entries of the store are left untouched.
+        """
+
+        path = self.entry_path(header)
+
+        os.makedirs(self.root, exist_ok=True)
+        build_out(path)
+
+        for name, models in groups.items():
+
+            os.mkdir("{0}/{1}".format(path, name))
+
+            for year, model in models.items():
+                model.save("{0}/{1}/{2}".format(path, name, year))
+
+        # header is written last, so an interrupted save is never loaded
+        with open("{}/header.json".format(path), 'w', encoding='utf8') as out_file:
+            json.dump(dict(header, groups=list(groups.keys()), years=list(groups[next(iter(groups))].keys())),
+                      out_file)
+
+        return path
+
+    def load(self, header: dict, name: str, loader, max_loaded: [int, None] = None):
+        """
+        Return a LazyPeriods mapping over one group of an entry.
+        """
+
+        path = self.entry_path(header)
+
+        with open("{}/header.json".format(path), 'r', encoding='utf8') as in_file:
+            years = json.load(in_file)["years"]
+
+        return LazyPeriods(
+            {year: "{0}/{1}/{2}".format(path, name, year) for year in years}, loader, max_loaded
+        )
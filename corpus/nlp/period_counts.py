@@ -0,0 +1,279 @@
+import numpy as np
+
+from array import array
+from scipy.sparse import csr_matrix, vstack
+
+
+class PeriodCounts:
+    """
+    Per-document n-gram counts for a single year period, stored as a sparse
+    document x term CSR matrix alongside the number of words in each document
+    and the file each document was read from. Terms are n-grams joined with spaces.
+    """
+
+    def __init__(self, terms: list, matrix: csr_matrix, lengths: np.ndarray, docs: [list, None] = None):
+
+        self.terms = terms
+        self.index = {t: i for i, t in enumerate(terms)}
+        self.matrix = matrix
+        self.lengths = lengths
+        self.docs = docs if docs is not None else [None] * matrix.shape[0]
+
+        self._sums = None
+        self._sq_sums = None
+        self._doc_freqs = None
+
+    @classmethod
+    def empty(cls):
+        """
+        Counts for a period without any documents.
+        """
+
+        return cls([], csr_matrix((0, 0), dtype=np.int64), np.zeros(0, dtype=np.int64), [])
+
+    @classmethod
+    def from_lists(cls, fdist: dict, num_docs: int, total_words: int):
+        """
+        Build counts from a legacy record that maps each term to a list of its nonzero
+        per-document counts. Such records don't identify documents, so counts are assigned
+        to rows in order and the period's word total is attributed to the first row.
+        """
+
+        terms = list(fdist.keys())
+        counts = [fdist[t] for t in terms]
+
+        rows = np.concatenate([np.arange(len(c)) for c in counts]) if terms else np.zeros(0, dtype=np.int64)
+        cols = np.repeat(np.arange(len(terms)), [len(c) for c in counts])
+        data = np.concatenate([np.asarray(c, dtype=np.int64) for c in counts]) if terms else rows
+
+        matrix = csr_matrix((data, (rows, cols)), shape=(num_docs, len(terms)), dtype=np.int64)
+
+        lengths = np.zeros(num_docs, dtype=np.int64)
+        if num_docs > 0:
+            lengths[0] = total_words
+
+        return cls(terms, matrix, lengths)
+
+    @classmethod
+    def concatenate(cls, counts: list):
+        """
+        Stack the documents of several PeriodCounts, in order, into a single one.
+        Terms are numbered by first appearance, so concatenating counts built over
+        consecutive shards of a corpus gives the same result as one serial pass.
+        """
+
+        terms = []
+        index = {}
+        matrices = []
+        lengths = []
+        docs = []
+
+        for c in counts:
+
+            mapping = np.empty(len(c.terms), dtype=np.int64)
+
+            for i, t in enumerate(c.terms):
+
+                j = index.get(t)
+
+                if j is None:
+                    j = index[t] = len(terms)
+                    terms.append(t)
+
+                mapping[i] = j
+
+            matrices.append((c.matrix.data, mapping[c.matrix.indices], c.matrix.indptr, c.matrix.shape[0]))
+            lengths.append(c.lengths)
+            docs.extend(c.docs)
+
+        blocks = [
+            csr_matrix((data, indices, indptr), shape=(num_rows, len(terms)))
+            for data, indices, indptr, num_rows in matrices
+        ]
+
+        matrix = vstack(blocks, format='csr', dtype=np.int64) if blocks else csr_matrix((0, 0), dtype=np.int64)
+
+        return cls(terms, matrix, np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64), docs)
+
+    def merge(self, other):
+        """
+        Return counts holding the documents of this object followed by those of other.
+        """
+
+        return self.concatenate([self, other])
+
+    def drop_docs(self, docs: set):
+        """
+        Return counts without the documents read from a set of files. Terms that
+        no longer occur in any document are removed.
+        """
+
+        keep = np.array([d not in docs for d in self.docs], dtype=bool)
+
+        if keep.all():
+            return self
+
+        matrix = self.matrix[np.flatnonzero(keep)]
+        cols = np.flatnonzero(np.bincount(matrix.indices, minlength=len(self.terms)))
+        matrix = matrix[:, cols].tocsr()
+
+        return PeriodCounts(
+            [self.terms[i] for i in cols], matrix, self.lengths[keep],
+            [d for d, k in zip(self.docs, keep) if k]
+        )
+
+    @property
+    def num_docs(self):
+
+        return self.matrix.shape[0]
+
+    @property
+    def total_words(self):
+
+        return int(self.lengths.sum())
+
+    def _columns(self, keys: list):
+        """
+        Column indices of the keys found in this period, and a mask of which keys were found.
+        """
+
+        cols = np.array([self.index.get(k, -1) for k in keys], dtype=np.int64)
+
+        return cols, cols >= 0
+
+    def sums(self):
+        """
+        Total count of each term across all documents.
+        """
+
+        if self._sums is None:
+            self._sums = np.bincount(
+                self.matrix.indices, weights=self.matrix.data, minlength=len(self.terms)
+            ).astype(np.int64)
+
+        return self._sums
+
+    def sq_sums(self):
+        """
+        Sum of squared per-document counts of each term.
+        """
+
+        if self._sq_sums is None:
+            data = self.matrix.data.astype(np.float64)
+            self._sq_sums = np.bincount(self.matrix.indices, weights=data * data, minlength=len(self.terms))
+
+        return self._sq_sums
+
+    def doc_freqs(self):
+        """
+        Number of documents each term occurs in.
+        """
+
+        if self._doc_freqs is None:
+            self._doc_freqs = np.bincount(self.matrix.indices, minlength=len(self.terms))
+
+        return self._doc_freqs
+
+    def key_sums(self, keys: list):
+        """
+        Total counts of a list of keys, and a mask of which keys occur in this period.
+        """
+
+        cols, found = self._columns(keys)
+        ret = np.zeros(len(keys), dtype=np.int64)
+        ret[found] = self.sums()[cols[found]]
+
+        return ret, found
+
+    def key_variances(self, keys: list, averages: np.ndarray):
+        """
+        For each key, the sum of squared deviations of its nonzero per-document counts from
+        the key's average, and the number of documents it occurs in.
+        """
+
+        cols, found = self._columns(keys)
+
+        s = np.zeros(len(keys))
+        sq = np.zeros(len(keys))
+        df = np.zeros(len(keys), dtype=np.int64)
+
+        s[found] = self.sums()[cols[found]]
+        sq[found] = self.sq_sums()[cols[found]]
+        df[found] = self.doc_freqs()[cols[found]]
+
+        # sum((f - a)^2) over nonzero counts f, expanded so it reduces over columns
+        dev = sq - 2 * averages * s + df * averages * averages
+
+        return dev, df, found
+
+    def top(self, num: int):
+        """
+        Return the <num> most frequent terms and their total counts, in descending order.
+        Ties are broken by the order in which terms first appeared.
+        """
+
+        sums = self.sums()
+        num = min(num, len(sums))
+
+        if num <= 0:
+            return []
+
+        idx = np.argpartition(-sums, num - 1)[:num]
+        idx = idx[np.lexsort((idx, -sums[idx]))]
+
+        return [(self.terms[i], int(sums[i])) for i in idx]
+
+
+class PeriodCountsBuilder:
+    """
+    Accumulates per-document n-gram counts for a period into typed arrays,
+    then builds a PeriodCounts object from them.
+    """
+
+    def __init__(self):
+
+        self.terms = []
+        self.index = {}
+        self.indptr = array('q', [0])
+        self.indices = array('q')
+        self.data = array('q')
+        self.lengths = array('q')
+        self.docs = []
+
+    def add(self, fdist: dict, length: int, doc: [str, None] = None):
+        """
+        Add the n-gram counts (keyed by n-gram tuples) of a single document,
+        read from the file doc.
+        """
+
+        for kw, count in fdist.items():
+
+            term = ' '.join(kw)
+            col = self.index.get(term)
+
+            if col is None:
+                col = self.index[term] = len(self.terms)
+                self.terms.append(term)
+
+            self.indices.append(col)
+            self.data.append(count)
+
+        self.indptr.append(len(self.indices))
+        self.lengths.append(length)
+        self.docs.append(doc)
+
+    def build(self):
+        """
+        Return the counts accumulated so far.
+        """
+
+        matrix = csr_matrix(
+            (
+                np.array(self.data, dtype=np.int64),
+                np.array(self.indices, dtype=np.int64),
+                np.array(self.indptr, dtype=np.int64)
+            ),
+            shape=(len(self.lengths), len(self.terms))
+        )
+
+        return PeriodCounts(list(self.terms), matrix, np.array(self.lengths, dtype=np.int64), list(self.docs))
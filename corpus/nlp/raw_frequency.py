@@ -1,7 +1,33 @@
-import tqdm
 import nltk
 
+from corpus.index import InvertedIndex
 from corpus.results import *
+from corpus.result_cache import ResultCache, cached_result
+from corpus.scan import CorpusScanner, VolumeConsumer
+
+
+class RawFrequencyConsumer(VolumeConsumer):
+    """
+    Builds the raw frequency tables of a RawFrequency object during a corpus scan.
+    """
+
+    def __init__(self, raw_frequency):
+
+        self.raw_frequency = raw_frequency
+        self.n = None
+
+    def fields(self):
+
+        return [self.raw_frequency.text_type, self.raw_frequency.date_key]
+
+    def start(self):
+
+        self.n = self.raw_frequency.detect_n()
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        cur_key = "{0}_{1}".format(json_doc, key)
+        self.raw_frequency._update_freq_dict(cur_key, volume, self.n)
 
 
 class RawFrequency:
@@ -12,13 +38,15 @@ class RawFrequency:
     """
 
     def __init__(self, name: str, in_dir: str, text_type: str,
-                 keys: [list], binary: bool=False):
+                 keys: [list], binary: bool=False, date_key: str = "Date", cache: [ResultCache, None] = None):
 
         self.name = name
         self.in_dir = in_dir
         self.text_type = text_type
         self.keys = build_keys(keys)
         self.binary = binary
+        self.date_key = date_key
+        self.cache = cache
 
         self.freq_dict = {}
 
@@ -44,7 +72,7 @@ class RawFrequency:
         """
 
         self.freq_dict[cur_key] = {}
-        self.freq_dict[cur_key]['Date'] = int(json_data['Date'])
+        self.freq_dict[cur_key]['Date'] = int(json_data[self.date_key])
         self.freq_dict[cur_key]['Frequencies'] = {}
 
         if self.binary:
@@ -67,41 +95,72 @@ class RawFrequency:
 
         return self
 
-    def _take_frequencies(self, jsondoc):
+    def frequency_consumer(self):
         """
-        Take frequencies from a collection of volumes within a file.
+        Return a consumer that builds this object's raw frequency tables
+        when passed to Corpus.scan() alongside other analyses.
+        """
+
+        return RawFrequencyConsumer(self)
+
+    def _freq_dict_from_index(self, index: InvertedIndex):
+        """
+        Build raw frequency tables from the postings of an inverted index, without reading the corpus.
         """
 
         n = self.detect_n()
+        counts = [(' '.join(keyword), index.counts(keyword)) for keyword in self.keys]
 
-        with open(self.in_dir + '/' + jsondoc, 'r', encoding='utf8') as json_doc:
+        self.freq_dict = {}
 
-            try:
+        for i, entry in enumerate(index.volume_table):
 
-                json_data = json.load(json_doc)
+            cur_key = "{0}_{1}".format(entry[0], entry[1])
 
-                for k in list(json_data.keys()):
+            self.freq_dict[cur_key] = {}
+            self.freq_dict[cur_key]['Date'] = int(entry[2][self.date_key])
+            self.freq_dict[cur_key]['Frequencies'] = {}
 
-                    cur_key = "{0}_{1}".format(jsondoc, k)
-                    self._update_freq_dict(cur_key, json_data[k], n)
+            if self.binary:
+                for keyword, c in counts:
+                    self.freq_dict[cur_key]['Frequencies'][keyword] = 1 if c[i] > 0 else 0
 
-            except json.decoder.JSONDecodeError:
+            else:
+                self.freq_dict[cur_key]['Text Length'] = max(0, int(index.lengths[i]) - n + 1)
 
-                print("Error loading file {}".format(jsondoc))
+                for keyword, c in counts:
+                    self.freq_dict[cur_key]['Frequencies'][keyword] = int(c[i])
 
-    def take_frequencies(self):
+        return self
+
+    def _cache_params(self):
         """
-        Build raw frequency tables.
+        Parameters of this object that results depend on, for the result cache.
         """
 
-        for subdir, dirs, files in os.walk(self.in_dir):
-            for jsondoc in tqdm.tqdm(files):
-                if jsondoc[0] != '.':
-                    self._take_frequencies(jsondoc)
+        return {"keys": self.keys, "binary": self.binary}
 
-        return self
+    @cached_result(ignore=("use_index",))
+    def _frequencies(self, use_index: bool = True):
+        """
+        Build and return raw frequency tables.
+        """
+
+        index = InvertedIndex.load(self.in_dir, self.text_type) if use_index else None
+
+        if index is not None and index.is_fresh():
+            return self._freq_dict_from_index(index).freq_dict
 
+        CorpusScanner(self.in_dir, [self.frequency_consumer()]).run()
 
+        return self.freq_dict
 
+    def take_frequencies(self, use_index: bool = True):
+        """
+        Build raw frequency tables. When an up to date inverted index of the text
+        field has been built, tables are built from it instead of scanning the corpus.
+        """
 
+        self.freq_dict = self._frequencies(use_index)
 
+        return self
@@ -0,0 +1,74 @@
+import os
+
+from gensim.corpora.mmcorpus import MmCorpus
+from gensim.matutils import MmWriter
+
+
+class MmStream:
+    """
+    Bag of words corpus of a single period, written to a Matrix Market file one
+    document at a time instead of being held in memory. Once closed, the file is
+    read back as a streamed MmCorpus, which gensim models accept in place of a list.
+    """
+
+    def __init__(self, path: str):
+
+        self.path = path
+        self.num_docs = 0
+        self.num_terms = 0
+        self.num_nnz = 0
+
+        self.writer = MmWriter(path)
+
+        # the header is padded so that it can be overwritten once the counts are known
+        self.writer.write_headers(-1, -1, -1)
+
+    def append(self, vector: list):
+        """
+        Write the bag of words of a single document.
+        """
+
+        max_id, veclen = self.writer.write_vector(self.num_docs, vector)
+
+        self.num_docs += 1
+        self.num_terms = max(self.num_terms, max_id + 1)
+        self.num_nnz += veclen
+
+    def close(self):
+        """
+        Finish writing the stream and return it as a corpus.
+        """
+
+        self.writer.fake_headers(self.num_docs, self.num_terms, self.num_nnz)
+        self.writer.close()
+
+        return MmCorpus(self.path)
+
+
+def mm_streams(corpus_dir: str, name: str, text_type: str, year_list: list):
+    """
+    Build a dictionary of Matrix Market streams, one per year period. Streams are written
+    to a {name}_{text_type} subdirectory of corpus_dir, so that analyses sharing a corpus_dir
+    don't overwrite each other's files. Like list_dict, the last year of year_list is
+    included, but holds an empty corpus.
+    """
+
+    out_dir = os.path.join(corpus_dir, "{0}_{1}".format(name, text_type))
+    os.makedirs(out_dir, exist_ok=True)
+
+    results = {}
+
+    for year in year_list[:-1]:
+        results[year] = MmStream(os.path.join(out_dir, "{}.mm".format(year)))
+
+    results[year_list[-1]] = []
+
+    return results
+
+
+def close_streams(streams: dict):
+    """
+    Close every stream in a dictionary built by mm_streams, returning a dictionary of corpora.
+    """
+
+    return {year: s.close() if isinstance(s, MmStream) else s for year, s in streams.items()}
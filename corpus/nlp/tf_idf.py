@@ -1,130 +1,398 @@
 import tqdm
 import pickle
+import numpy as np
 
 from gensim.models import TfidfModel
 from gensim.corpora import Dictionary
 
 from corpus.clusters.cluster import *
+from corpus.index import InvertedIndex
+from corpus.nlp.model_store import ModelStore, LazyPeriods, corpus_fingerprint
+from corpus.nlp.author_partition import AuthorMatrix, AuthorMatrixBuilder, save_author_matrices, load_author_matrices
+from corpus.nlp.streams import mm_streams, close_streams
+from corpus.nlp.tfidf_matrix import TfidfMatrix, TopNHeap, idf_vector, tfidf_weights
 from corpus.results import *
+from corpus.result_cache import ResultCache, cached_result
+from corpus.scan import CorpusScanner, VolumeConsumer
+
+
+class DictionaryConsumer(VolumeConsumer):
+    """
+    Builds the word -> id mappings and bag of words corpora of a Tfidf object during a corpus scan,
+    along with the (file, key) of the volume behind each document of the corpora.
+    When the Tfidf prunes its vocabulary, only the word -> id mappings are built (and
+    then pruned), corpora are built by a later BowConsumer scan.
+    """
+
+    def __init__(self, tfidf):
+
+        self.tfidf = tfidf
+        self.word_to_id_results = None
+        self.corpora_results = None
+        self.docs_results = None
+
+    def fields(self):
+
+        return [self.tfidf.text_type, self.tfidf.date_key]
+
+    def start(self):
+
+        self.word_to_id_results = gensim_dict(self.tfidf.year_list)
+        self.docs_results = list_dict(self.tfidf.year_list)
+
+        if self.tfidf.prune:
+            self.corpora_results = None
+        elif self.tfidf.corpus_dir is None:
+            self.corpora_results = list_dict(self.tfidf.year_list)
+        else:
+            self.corpora_results = mm_streams(
+                self.tfidf.corpus_dir, self.tfidf.name, self.tfidf.text_type, self.tfidf.year_list
+            )
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        target = self.tfidf._update_dictionaries_and_corpora(
+            volume, self.word_to_id_results, self.corpora_results
+        )
+
+        if target is not None:
+            self.docs_results[target].append((json_doc, key))
+
+    def finish(self):
+
+        if self.tfidf.prune:
+            self.tfidf.word_to_id = prune_dicts(
+                self.word_to_id_results, self.tfidf.no_below, self.tfidf.no_above,
+                self.tfidf.keep_n
+            )
+            self.tfidf.corpora = None
+
+        else:
+            self.tfidf.word_to_id = self.word_to_id_results
+            self.tfidf.corpora = close_streams(self.corpora_results)
+            self.tfidf.corpus_docs = self.docs_results
+
+
+class BowConsumer(VolumeConsumer):
+    """
+    Builds the bag of words corpora of a Tfidf object, over its already built
+    word -> id mappings, during a corpus scan. Tokens missing from the mappings are dropped.
+    """
+
+    def __init__(self, tfidf):
+
+        self.tfidf = tfidf
+        self.corpora_results = None
+        self.docs_results = None
+
+    def fields(self):
+
+        return [self.tfidf.text_type, self.tfidf.date_key]
+
+    def start(self):
+
+        self.docs_results = list_dict(self.tfidf.year_list)
+
+        if self.tfidf.corpus_dir is None:
+            self.corpora_results = list_dict(self.tfidf.year_list)
+        else:
+            self.corpora_results = mm_streams(
+                self.tfidf.corpus_dir, self.tfidf.name, self.tfidf.text_type, self.tfidf.year_list
+            )
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        target = self.tfidf._update_corpora(volume, self.corpora_results)
+
+        if target is not None:
+            self.docs_results[target].append((json_doc, key))
+
+    def finish(self):
+
+        self.tfidf.corpora = close_streams(self.corpora_results)
+        self.tfidf.corpus_docs = self.docs_results
+
+
+class TopNConsumer(VolumeConsumer):
+    """
+    Keeps the documents with the highest TF-IDF scores for one or more keywords during a
+    corpus scan. Only the top <n> documents per keyword and period are held at any time.
+    """
+
+    def __init__(self, tfidf, keywords: list, n: int):
+
+        self.tfidf = tfidf
+        self.keywords = keywords
+        self.n = n
+        self.heaps = None
+        self.num_docs = None
+
+    def fields(self):
+
+        return [self.tfidf.text_type, self.tfidf.date_key]
+
+    def start(self):
+
+        self.heaps = {k: {year: TopNHeap(self.n) for year in self.tfidf.year_list} for k in self.keywords}
+        self.num_docs = {k: num_dict(self.tfidf.year_list, nested=0) for k in self.keywords}
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        self.tfidf._update_top_n(key, volume, self.heaps, self.num_docs, self.keywords, json_doc)
+
+    def tfidf_results(self):
+        """
+        Return a TfidfResults object holding the top <n> documents found during the scan, for each keyword.
+        """
+
+        return [
+            TfidfResults(
+                {year: h.items() for year, h in self.heaps[k].items()}, self.num_docs[k], k, self.tfidf.name
+            )
+            for k in self.keywords
+        ]
+
+
+class AuthorPartitionConsumer(VolumeConsumer):
+    """
+    Partitions a corpus by author within each year period during a corpus scan.
+    """
+
+    def __init__(self, tfidf):
+
+        self.tfidf = tfidf
+        self.builders = None
+
+    def fields(self):
+
+        return [self.tfidf.text_type, self.tfidf.date_key, "Author"]
+
+    def start(self):
+
+        self.builders = {year: AuthorMatrixBuilder() for year in self.tfidf.year_list}
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        self.tfidf._partition_by_author(volume, self.builders)
+
+    def finish(self):
+
+        self.tfidf.author_partition = {
+            year: b.build(len(self.tfidf.word_to_id[year])) for year, b in self.builders.items()
+        }
 
 
 class Tfidf:
     """
     Data structure for identifying documents and their corresponding TF-IDF
     scores, with respect to particular keywords and a list of year periods.
+    Document scores are held as a sparse TF-IDF matrix per period (see
+    build_tf_idf_matrices), built from the bag of words corpora and the
+    idf weights of the TF-IDF models.
+    If corpus_dir is set, bag of words corpora are streamed to Matrix Market
+    files in its {name}_{text_type} subdirectory rather than held in memory.
+
+    If any of no_below, no_above or keep_n are set, each period's vocabulary is
+    pruned (see utils.prune_dicts) after a first pass over the corpus, and corpora
+    are built over the pruned vocabularies by a second pass.
     """
 
     def __init__(
             self, name: str, in_dir: str, text_type: str, year_list: list,
-            date_key: str, stop_words: [list, set, None] = None):
+            date_key: str, stop_words: [list, set, None] = None, corpus_dir: [str, None] = None,
+            no_below: [int, None] = None, no_above: [float, None] = None, keep_n: [int, None] = None,
+            cache: [ResultCache, None] = None):
 
         self.name = name
         self.in_dir = in_dir
         self.text_type = text_type
         self.year_list = year_list
+        self.periods = PeriodMapper(year_list)
         self.date_key = date_key
         self.stop_words = setup_stop_words(stop_words)
+        self.corpus_dir = corpus_dir
+        self.no_below = no_below
+        self.no_above = no_above
+        self.keep_n = keep_n
+        self.prune = no_below is not None or no_above is not None or keep_n is not None
+        self.cache = cache
 
         self.tf_idf_models = None
         self.word_to_id = None
         self.corpora = None
-        self.author_dict = None
+        self.corpus_docs = None
+        self.tf_idf_matrices = None
+        self.author_partition = None
 
-    def _update_dictionaries_and_corpora(self, k, json_data, word_to_id_results, corpora_results):
+    def _update_dictionaries_and_corpora(self, json_data, word_to_id_results, corpora_results):
         """
-        Add data from a single volume to dictionary and corpora dicts.
+        Add data from a single volume to dictionary and corpora dicts. Returns
+        the period the volume was added to the corpora of, if it was.
         """
 
-        year = int(json_data[k][self.date_key])
+        year = int(json_data[self.date_key])
+
+        if self.periods.contains(year):
+            text = [t for t in json_data[self.text_type] if t not in self.stop_words]
+
+            target = self.periods.period(year)
+
+            if len(text) > 0:
+
+                if corpora_results is None:
+                    word_to_id_results[target].add_documents([text])
+
+                else:
+                    # updating the dictionary while converting hashes each token once
+                    d2b = word_to_id_results[target].doc2bow(text, allow_update=True)
+                    corpora_results[target].append(d2b)
+
+                    return target
 
-        if self.year_list[0] <= year < self.year_list[-1]:
-            text = json_data[k][self.text_type]
+        return None
 
-            for i in range(len(text) - 1, -1, -1):
+    def _update_corpora(self, json_data, corpora_results):
+        """
+        Add the bag of words of a single volume, over the existing word -> id mappings, to corpora dicts.
+        Returns the period the volume was added to, if it was.
+        """
+
+        year = int(json_data[self.date_key])
 
-                if text[i] in self.stop_words:
-                    del text[i]
+        if self.periods.contains(year):
+            text = [t for t in json_data[self.text_type] if t not in self.stop_words]
 
-            target = determine_year(year, self.year_list)
+            target = self.periods.period(year)
 
             if len(text) > 0:
-                word_to_id_results[target].add_documents([text])
-                d2b = word_to_id_results[target].doc2bow(text)
-                corpora_results[target].append(d2b)
+                corpora_results[target].append(self.word_to_id[target].doc2bow(text))
+
+                return target
+
+        return None
+
+    def dictionary_consumer(self):
+        """
+        Return a consumer that builds this object's dictionaries and corpora
+        when passed to Corpus.scan() alongside other analyses.
+        """
+
+        return DictionaryConsumer(self)
+
+    def bow_consumer(self):
+        """
+        Return a consumer that builds this object's corpora over its existing
+        word -> id mappings when passed to Corpus.scan() alongside other analyses.
+        """
+
+        if self.word_to_id is None:
+            raise Exception("Word to ID mappings must be built or loaded before building corpora.\n")
+
+        return BowConsumer(self)
 
     def build_dictionaries_and_corpora(self):
         """
         Construct word_to_id which store the word -> id mappings and the bag of words
         representations of the documents in the corpus. Used for building TF-IDF models
-        and LDA / LSI topic models.
+        and LDA / LSI topic models. Nothing is built if the word -> id mappings already
+        are, e.g. by load_models(), see build_corpora.
         """
 
         if self.word_to_id is not None:
-            return
-
-        word_to_id_results = gensim_dict(self.year_list)
-        corpora_results = list_dict(self.year_list)
+            return self
 
         print("Building word to ID mappings.\n")
 
-        for subdir, dirs, files in os.walk(self.in_dir):
-            for jsondoc in tqdm.tqdm(files):
-                if jsondoc[0] != ".":
+        CorpusScanner(self.in_dir, [self.dictionary_consumer()]).run()
 
-                    with open(self.in_dir + "/" + jsondoc, 'r', encoding='utf8') as in_file:
+        if self.corpora is None:
+            self.build_corpora()
+
+        return self
+
+    def build_corpora(self):
+        """
+        Build the bag of words corpora over the existing word -> id mappings (built first,
+        if they aren't yet), unless they already are. Only needed to build TF-IDF models
+        and matrices, loaded models are scored without them.
+        """
 
-                        try:
-                            json_data = json.load(in_file)
-                            for k in json_data.keys():
+        if self.word_to_id is None:
+            self.build_dictionaries_and_corpora()
 
-                                self._update_dictionaries_and_corpora(k, json_data, word_to_id_results, corpora_results)
-                        except json.decoder.JSONDecodeError:
+        if self.corpora is None or self.corpus_docs is None:
 
-                            print("Error loading file {}".format(jsondoc))
+            print("Building bag of words corpora.\n")
 
-        self.word_to_id = word_to_id_results
-        self.corpora = corpora_results
+            CorpusScanner(self.in_dir, [self.bow_consumer()]).run()
 
         return self
 
-    def save_models(self, out_dir: str):
+    def _store_header(self):
         """
-        Write dictionaries and tf-idf models to file.
+        Describe this object's models for the model store.
         """
 
-        if self.word_to_id is None or self.corpora is None:
-            self.build_dictionaries_and_corpora()
+        return ModelStore.header(
+            corpus_fingerprint(self.in_dir), self.text_type, self.year_list, self.stop_words,
+            {"no_below": self.no_below, "no_above": self.no_above, "keep_n": self.keep_n}
+        )
+
+    def save_models(self, out_dir: str):
+        """
+        Write dictionaries and tf-idf models to a model store at out_dir. Models are stored
+        under a key derived from the corpus, text field, year list, stop words & pruning
+        parameters, alongside any other models already in the store.
+        """
 
         if self.tf_idf_models is None:
             self.build_tf_idf_models()
 
-        build_out(out_dir)
-        os.mkdir("{0}/{1}".format(out_dir, 'tfidf'))
-        os.mkdir("{0}/{1}".format(out_dir, 'dictionaries'))
-
-        print("Saving TF-IDF models to {}".format(out_dir))
+        path = ModelStore(out_dir).save(
+            self._store_header(), {"tfidf": self.tf_idf_models, "dictionaries": self.word_to_id}
+        )
 
-        for year in self.year_list:
+        print("Saved TF-IDF models to {}".format(path))
 
-            model = self.tf_idf_models[year]
-            model.save("{0}/tfidf/{1}".format(out_dir, str(year)))
-
-            dictionary = self.word_to_id[year]
-            dictionary.save("{0}/dictionaries/{1}".format(out_dir, str(year)))
+        return self
 
-    def load_models(self, in_dir: str):
+    def load_models(self, in_dir: str, max_loaded: [int, None] = None):
         """
-        Load dictionaries and tf-idf models from file.
+        Load dictionaries and tf-idf models from a model store, or from a directory
+        written by earlier versions of save_models. Each period's models are loaded,
+        memory-mapped, on first use, and at most <max_loaded> periods are held in
+        memory at once (all of them by default).
         """
 
-        self.tf_idf_models = {}
-        self.word_to_id = {}
+        store = ModelStore(in_dir)
+        header = self._store_header()
 
-        print("Loading TF-IDF models from {}".format(in_dir))
+        if store.has(header):
 
-        for year in self.year_list:
-            self.tf_idf_models[year] = TfidfModel.load("{0}/tfidf/{1}".format(in_dir, str(year)))
-            self.word_to_id[year] = Dictionary.load("{0}/dictionaries/{1}".format(in_dir, str(year)))
+            print("Loading TF-IDF models from {}".format(store.entry_path(header)))
+
+            self.tf_idf_models = store.load(header, "tfidf", TfidfModel.load, max_loaded)
+            self.word_to_id = store.load(header, "dictionaries", Dictionary.load, max_loaded)
+
+        elif os.path.isdir("{}/tfidf".format(in_dir)):
+
+            print("Loading TF-IDF models from {}".format(in_dir))
+
+            self.tf_idf_models = LazyPeriods(
+                {year: "{0}/tfidf/{1}".format(in_dir, str(year)) for year in self.year_list}, TfidfModel.load,
+                max_loaded
+            )
+            self.word_to_id = LazyPeriods(
+                {year: "{0}/dictionaries/{1}".format(in_dir, str(year)) for year in self.year_list}, Dictionary.load,
+                max_loaded
+            )
+
+        else:
+            raise Exception(
+                "No TF-IDF models in {} match this corpus, text field, year list and stop words.\n".format(in_dir)
+            )
+
+        self.tf_idf_matrices = None
 
         return self
 
@@ -134,8 +402,7 @@ class Tfidf:
         to construct TF-IDF models for each year period.
         """
 
-        if self.word_to_id is None or self.corpora is None:
-            self.build_dictionaries_and_corpora()
+        self.build_corpora()
 
         results = num_dict(self.year_list)
 
@@ -145,186 +412,235 @@ class Tfidf:
             results[year] = TfidfModel(self.corpora[year], dictionary=self.word_to_id[year])
 
         self.tf_idf_models = results
+        self.tf_idf_matrices = None
 
         return self
 
-    def _update_top_n(self, k, json_data, results, num_docs, keyword, jsondoc):
+    def build_tf_idf_matrices(self):
         """
-        Update dictionary that stores the top <n> documents w/r/t a given
-        keyword within a corpus.
+        Score every document of each year period against its TF-IDF model, holding
+        the scores as a sparse document x term matrix per period. Keyword queries
+        over the matrices are column slices rather than passes over the corpus.
         """
 
-        year = int(json_data[k][self.date_key])
+        if self.tf_idf_models is None:
+            self.build_tf_idf_models()
 
-        if self.year_list[0] <= year < self.year_list[-1]:
+        self.build_corpora()
 
-            text = json_data[k][self.text_type]
+        results = num_dict(self.year_list)
 
-            if keyword in set(text):
+        print("Building TF-IDF matrices.\n")
 
-                target = determine_year(year, self.year_list)
-                num_docs[target] += 1
-                d2b = self.word_to_id[target].doc2bow(text)
-                tfidf_doc = self.tf_idf_models[target][d2b]
+        for year in tqdm.tqdm(self.year_list[:-1]):
+            results[year] = TfidfMatrix.from_corpus(
+                self.corpora[year], self.tf_idf_models[year], len(self.word_to_id[year]), self.corpus_docs[year]
+            )
 
-                for t in tfidf_doc:
+        self.tf_idf_matrices = results
 
-                    if self.word_to_id[target].get(t[0]) == keyword:
-                        results[target].append((jsondoc, t[1], k))
+        return self
 
-    def _top_n(self, results, n):
+    def _update_top_n(self, k, json_data, heaps, num_docs, keywords, jsondoc):
         """
-        Helper method, takes top results given a threshold from input top results data.
+        Offer a single document to the top <n> heaps of each keyword it contains.
+        The document is scored once, whatever the number of keywords.
         """
 
-        top_results = list_dict(self.year_list)
+        year = int(json_data[self.date_key])
+
+        if self.periods.contains(year):
+
+            text = json_data[self.text_type]
+            tokens = set(text)
+            found = [keyword for keyword in keywords if keyword in tokens]
 
-        for year in self.year_list:
-            top = sorted(results[year], key=lambda x: x[1])
-            top_results[year] = top[:n]
+            if len(found) > 0:
 
-        return top_results
+                target = self.periods.period(year)
+                d2b = self.word_to_id[target].doc2bow(text)
+                tfidf_doc = dict(self.tf_idf_models[target][d2b])
+
+                for keyword in found:
+
+                    num_docs[keyword][target] += 1
+                    score = tfidf_doc.get(self.word_to_id[target].token2id.get(keyword))
 
-    def top_n(self, keyword: str, n: int = 10):
+                    if score is not None:
+                        heaps[keyword][target].push(score, (jsondoc, score, k))
+
+    def top_n_consumer(self, keywords: [str, list], n: int = 10):
         """
-        Iterates over the corpus and computes TF-IDF scores for each document,
-        with respect to the precomputed TF-IDF models. Extracts results for a
-        particular keyword and displays the <n> documents whose TF-IDF scores
-        for that keyword are the highest.
+        Return a consumer that collects the <n> documents with the highest TF-IDF
+        scores for a keyword, or for each of a list of keywords. TF-IDF models must
+        already be built or loaded.
         """
 
         if self.tf_idf_models is None:
-            self.build_tf_idf_models()
+            raise Exception("TF-IDF models must be built or loaded before scanning for top documents.\n")
 
-        results = list_dict(self.year_list)
-        num_docs = num_dict(self.year_list, nested=0)
+        if isinstance(keywords, str):
+            keywords = [keywords]
 
-        print("Calculating {0} files with top TF-IDF scores for \'{1}\'\n".format(n, keyword))
+        return TopNConsumer(self, keywords, n)
 
-        for subdir, dirs, files in os.walk(self.in_dir):
-            for jsondoc in tqdm.tqdm(files):
-                if jsondoc[0] != ".":
+    def _top_n_from_matrices(self, keyword: str, n: int):
+        """
+        Take the <n> documents with the highest TF-IDF scores for a keyword from the TF-IDF matrices.
+        """
+
+        top_results = list_dict(self.year_list)
+        num_docs = num_dict(self.year_list, nested=0)
 
-                    with open(self.in_dir + "/" + jsondoc, 'r', encoding='utf8') as in_file:
+        for year in self.year_list[:-1]:
 
-                        try:
-                            json_data = json.load(in_file)
-                            for k in json_data.keys():
+            matrix = self.tf_idf_matrices[year]
+            col = self.word_to_id[year].token2id.get(keyword)
 
-                                self._update_top_n(k, json_data, results, num_docs, keyword, jsondoc)
+            if col is None:
+                continue
 
-                        except json.decoder.JSONDecodeError:
-                            print("Error loading file {}".format(jsondoc))
+            num_docs[year] = matrix.doc_freq([col])
 
-        top_results = self._top_n(results, n)
+            for row, score in matrix.top([col], n):
+                json_doc, key = matrix.docs[row]
+                top_results[year].append((json_doc, score, key))
 
         return TfidfResults(top_results, num_docs, keyword, self.name)
 
-    @staticmethod
-    def _cleanup_author_dict(doc_to_bow_list):
+    def _cache_params(self):
         """
-        Merge single list of d2b scores.
+        Parameters of this object that results depend on, for the result cache.
         """
 
-        ret = {}
-
-        for t in doc_to_bow_list:
+        return {"name": self.name, "no_below": self.no_below, "no_above": self.no_above, "keep_n": self.keep_n}
 
-            try:
-                ret[t[0]] += t[1]
+    @cached_result(ignore=("use_index", "use_matrices"))
+    def top_n(self, keywords: [str, list], n: int = 10, use_index: bool = True, use_matrices: [bool, None] = None):
+        """
+        Computes TF-IDF scores for each document, with respect to the precomputed
+        TF-IDF models. Extracts results for a particular keyword and displays the
+        <n> documents whose TF-IDF scores for that keyword are the highest. Given
+        a list of keywords, returns a list of results, one per keyword.
+
+        With use_matrices, scores are read from TF-IDF matrices, which are built on
+        first use. Otherwise, the corpus is scanned once for all keywords, and when an
+        up to date inverted index of the text field has been built, only files
+        containing a keyword are read. By default, matrices are used when they, or the
+        bag of words corpora they're built from, are already in memory, e.g. after
+        build_tf_idf_models(). Models from load_models() are queried by scanning, since
+        building matrices for them would read every period's models and the whole corpus.
+        """
 
-            except KeyError:
-                ret[t[0]] = t[1]
+        single = isinstance(keywords, str)
 
-        return [(k, ret[k]) for k in ret.keys()]
+        if single:
+            keywords = [keywords]
 
-    def cleanup_author_dict(self, author_dict):
-        """
-        Iterate over author_dict and merge d2b scores.
-        """
+        if self.tf_idf_models is None:
+            self.build_tf_idf_models()
 
-        for k in author_dict.keys():
-            for kk in author_dict[k].keys():
+        if use_matrices is None:
+            use_matrices = self.tf_idf_matrices is not None or \
+                (self.corpora is not None and self.corpus_docs is not None)
 
-                new_doc_to_bow = self._cleanup_author_dict(author_dict[k][kk])
-                author_dict[k][kk] = new_doc_to_bow
+        print("Calculating {0} files with top TF-IDF scores for \'{1}\'\n".format(n, "\', \'".join(keywords)))
 
-        return author_dict
+        if use_matrices:
 
-    def _partition_by_author(self, k, json_data, author_dict):
-        """
-        Helper method, update author_dict with a single document.
-        """
+            if self.tf_idf_matrices is None:
+                self.build_tf_idf_matrices()
 
-        year = int(json_data[k][self.date_key])
+            results = [self._top_n_from_matrices(k, n) for k in keywords]
 
-        if self.year_list[0] <= year < self.year_list[-1]:
+        else:
 
-            text = json_data[k][self.text_type]
-            author = re.sub(r'\W+', '_', json_data[k]["Author"]).lower()
-            target = determine_year(year, self.year_list)
+            index = InvertedIndex.load(self.in_dir, self.text_type) if use_index else None
+            files = index.files_with(keywords) if index is not None and index.is_fresh() else None
 
-            d2b = self.word_to_id[target].doc2bow(text)
+            consumer = self.top_n_consumer(keywords, n)
+            CorpusScanner(self.in_dir, [consumer]).run(files)
 
-            try:
-                author_dict[target][author].extend(d2b)
+            results = consumer.tfidf_results()
 
-            except KeyError:
-                author_dict[target][author] = d2b
+        return results[0] if single else results
 
-    def partition_by_author(self):
+    def _partition_by_author(self, json_data, builders):
         """
-        Within each year period, partition corpus by each author.
+        Helper method, add a single document to the author partition builders.
         """
 
-        if self.tf_idf_models is None:
-            self.build_tf_idf_models()
+        year = int(json_data[self.date_key])
 
-        author_dict = simple_dict(self.year_list)
+        if self.periods.contains(year):
 
-        print("Partitioning corpus by author.\n")
+            text = json_data[self.text_type]
+            author = re.sub(r'\W+', '_', json_data["Author"]).lower()
+            target = self.periods.period(year)
 
-        for subdir, dirs, files in os.walk(self.in_dir):
-            for jsondoc in tqdm.tqdm(files):
-                if jsondoc[0] != ".":
+            builders[target].add(author, self.word_to_id[target].doc2bow(text))
 
-                    with open(self.in_dir + "/" + jsondoc, 'r', encoding='utf8')  as infile:
+    def author_partition_consumer(self):
+        """
+        Return a consumer that partitions the corpus by author. Dictionaries
+        must already be built or loaded.
+        """
+
+        if self.word_to_id is None:
+            raise Exception("Dictionaries must be built or loaded before partitioning by author.\n")
 
-                        try:
-                            json_data = json.load(infile)
-                            for k in json_data.keys():
+        return AuthorPartitionConsumer(self)
 
-                                self._partition_by_author(k, json_data, author_dict)
+    def partition_by_author(self):
+        """
+        Within each year period, partition corpus by each author. Each period's
+        partition is a sparse author x term matrix of summed term counts.
+        """
 
-                        except json.decoder.JSONDecodeError:
+        if self.tf_idf_models is None:
+            self.build_tf_idf_models()
 
-                            print("Error loading file {}".format(jsondoc))
+        print("Partitioning corpus by author.\n")
 
-        self.author_dict = self.cleanup_author_dict(author_dict)
+        CorpusScanner(self.in_dir, [self.author_partition_consumer()]).run()
 
         return self
 
     def save_author_partition(self, out_dir):
         """
-        Serialize author_dict to disk.
+        Write the author partition to disk, as arrays that can be memory-mapped back.
         """
 
-        print("Saving author partition to {}/author_partition.p".format(out_dir))
+        print("Saving author partition to {}/author_partition".format(out_dir))
 
-        with open("{}/author_partition.p".format(out_dir), 'wb') as outfile:
-
-            pickle.dump(self.author_dict, outfile)
+        save_author_matrices(self.author_partition, "{}/author_partition".format(out_dir))
 
     def load_author_partition(self, in_dir):
         """
-        Load precomputed author_dict
+        Load a precomputed author partition. Partitions pickled to author_partition.p
+        by earlier versions are also accepted, and require dictionaries to be built or loaded.
         """
 
+        if os.path.exists("{}/author_partition/header.json".format(in_dir)):
+
+            print("Loading precomputed author partition from {}/author_partition".format(in_dir))
+
+            self.author_partition = load_author_matrices("{}/author_partition".format(in_dir))
+
+            return self
+
         print("Loading precomputed author partition from {}/author_partition.p".format(in_dir))
 
+        if self.word_to_id is None:
+            raise Exception("Dictionaries must be built or loaded before loading a pickled author partition.\n")
+
         with open("{}/author_partition.p".format(in_dir), 'rb') as infile:
 
-            self.author_dict = pickle.load(infile)
+            author_dict = pickle.load(infile)
+
+        self.author_partition = {
+            year: AuthorMatrix.from_bows(author_dict[year], len(self.word_to_id[year])) for year in author_dict.keys()
+        }
 
         return self
 
@@ -333,51 +649,46 @@ class Tfidf:
         For each year period & author, take TF-IDF scores for each keyword.
         """
 
-        if self.word_to_id is None or self.corpora is None:
-            self.build_dictionaries_and_corpora()
-
         if self.tf_idf_models is None:
             self.build_tf_idf_models()
 
-        if self.author_dict is None:
+        if self.author_partition is None:
             self.partition_by_author()
 
-        ret = {"scores": {}, "metadata": {"KEYS": key_list, "YEARS": list(self.author_dict.keys())}}
-
-        for y in self.author_dict.keys():
-
-            ret["scores"][y] = {}
-            print("Building TF-IDF scores dictionary for period {}".format(str(y)))
+        metadata = {"KEYS": key_list, "YEARS": list(self.author_partition.keys())}
 
-            for a in tqdm.tqdm(self.author_dict[y].keys()):
+        authors = {}
+        mats = {}
 
-                ret["scores"][y][a] = {}
-                tf_idf_doc = self.tf_idf_models[y][self.author_dict[y][a]]
+        for y in self.author_partition.keys():
 
-                # loop over all words in tf-idf model, add word score to record if it matches a keyword
-                for t in tf_idf_doc:
+            print("Building TF-IDF scores matrix for period {}".format(str(y)))
 
-                    id_to_word = self.word_to_id[y].get(t[0])
+            authors[y] = self.author_partition[y].authors
+            tf = self.author_partition[y].matrix
+            num_terms = tf.shape[1]
 
-                    if id_to_word in key_list:
-                        ret["scores"][y][a][id_to_word] = t[1]
+            # score every author's merged counts at once, then slice out the keyword columns
+            weights = tfidf_weights(tf, idf_vector(self.tf_idf_models[y], num_terms)).tocsc()
 
-                # loop over key list and assign word score to 0 if it wasn't in the tf-idf model
-                for k in key_list:
+            cols = [self.word_to_id[y].token2id.get(k) for k in key_list]
+            found = [i for i, c in enumerate(cols) if c is not None]
 
-                    if k not in ret["scores"][y][a]:
-                        ret["scores"][y][a][k] = 0
+            # keywords missing from an author's tf-idf vector score 0
+            mats[y] = np.zeros((len(authors[y]), len(key_list)), dtype=np.float32)
+            mats[y][:, found] = weights[:, [cols[i] for i in found]].toarray()
 
-        return ScoreMatResults(ret)
+        return ScoreMatResults({"metadata": metadata}, authors, mats)
 
-    def cluster_k_means(self, key_list):
+    def cluster_k_means(self, key_list, embedding: str = 'tsne', workers: int = 1):
 
         scores_dict = self.setup_scores_dict(key_list)
 
-        return KMeansAuthorCluster(scores_dict)
+        return KMeansAuthorCluster(scores_dict, embedding, workers)
 
-    def cluster_hierarchical(self, key_list):
+    def cluster_hierarchical(self, key_list, embedding: str = 'tsne', workers: int = 1,
+                             max_leaves: [int, None] = None):
 
         scores_dict = self.setup_scores_dict(key_list)
 
-        return HierarchicalAuthorCluster(scores_dict)
+        return HierarchicalAuthorCluster(scores_dict, embedding, workers, max_leaves)
@@ -0,0 +1,183 @@
+import heapq
+import numpy as np
+
+from array import array
+from scipy.sparse import csr_matrix
+
+
+# weights at or below this are dropped, as in gensim's TfidfModel
+EPS = 1e-12
+
+
+def bow_matrix(bows, num_terms: int):
+    """
+    Build a CSR matrix of term counts from an iterable of bag of words lists,
+    one row per list. Repeated term ids within a list are summed.
+    """
+
+    indptr = array('q', [0])
+    indices = array('q')
+    data = array('d')
+
+    for bow in bows:
+        for term_id, count in bow:
+            indices.append(int(term_id))
+            data.append(count)
+        indptr.append(len(indices))
+
+    matrix = csr_matrix(
+        (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, num_terms)
+    )
+    matrix.sum_duplicates()
+
+    return matrix
+
+
+def idf_vector(model, num_terms: int):
+    """
+    Dense vector of the idf weights held by a gensim TfidfModel, indexed by term id.
+    """
+
+    idf = np.zeros(num_terms, dtype=np.float64)
+
+    for term_id, weight in model.idfs.items():
+        if term_id < num_terms:
+            idf[term_id] = weight
+
+    return idf
+
+
+def tfidf_weights(tf: csr_matrix, idf: np.ndarray):
+    """
+    Weight each row of a term count matrix by idf and scale it to unit length,
+    giving the same scores as applying a default gensim TfidfModel to each row.
+    """
+
+    idf = np.where(np.abs(idf) > EPS, idf, 0.0)
+
+    weights = csr_matrix(tf.multiply(idf[np.newaxis, :]))
+    weights.eliminate_zeros()
+
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+
+    weights = csr_matrix(weights.multiply(1.0 / norms[:, np.newaxis]))
+    weights.data[np.abs(weights.data) <= EPS] = 0
+    weights.eliminate_zeros()
+
+    return weights
+
+
+def top_rows(scores: np.ndarray, n: int):
+    """
+    Indices of the <n> highest positive entries of a score vector, in descending
+    order of score. Ties are broken by index.
+    """
+
+    candidates = np.flatnonzero(scores > 0)
+    n = min(n, len(candidates))
+
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    idx = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
+class TopNHeap:
+    """
+    Keeps the <n> highest scoring items pushed to it, in a min-heap bounded to
+    <n> entries, so memory doesn't grow with the number of items seen. Among
+    items with equal scores, those pushed first are kept.
+    """
+
+    def __init__(self, n: int):
+
+        self.n = n
+        self.heap = []
+        self.count = 0
+
+    def push(self, score: float, item):
+        """
+        Offer an item with a score.
+        """
+
+        # later items compare lower on ties, so they're the first to be evicted
+        entry = (score, -self.count, item)
+        self.count += 1
+
+        if self.n <= 0:
+            return
+
+        if len(self.heap) < self.n:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def items(self):
+        """
+        Return the items kept, in descending order of score.
+        """
+
+        return [e[2] for e in sorted(self.heap, key=lambda e: e[:2], reverse=True)]
+
+
+class TfidfMatrix:
+    """
+    TF-IDF scores of every document of a single period, held as a sparse document x term
+    matrix alongside the raw term counts and the (file, key) of the volume behind each row.
+    Scores are stored column-major, so the scores of a keyword over all documents are
+    read as a single column slice.
+    """
+
+    def __init__(self, tf: csr_matrix, idf: np.ndarray, docs: list):
+
+        self.tf = tf.tocsc()
+        self.idf = idf
+        self.scores = tfidf_weights(tf, idf).tocsc()
+        self.docs = docs
+
+    @classmethod
+    def from_corpus(cls, bows, model, num_terms: int, docs: list):
+        """
+        Build the matrix of a period from its bag of words corpus and TF-IDF model.
+        """
+
+        return cls(bow_matrix(bows, num_terms), idf_vector(model, num_terms), docs)
+
+    @property
+    def num_docs(self):
+
+        return self.scores.shape[0]
+
+    def key_scores(self, cols: list):
+        """
+        Dense document x keyword array of the scores of a list of term ids.
+        """
+
+        return self.scores[:, cols].toarray()
+
+    def doc_freq(self, cols: list):
+        """
+        Number of documents containing any of a list of term ids.
+        """
+
+        if len(cols) == 0:
+            return 0
+
+        return int((self.tf[:, cols].getnnz(axis=1) > 0).sum())
+
+    def top(self, cols: list, n: int):
+        """
+        Return (row, score) of the <n> documents with the highest summed scores
+        over a list of term ids, in descending order of score.
+        """
+
+        if len(cols) == 0:
+            return []
+
+        scores = self.key_scores(cols).sum(axis=1)
+
+        return [(int(i), float(scores[i])) for i in top_rows(scores, n)]
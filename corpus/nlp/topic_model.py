@@ -1,56 +1,229 @@
 import tqdm
+import numpy as np
+
+from multiprocessing import Pool
 
 from gensim.models.ldamodel import LdaModel
+from gensim.models.ldamulticore import LdaMulticore
 from gensim.models.lsimodel import LsiModel
 from numpy.random import RandomState
 from gensim.models import TfidfModel
 
+from corpus.nlp.streams import mm_streams, close_streams
 from corpus.results import *
+from corpus.result_cache import ResultCache, cached_result
+from corpus.scan import CorpusScanner, VolumeConsumer
+
+
+class DictionaryConsumer(VolumeConsumer):
+    """
+    Builds the word -> id mappings and bag of words corpora of a TopicModel object during a corpus scan.
+    When the TopicModel prunes its vocabulary, only the word -> id mappings are built (and
+    then pruned), corpora are built by a later BowConsumer scan.
+    """
+
+    def __init__(self, topic_model):
+
+        self.topic_model = topic_model
+        self.word_to_id_results = None
+        self.corpora_results = None
+        self.numdocs = None
+
+    def fields(self):
+
+        return [self.topic_model.text_type, self.topic_model.date_key]
+
+    def start(self):
+
+        self.word_to_id_results = gensim_dict(self.topic_model.year_list)
+        self.numdocs = num_dict(self.topic_model.year_list, nested=0)
+
+        if self.topic_model.prune:
+            self.corpora_results = None
+        elif self.topic_model.corpus_dir is None:
+            self.corpora_results = list_dict(self.topic_model.year_list)
+        else:
+            self.corpora_results = mm_streams(
+                self.topic_model.corpus_dir, self.topic_model.name,
+                self.topic_model.text_type, self.topic_model.year_list
+            )
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        self.topic_model._update_dictionaries_and_corpora(
+            volume, self.word_to_id_results, self.corpora_results, self.numdocs
+        )
+
+    def finish(self):
+
+        self.topic_model.num_docs = self.numdocs
+
+        if self.topic_model.prune:
+            self.topic_model.word_to_id = prune_dicts(
+                self.word_to_id_results, self.topic_model.no_below, self.topic_model.no_above,
+                self.topic_model.keep_n
+            )
+            self.topic_model.corpora = None
+
+        else:
+            self.topic_model.word_to_id = self.word_to_id_results
+            self.topic_model.corpora = close_streams(self.corpora_results)
+
+
+class BowConsumer(VolumeConsumer):
+    """
+    Builds the bag of words corpora of a TopicModel object, over its already built
+    word -> id mappings, during a corpus scan. Tokens missing from the mappings are dropped.
+    """
+
+    def __init__(self, topic_model):
+
+        self.topic_model = topic_model
+        self.corpora_results = None
+
+    def fields(self):
+
+        return [self.topic_model.text_type, self.topic_model.date_key]
+
+    def start(self):
+
+        if self.topic_model.corpus_dir is None:
+            self.corpora_results = list_dict(self.topic_model.year_list)
+        else:
+            self.corpora_results = mm_streams(
+                self.topic_model.corpus_dir, self.topic_model.name,
+                self.topic_model.text_type, self.topic_model.year_list
+            )
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+
+        self.topic_model._update_corpora(volume, self.corpora_results)
+
+    def finish(self):
+
+        self.topic_model.corpora = close_streams(self.corpora_results)
+
+
+def _train_lda(args):
+    """
+    Worker for LDA training, builds the model of a single period.
+    """
+
+    corpus, id2word, num_topics, passes, seed, lda_workers = args
+
+    random_state = RandomState(seed) if seed is not None else None
+
+    if lda_workers is not None:
+        return LdaMulticore(corpus=corpus, id2word=id2word, num_topics=num_topics, passes=passes,
+                            random_state=random_state, workers=lda_workers)
+
+    return LdaModel(corpus=corpus, id2word=id2word, num_topics=num_topics, passes=passes,
+                    random_state=random_state)
+
+
+def _train_lsi(args):
+    """
+    Worker for LSI training, builds the model of a single period.
+    """
+
+    corpus, tf_idf_model, id2word, num_topics, stochastic, seed = args
+
+    return LsiModel(corpus=tf_idf_model[corpus], id2word=id2word, num_topics=num_topics,
+                    onepass=not stochastic, random_seed=seed)
 
 
 class TopicModel:
     """
     Data structure for building topic models over a
     corpus, with respect to a list of year periods.
+    If corpus_dir is set, bag of words corpora are streamed to Matrix Market
+    files in its {name}_{text_type} subdirectory rather than held in memory.
+
+    If any of no_below, no_above or keep_n are set, each period's vocabulary is
+    pruned (see utils.prune_dicts) after a first pass over the corpus, and corpora
+    are built over the pruned vocabularies by a second pass.
     """
 
     def __init__(
             self, name: str, in_dir: str, text_type: str, year_list: list,
-            date_key: str, stop_words: [list, set, str, None] = None):
+            date_key: str, stop_words: [list, set, str, None] = None, corpus_dir: [str, None] = None,
+            no_below: [int, None] = None, no_above: [float, None] = None, keep_n: [int, None] = None,
+            cache: [ResultCache, None] = None):
 
         self.name = name
         self.in_dir = in_dir
         self.text_type = text_type
         self.year_list = year_list
+        self.periods = PeriodMapper(year_list)
         self.date_key = date_key
         self.stop_words = setup_stop_words(stop_words)
+        self.corpus_dir = corpus_dir
+        self.no_below = no_below
+        self.no_above = no_above
+        self.keep_n = keep_n
+        self.prune = no_below is not None or no_above is not None or keep_n is not None
+        self.cache = cache
         self.tf_idf_models = None
         self.word_to_id = None
         self.corpora = None
         self.num_docs = None
 
-    def _update_dictionaries_and_corpora(self, k, json_data, word_to_id_results, corpora_results, numdocs):
+    def _update_dictionaries_and_corpora(self, json_data, word_to_id_results, corpora_results, numdocs):
         """
         Update dictionaries and corpora with results from a single volume.
         """
 
-        year = int(json_data[k][self.date_key])
+        year = int(json_data[self.date_key])
+
+        if self.periods.contains(year):
+            text = [t for t in json_data[self.text_type] if t not in self.stop_words and len(t) >= 2]
+
+            target = self.periods.period(year)
+            numdocs[target] += 1
 
-        if self.year_list[0] <= year < self.year_list[-1]:
-            text = json_data[k][self.text_type]
+            if len(text) > 0:
 
-            for i in range(len(text) - 1, -1, -1):
+                if corpora_results is None:
+                    word_to_id_results[target].add_documents([text])
 
-                if text[i] in self.stop_words or len(text[i]) < 2:
-                    del text[i]
+                else:
+                    # updating the dictionary while converting hashes each token once
+                    d2b = word_to_id_results[target].doc2bow(text, allow_update=True)
+                    corpora_results[target].append(d2b)
 
-            target = determine_year(year, self.year_list)
-            numdocs[target] += 1
+    def _update_corpora(self, json_data, corpora_results):
+        """
+        Add the bag of words of a single volume, over the existing word -> id mappings, to corpora dicts.
+        """
+
+        year = int(json_data[self.date_key])
+
+        if self.periods.contains(year):
+            text = [t for t in json_data[self.text_type] if t not in self.stop_words and len(t) >= 2]
+
+            target = self.periods.period(year)
 
             if len(text) > 0:
-                word_to_id_results[target].add_documents([text])
-                d2b = word_to_id_results[target].doc2bow(text)
-                corpora_results[target].append(d2b)
+                corpora_results[target].append(self.word_to_id[target].doc2bow(text))
+
+    def dictionary_consumer(self):
+        """
+        Return a consumer that builds this object's dictionaries and corpora
+        when passed to Corpus.scan() alongside other analyses.
+        """
+
+        return DictionaryConsumer(self)
+
+    def bow_consumer(self):
+        """
+        Return a consumer that builds this object's corpora over its existing
+        word -> id mappings when passed to Corpus.scan() alongside other analyses.
+        """
+
+        if self.word_to_id is None:
+            raise Exception("Word to ID mappings must be built before building corpora.\n")
+
+        return BowConsumer(self)
 
     def build_dictionaries_and_corpora(self):
         """
@@ -59,66 +232,90 @@ class TopicModel:
         and LDA / LSI topic models.
         """
 
-        if self.word_to_id is not None:
-            return
+        if self.word_to_id is None:
+
+            print("Building word to ID mappings.")
+
+            CorpusScanner(self.in_dir, [self.dictionary_consumer()]).run()
+
+        if self.corpora is None:
+
+            print("Building bag of words corpora.")
 
-        word_to_id_results = gensim_dict(self.year_list)
-        corpora_results = list_dict(self.year_list)
-        numdocs = num_dict(self.year_list, nested=0)
+            CorpusScanner(self.in_dir, [self.bow_consumer()]).run()
 
-        print("Building word to ID mappings.")
+        return self
+
+    def _period_seeds(self, seed: [int, None]):
+        """
+        Derive an independent seed for each period from a single seed, so that
+        each period's model is reproducible regardless of the order (or the
+        process) in which periods are trained.
+        """
 
-        for subdir, dirs, files in os.walk(self.in_dir):
-            for jsondoc in tqdm.tqdm(files):
-                if jsondoc[0] != ".":
+        if seed is None:
+            return {year: None for year in self.year_list[:-1]}
 
-                    with open(self.in_dir + "/" + jsondoc, 'r', encoding='utf8') as in_file:
+        states = np.random.SeedSequence(seed).spawn(len(self.year_list) - 1)
 
-                        try:
+        return {year: int(s.generate_state(1)[0]) for year, s in zip(self.year_list[:-1], states)}
 
-                            jsondata = json.load(in_file)
+    def _train_periods(self, worker, args: dict, workers: int):
+        """
+        Train one model per period, concurrently across a pool of processes when workers > 1.
+        """
 
-                            for k in jsondata.keys():
+        years = list(args.keys())
 
-                                self._update_dictionaries_and_corpora(
-                                    k, jsondata, word_to_id_results, corpora_results, numdocs
-                                )
+        if workers > 1 and len(years) > 1:
+            with Pool(min(workers, len(years))) as pool:
+                models = list(tqdm.tqdm(pool.imap(worker, [args[year] for year in years]), total=len(years)))
+        else:
+            models = [worker(args[year]) for year in tqdm.tqdm(years)]
 
-                        except json.decoder.JSONDecodeError:
+        results = num_dict(self.year_list)
 
-                            print("Error loading file {}".format(jsondoc))
+        for year, model in zip(years, models):
+            results[year] = model
 
-        self.word_to_id = word_to_id_results
-        self.corpora = corpora_results
-        self.num_docs = numdocs
+        return results
 
-        return self
+    def _cache_params(self):
+        """
+        Parameters of this object that results depend on, for the result cache.
+        """
 
-    def lda_model(self, num_topics: [int, None] = 10, passes: [int, None] = 1, seed: [int, None] = None):
+        return {"name": self.name, "no_below": self.no_below, "no_above": self.no_above, "keep_n": self.keep_n}
+
+    @cached_result(ignore=("workers",), require=("seed",))
+    def lda_model(self, num_topics: [int, None] = 10, passes: [int, None] = 1, seed: [int, None] = None,
+                  workers: int = 1, multicore: bool = False):
         """
         Construct LDA topic models for each year in a
         corpus, given a set of parameters.
+
+        With workers > 1, periods are trained concurrently in that many processes.
+        With multicore=True, periods are instead trained one after another, each
+        with gensim's LdaMulticore across <workers> processes, which is faster
+        when there are fewer periods than cores. Each period's model is seeded
+        with its own seed derived from <seed>.
         """
 
         if self.word_to_id is None or self.corpora is None:
             self.build_dictionaries_and_corpora()
 
-        results = num_dict(self.year_list)
-
-        if seed is None:
+        print("Building LDA models.\n")
 
-            for year in self.year_list[:-1]:
-                results[year] = \
-                    LdaModel(corpus=self.corpora[year], id2word=self.word_to_id[year],
-                             num_topics=num_topics, passes=passes)
+        seeds = self._period_seeds(seed)
 
-        else:
+        args = {
+            year: (self.corpora[year], self.word_to_id[year], num_topics, passes, seeds[year],
+                   workers if multicore else None)
+            for year in self.year_list[:-1]
+        }
 
-            rand = RandomState(seed)
-            for year in self.year_list[:-1]:
-                results[year] = \
-                    LdaModel(corpus=self.corpora[year], id2word=self.word_to_id[year],
-                             num_topics=num_topics, passes=passes, random_state=rand)
+        # LdaMulticore starts its own worker processes, so periods can't also be spread over a pool
+        results = self._train_periods(_train_lda, args, 1 if multicore else workers)
 
         return TopicResults(results, self.num_docs, self.name)
 
@@ -140,10 +337,15 @@ class TopicModel:
 
         return self
 
-    def lsi_model(self, num_topics: int = 10, stochastic: bool = False):
+    @cached_result(ignore=("workers",), require=("seed",))
+    def lsi_model(self, num_topics: int = 10, stochastic: bool = False, seed: [int, None] = None,
+                  workers: int = 1):
         """
         Construct LSI topic models for each year in a
         corpus, given a set of parameters.
+
+        With workers > 1, periods are trained concurrently in that many processes.
+        Each period's model is seeded with its own seed derived from <seed>.
         """
 
         if self.word_to_id is None or self.corpora is None:
@@ -152,26 +354,16 @@ class TopicModel:
         if self.tf_idf_models is None:
             self.build_tf_idf_models()
 
-        results = num_dict(self.year_list)
-
-        if not stochastic:
+        print("Building LSI models.\n")
 
-            for year in self.year_list[:-1]:
-                results[year] = \
-                    LsiModel(corpus=self.tf_idf_models[year][self.corpora[year]],
-                             id2word=self.word_to_id[year],
-                             num_topics=num_topics
-                             )
+        seeds = self._period_seeds(seed)
 
-        else:
-
-            for year in self.year_list[:-1]:
-                results[year] = \
-                    LsiModel(corpus=self.tf_idf_models[year][self.corpora[year]],
-                             id2word=self.word_to_id[year],
-                             num_topics=num_topics,
-                             onepass=False
-                             )
+        args = {
+            year: (self.corpora[year], self.tf_idf_models[year], self.word_to_id[year], num_topics,
+                   stochastic, seeds[year])
+            for year in self.year_list[:-1]
+        }
 
-        return TopicResults(results, self.num_docs)
+        results = self._train_periods(_train_lsi, args, workers)
 
+        return TopicResults(results, self.num_docs, self.name)
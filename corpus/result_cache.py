@@ -0,0 +1,225 @@
+import time
+import pickle
+import hashlib
+import inspect
+import functools
+
+from corpus.nlp.model_store import corpus_fingerprint, stop_words_hash
+from corpus.utils import *
+
+
+RESULTS_DIR = ".corpus_results"
+RESULTS_VERSION = 1
+
+# 512 MB
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ResultCache:
+    """
+    On-disk cache of analysis results, addressed by a hash of everything a result
+    depends on: the fingerprint of the corpus (so any added, removed or modified
+    volume file invalidates it), the method called, the text field, date key, year
+    list, stop words and the method's parameters. Each result is pickled to its own
+    file. When the files of the cache exceed <max_bytes>, the least recently used
+    results are evicted.
+    """
+
+    def __init__(self, root: str, max_bytes: [int, None] = DEFAULT_MAX_BYTES):
+
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def for_corpus(cls, in_dir: str, max_bytes: [int, None] = DEFAULT_MAX_BYTES):
+        """
+        Cache stored in a hidden directory at the root of a corpus.
+        """
+
+        return cls(os.path.join(in_dir, RESULTS_DIR), max_bytes)
+
+    @staticmethod
+    def key(in_dir: str, method: str, text_type: str, date_key: [str, None], year_list: [list, None],
+            stop_words: [set, list, dict, None], params: dict):
+        """
+        Key of a result.
+        """
+
+        header = {
+            "version": RESULTS_VERSION,
+            "fingerprint": corpus_fingerprint(in_dir),
+            "method": method,
+            "text_type": text_type,
+            "date_key": date_key,
+            "year_list": list(year_list) if year_list is not None else None,
+            "stop_words": stop_words_hash(stop_words) if stop_words else None,
+            "params": params
+        }
+
+        # keywords are tuples, which are written as lists
+        return hashlib.sha1(json.dumps(header, sort_keys=True, default=str).encode('utf8')).hexdigest()
+
+    def _path(self, key: str):
+
+        return "{0}/{1}.p".format(self.root, key)
+
+    def get(self, key: str):
+        """
+        Return (True, result) if a result is cached under key, (False, None) otherwise.
+        """
+
+        path = self._path(key)
+
+        try:
+            with open(path, 'rb') as in_file:
+                result = pickle.load(in_file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return False, None
+
+        # modification time tracks last use, for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return True, result
+
+    def put(self, key: str, result):
+        """
+        Cache a result under key, then evict old results if the cache is over its size bound.
+        Results that can't be written (e.g. to a read-only corpus) are silently not cached.
+        """
+
+        path = self._path(key)
+        tmp_path = "{0}.{1}.tmp".format(path, os.getpid())
+
+        try:
+            os.makedirs(self.root, exist_ok=True)
+
+            with open(tmp_path, 'wb') as out_file:
+                pickle.dump(result, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+            # renamed into place, so an interrupted write is never read
+            os.replace(tmp_path, path)
+
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+            return self
+
+        self.evict()
+
+        return self
+
+    def evict(self):
+        """
+        Remove the least recently used results until the cache fits within max_bytes.
+        """
+
+        if self.max_bytes is None or not os.path.isdir(self.root):
+            return self
+
+        entries = []
+
+        for f in os.listdir(self.root):
+            if f.endswith(".p"):
+                try:
+                    st = os.stat("{0}/{1}".format(self.root, f))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, f))
+
+        total = sum(e[1] for e in entries)
+
+        for _, size, f in sorted(entries):
+
+            if total <= self.max_bytes:
+                break
+
+            try:
+                os.remove("{0}/{1}".format(self.root, f))
+            except OSError:
+                continue
+
+            total -= size
+
+        return self
+
+    def clear(self):
+        """
+        Remove every cached result.
+        """
+
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+        return self
+
+    def fetch(self, in_dir: str, method: str, text_type: str, date_key: [str, None], year_list: [list, None],
+              stop_words: [set, list, dict, None], params: dict, compute):
+        """
+        Return the cached result of a call, or compute and cache it.
+        """
+
+        key = self.key(in_dir, method, text_type, date_key, year_list, stop_words, params)
+
+        found, result = self.get(key)
+
+        if found:
+            print("Loaded cached result of {}".format(method))
+            return result
+
+        start = time.time()
+        result = compute()
+
+        print("Caching result of {0} ({1:.1f}s)".format(method, time.time() - start))
+
+        self.put(key, result)
+
+        return result
+
+
+def cached_result(ignore: tuple = (), require: tuple = ()):
+    """
+    Decorate an analysis method so that its results are served from the object's result
+    cache (its <cache> attribute), when one is set. Results are keyed by the object's
+    in_dir, text_type, date_key, year_list & stop_words, the parameters returned by its
+    _cache_params() method, and the arguments of the call except those in <ignore>,
+    which mustn't change the result. Calls where any argument in <require> is None
+    (e.g. an unseeded random model) are never cached.
+    """
+
+    def decorator(func):
+
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+
+            cache = getattr(self, "cache", None)
+
+            if cache is None:
+                return func(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+
+            if any(bound.arguments[r] is None for r in require):
+                return func(self, *args, **kwargs)
+
+            params = {
+                "args": {k: v for k, v in bound.arguments.items() if k != "self" and k not in ignore},
+                "object": self._cache_params()
+            }
+
+            return cache.fetch(
+                self.in_dir, "{0}.{1}".format(type(self).__name__, func.__name__), self.text_type,
+                getattr(self, "date_key", None), getattr(self, "year_list", None), getattr(self, "stop_words", None),
+                params, lambda: func(self, *args, **kwargs)
+            )
+
+        return wrapper
+
+    return decorator
@@ -467,17 +467,222 @@ class DiffPropResults:
                 )
 
 
+class DiffPropBatchResults:
+    """
+    Stores difference in proportions metrics between every pair of a set of corpora,
+    for each keyword and all keywords together (rows), in each period. Proportions are
+    held as a corpora x rows x periods array, and z scores, p values, adjusted p values
+    and rejections of the null hypothesis as pairs x rows x periods arrays.
+    """
+
+    def __init__(self, name: str, corpora: list, rows: list, year_list: list, pairs: list, props: np.ndarray,
+                 z: np.ndarray, p: np.ndarray, p_adjusted: np.ndarray, reject: np.ndarray,
+                 correction: [str, None], alpha: float):
+
+        self.name = name
+        self.corpora = corpora
+        self.rows = rows
+        self.years = year_list
+        self.pairs = pairs
+        self.props = props
+        self.z = z
+        self.p = p
+        self.p_adjusted = p_adjusted
+        self.reject = reject
+        self.correction = correction
+        self.alpha = alpha
+
+    @staticmethod
+    def _num(x):
+        """
+        Convert an array entry to a JSON number, with nan as None.
+        """
+
+        return None if np.isnan(x) else float(x)
+
+    def to_dict(self):
+        """
+        Nested {"<first> / <second>": {row: {year: metrics}}} dictionary of results.
+        """
+
+        ret = {}
+
+        for i, (a, b) in enumerate(self.pairs):
+
+            pair = ret["{0} / {1}".format(a, b)] = {}
+            first, second = self.corpora.index(a), self.corpora.index(b)
+
+            for r, row in enumerate(self.rows):
+
+                pair[row] = {}
+
+                for y, year in enumerate(self.years[:-1]):
+                    pair[row][year] = {
+                        "Proportions": [self._num(self.props[first, r, y]), self._num(self.props[second, r, y])],
+                        "Z-score": self._num(self.z[i, r, y]),
+                        "P value": self._num(self.p[i, r, y]),
+                        "Adjusted P value": self._num(self.p_adjusted[i, r, y]),
+                        "Significant": bool(self.reject[i, r, y])
+                    }
+
+        return ret
+
+    def significant(self):
+        """
+        List (pair, row, year, z score, adjusted p value) for every significant difference.
+        """
+
+        return [
+            (self.pairs[i], self.rows[r], self.years[y], float(self.z[i, r, y]), float(self.p_adjusted[i, r, y]))
+            for i, r, y in zip(*np.nonzero(self.reject))
+        ]
+
+    def _lines(self):
+        """
+        Lines of a text summary of the results.
+        """
+
+        ret = [
+            "{0}: {1} tests, p values adjusted with {2}, alpha = {3}\n"
+            .format(self.name, self.p.size, self.correction, self.alpha)
+        ]
+
+        for pair, rows in self.to_dict().items():
+            for row, years in rows.items():
+                for i in range(len(self.years) - 1):
+
+                    d = years[self.years[i]]
+
+                    ret.append(
+                        "________________\n"
+                        "{0}, {1}\n"
+                        "Period: {2} - {3}\n"
+                        "Proportions: {4}\n"
+                        "Z-score: {5}\n"
+                        "P value: {6}\n"
+                        "Adjusted P value: {7}\n"
+                        "Significant: {8}\n"
+                        .format(
+                            pair, row, str(self.years[i]), str(self.years[i+1]), d["Proportions"], d["Z-score"],
+                            d["P value"], d["Adjusted P value"], d["Significant"]
+                        )
+                    )
+
+        return ret
+
+    def display(self):
+        """
+        Display difference in proportions results in console.
+        """
+
+        for line in self._lines():
+            print(line)
+
+    def write(self, out_path: str):
+        """
+        Write difference in proportions results to file.
+        """
+
+        print("Writing results to file.")
+        with open(out_path, 'w') as t:
+            t.write("".join(self._lines()))
+
+    def write_to_json(self, out_path: str):
+        """
+        Write difference in proportions results to a JSON file.
+        """
+
+        with open(out_path, 'w', encoding='utf8') as out_file:
+            out_file.write(json.dumps(self.to_dict(), indent=4, ensure_ascii=False))
+
+
 class ScoreMatResults:
     """
-    Stores data that gets fed to clustering classes.
+    Stores data that gets fed to clustering classes: for each year period, a float32
+    author x keyword score matrix, with a parallel array of (sorted) author names.
+    Columns follow the key list.
     """
 
-    def __init__(self, d):
+    def __init__(self, d: dict, authors: [dict, None] = None, mats: [dict, None] = None):
 
         self.d = d
         self.y = self.d["metadata"]["YEARS"]
         self.k = self.d["metadata"]["KEYS"]
 
+        if mats is None:
+            authors, mats = self._arrays_from_dict(self.d["scores"], self.k)
+
+        self.authors = {}
+        self.mats = {}
+
+        for y in mats.keys():
+
+            a = np.asarray(authors[y], dtype=str)
+            order = np.argsort(a, kind='stable')
+
+            self.authors[y] = a[order]
+            self.mats[y] = np.asarray(mats[y], dtype=np.float32).reshape(len(a), len(self.k))[order]
+
+    @staticmethod
+    def _arrays_from_dict(scores: dict, key_list: list):
+        """
+        Convert a nested {year: {author: {keyword: score}}} dictionary to author & score arrays.
+        """
+
+        authors = {}
+        mats = {}
+
+        for y in scores.keys():
+
+            authors[y] = list(scores[y].keys())
+            mats[y] = np.array(
+                [[scores[y][a].get(k, 0) for k in key_list] for a in authors[y]], dtype=np.float32
+            ).reshape(len(authors[y]), len(key_list))
+
+        return authors, mats
+
+    def scores_dict(self):
+        """
+        Nested {year: {author: {keyword: score}}} dictionary of scores.
+        """
+
+        ret = {}
+
+        for y in self.mats.keys():
+
+            mat = self.mats[y].tolist()
+            ret[y] = {a: dict(zip(self.k, mat[i])) for i, a in enumerate(self.authors[y].tolist())}
+
+        return ret
+
+    @classmethod
+    def from_file(cls, path: str):
+        """
+        Load scores written by write_to_json or write_npz. Given a JSON file, the .npz
+        archive beside it is read instead if it's at least as recent.
+        """
+
+        npz_path = "{}.npz".format(os.path.splitext(path)[0])
+
+        if not path.endswith(".npz") and os.path.exists(npz_path) \
+                and os.path.getmtime(npz_path) >= os.path.getmtime(path):
+            path = npz_path
+
+        if path.endswith(".npz"):
+
+            with np.load(path) as data:
+
+                metadata = json.loads(str(data["metadata"]))
+                years = json.loads(str(data["years"]))
+
+                authors = {y: data["authors_{}".format(i)] for i, y in enumerate(years)}
+                mats = {y: data["scores_{}".format(i)] for i, y in enumerate(years)}
+
+            return cls({"metadata": metadata}, authors, mats)
+
+        with open(path, 'r', encoding='utf8') as in_file:
+            return cls(json.load(in_file))
+
     def debug_key_list(self):
 
         print("Key list: {}".format(", ".join(k for k in self.k)))
@@ -486,13 +691,33 @@ class ScoreMatResults:
 
         print("Year list: {}".format(", ".join(self.y)))
 
+    def write_npz(self, out_path):
+        """
+        Write score matrices to a compressed NumPy archive.
+        """
+
+        years = list(self.mats.keys())
+        arrays = {}
+
+        for i, y in enumerate(years):
+            arrays["authors_{}".format(i)] = self.authors[y]
+            arrays["scores_{}".format(i)] = self.mats[y]
+
+        np.savez_compressed(
+            out_path, metadata=np.array(json.dumps(self.d["metadata"])), years=np.array(json.dumps(years)), **arrays
+        )
+
     def write_to_json(self, out_path):
         """
-        Write TF-IDF scores data to file.
+        Write TF-IDF scores data to file, along with a .npz archive of the score matrices.
         """
 
+        d = {"scores": self.scores_dict(), "metadata": self.d["metadata"]}
+
         with open(out_path, 'w', encoding='utf8') as out_file:
-            out_file.write(json.dumps(self.d, indent=4, ensure_ascii=False))
+            out_file.write(json.dumps(d, indent=4, ensure_ascii=False))
+
+        self.write_npz("{}.npz".format(os.path.splitext(out_path)[0]))
 
 
 class ClusterResults:
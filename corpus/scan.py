@@ -0,0 +1,146 @@
+import tqdm
+
+from corpus.cache import CorpusCache
+from corpus.utils import *
+
+
+class VolumeConsumer:
+    """
+    Base class for analyses that are fed volumes by a CorpusScanner. Each
+    registered consumer sees every volume of a corpus once per scan, so any
+    number of analyses can share a single read & parse of the corpus.
+
+    Consumers must treat the volumes they are passed as read-only, since the
+    same object is handed to every other consumer in the scan.
+    """
+
+    def fields(self):
+        """
+        Fields of each volume this consumer reads, or None if it needs all of them.
+        When every consumer of a scan lists its fields, volumes are decoded with
+        only the union of those fields.
+        """
+
+        return None
+
+    def start(self):
+        """
+        Called once before the first volume is read.
+        """
+
+        pass
+
+    def consume(self, json_doc: str, key: str, volume: dict):
+        """
+        Called once for each volume in the corpus. json_doc is the path of the
+        file holding the volume relative to the corpus root, key is the volume's
+        key within that file.
+        """
+
+        raise NotImplementedError
+
+    def finish(self):
+        """
+        Called once after the last volume has been read.
+        """
+
+        pass
+
+
+class CorpusScanner:
+    """
+    Walks a corpus directory once, parses each volume file once, and feeds
+    every volume to each registered consumer. Volumes are read from the
+    corpus' columnar cache when one has been built, holds every field the
+    consumers read, and the file is unchanged, and from the JSON file
+    otherwise. JSON files are decoded with <decoder> (the fastest installed
+    by default, see corpus.decoders), keeping only the fields that the
+    consumers read.
+    """
+
+    def __init__(self, in_dir: str, consumers: [list, None] = None, use_cache: bool = True,
+                 progress: bool = True, decoder: [str, None] = None):
+
+        self.in_dir = in_dir
+        self.use_cache = use_cache
+        self.progress = progress
+        self.decoder = decoder
+        self.consumers = []
+
+        if consumers is not None:
+            for c in consumers:
+                self.register(c)
+
+    def register(self, consumer: VolumeConsumer):
+        """
+        Add a consumer to this scanner.
+        """
+
+        if not isinstance(consumer, VolumeConsumer):
+            raise TypeError("{} is not a VolumeConsumer.".format(type(consumer).__name__))
+
+        self.consumers.append(consumer)
+
+        return self
+
+    def fields(self):
+        """
+        Union of the fields read by the registered consumers, or None if any of them needs every field.
+        """
+
+        ret = set()
+
+        for c in self.consumers:
+
+            f = c.fields()
+
+            if f is None:
+                return None
+
+            ret.update(k for k in f if k is not None)
+
+        return ret
+
+    def _volumes(self, cache: [CorpusCache, None], json_doc: str, fields: [set, None]):
+        """
+        Return (key, volume) pairs for all volumes in a file.
+        """
+
+        if cache is not None and cache.is_fresh(json_doc):
+            return cache.volumes(json_doc)
+
+        json_data = read_volume_file(self.in_dir, json_doc, fields, self.decoder)
+
+        if json_data is None:
+            return []
+
+        return [(k, json_data[k]) for k in list(json_data.keys())]
+
+    def run(self, files: [list, None] = None):
+        """
+        Feed every volume in the corpus (or in an explicit list of files) to
+        each registered consumer.
+        """
+
+        if files is None:
+            files = list_volume_files(self.in_dir)
+
+        cache = CorpusCache.load(self.in_dir) if self.use_cache else None
+        fields = self.fields()
+
+        # consumers reading uncached fields (or every field) are fed from the JSON files
+        if cache is not None and not cache.covers(fields):
+            cache = None
+
+        for c in self.consumers:
+            c.start()
+
+        for json_doc in tqdm.tqdm(files, disable=not self.progress):
+            for k, volume in self._volumes(cache, json_doc, fields):
+                for c in self.consumers:
+                    c.consume(json_doc, k, volume)
+
+        for c in self.consumers:
+            c.finish()
+
+        return self
@@ -2,10 +2,14 @@ import os
 import sys
 import shutil
 import json
+import bisect
+import numpy as np
 
 from nltk.stem.snowball import SnowballStemmer
 from gensim import corpora
 
+from corpus.decoders import get_decoder, set_decoder
+
 
 def _fail(msg: str):
     """
@@ -97,18 +101,118 @@ def gensim_dict(alist: list):
     return results
 
 
+def prune_dicts(word_to_id: dict, no_below: [int, None] = None, no_above: [float, None] = None,
+                keep_n: [int, None] = None):
+    """
+    Prune the vocabulary of each gensim Dictionary in a dictionary built by gensim_dict,
+    keeping tokens that occur in at least <no_below> documents and in no more than a
+    <no_above> fraction of documents, then at most the <keep_n> most frequent of those.
+    Token ids are renumbered to be contiguous.
+    """
+
+    for item in word_to_id.keys():
+        word_to_id[item].filter_extremes(
+            no_below=no_below if no_below is not None else 0,
+            no_above=no_above if no_above is not None else 1.0,
+            keep_n=keep_n
+        )
+
+    return word_to_id
+
+
+class PeriodError(ValueError):
+    """
+    Raised when a date falls outside of the periods spanned by a year list.
+    """
+
+    def __init__(self, year, year_list: list):
+
+        self.year = year
+        self.year_list = year_list
+
+        super(PeriodError, self).__init__(
+            "{0} is not in range [{1}, {2}).".format(year, year_list[0], year_list[-1])
+        )
+
+
+class PeriodMapper:
+    """
+    Maps dates to the year periods of a year list. Period i spans
+    [year_list[i], year_list[i + 1]) and is identified by its first year.
+    Single dates are looked up with a binary search, batches of dates with
+    a single vectorized search over the period boundaries.
+    """
+
+    def __init__(self, year_list: list):
+
+        if len(year_list) < 2:
+            raise Exception("A year list needs at least two entries to define a period.\n")
+
+        if any(year_list[i] >= year_list[i + 1] for i in range(len(year_list) - 1)):
+            raise Exception("Years in a year list must be strictly increasing.\n")
+
+        self.year_list = list(year_list)
+        self.bounds = np.asarray(self.year_list)
+        self.first = self.year_list[0]
+        self.last = self.year_list[-1]
+
+    def __len__(self):
+
+        return len(self.year_list) - 1
+
+    def contains(self, year):
+        """
+        Check whether a date falls within one of the periods.
+        """
+
+        return self.first <= year < self.last
+
+    def period(self, year):
+        """
+        Return the first year of the period a date falls into.
+        """
+
+        if not self.first <= year < self.last:
+            raise PeriodError(year, self.year_list)
+
+        return self.year_list[bisect.bisect_right(self.year_list, year) - 1]
+
+    def indices(self, years):
+        """
+        Return the index of the period each of an array of dates falls
+        into, with -1 for dates outside of every period.
+        """
+
+        years = np.asarray(years)
+        ret = np.searchsorted(self.bounds, years, side='right') - 1
+        ret[(years < self.first) | (years >= self.last)] = -1
+
+        return ret
+
+    def periods(self, years):
+        """
+        Return the first year of the period each of an array of dates falls into.
+        """
+
+        years = np.asarray(years)
+        idx = self.indices(years)
+
+        if (idx < 0).any():
+            raise PeriodError(years[idx < 0][0].item(), self.year_list)
+
+        return self.bounds[idx]
+
+
 def determine_year(year: int, year_list: list):
     """
     Given a year and list of year periods,
     return which period that year falls into.
     """
 
-    for i in (range(len(year_list[:-1]))):
+    if not year_list[0] <= year < year_list[-1]:
+        raise PeriodError(year, year_list)
 
-        if year_list[i] <= year < year_list[i + 1]:
-            return year_list[i]
-
-    raise Exception("{} is not in range".format(year))
+    return year_list[bisect.bisect_right(year_list, year) - 1]
 
 
 def stem(word: str, language: [str, None] = 'english'):
@@ -143,6 +247,55 @@ def build_out(out_dir: str):
         raise Exception("Specify an output directory.\n")
 
 
+def list_volume_files(in_dir: str):
+    """
+    List paths (relative to in_dir) of all volume files in a corpus, skipping
+    hidden files and directories.
+    """
+
+    ret = []
+
+    for subdir, dirs, files in os.walk(in_dir):
+
+        dirs[:] = sorted(d for d in dirs if d[0] != ".")
+
+        for f in files:
+            if f[0] != ".":
+                ret.append(os.path.relpath(os.path.join(subdir, f), in_dir))
+
+    return sorted(ret)
+
+
+def file_stat(in_dir: str, json_doc: str):
+    """
+    Return [mtime, size] of a volume file, used to detect modified volumes.
+    """
+
+    st = os.stat(os.path.join(in_dir, json_doc))
+
+    return [st.st_mtime_ns, st.st_size]
+
+
+def read_volume_file(in_dir: str, json_doc: str, fields: [list, set, None] = None, decoder: [str, None] = None):
+    """
+    Load a single volume file, returns None if it could not be parsed. If fields
+    is set, each volume holds only those fields. decoder names the JSON decoder
+    to use (see corpus.decoders), by default the fastest installed.
+    """
+
+    with open(os.path.join(in_dir, json_doc), 'rb') as in_file:
+        data = in_file.read()
+
+    try:
+        return get_decoder(decoder).decode(data, set(fields) if fields is not None else None)
+
+    except ValueError:
+
+        print("Error loading file {}".format(json_doc))
+
+        return None
+
+
 def stop_words_from_json(file_path: str):
     """
     Set stop_words from Json file.
@@ -0,0 +1,89 @@
+import os
+import tqdm
+import traceback
+
+from multiprocessing import Pool
+
+
+# parse function of a worker process, set once per process rather than sent with every task
+_parse_file = None
+
+
+def _init_worker(parse_file):
+
+    global _parse_file
+
+    _parse_file = parse_file
+
+
+def _run_task(task):
+    """
+    Parse a single file, returning (task, None) on success or (task, error) if it raised.
+    """
+
+    try:
+        _parse_file(*task)
+    except Exception as e:
+        return task, "{0}: {1}\n{2}".format(type(e).__name__, e, traceback.format_exc())
+
+    return task, None
+
+
+def add_jobs_argument(parser, default: [int, None] = 1):
+    """
+    Add the -j option, the number of processes to parse files across, to an ArgumentParser.
+    """
+
+    parser.add_argument(
+        "-j", help="number of processes to parse files across", action="store", type=int, default=default
+    )
+
+    return parser
+
+
+def run_ingest(parse_file, tasks: list, workers: [int, None] = 1, chunksize: [int, None] = None,
+               desc: str = "Parsing files"):
+    """
+    Call parse_file(*task) for each task (a tuple of arguments, typically one file
+    and where to write it) across a pool of <workers> processes, or in this process
+    if workers is 1. None uses every core.
+
+    parse_file must be picklable, i.e. a module-level function, a functools.partial
+    of one, or a method of a picklable object. It's sent once to each worker, and
+    tasks are handed out in chunks of <chunksize> (by default, so that each worker
+    takes about four chunks). An exception raised while parsing a file is caught and
+    recorded, and the remaining files are still parsed. A summary of failed files
+    is printed at the end, and the list of (task, error) failures is returned.
+    """
+
+    tasks = [t if isinstance(t, tuple) else (t,) for t in tasks]
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    workers = max(1, min(workers, len(tasks)))
+
+    if workers == 1:
+        _init_worker(parse_file)
+        results = (_run_task(t) for t in tasks)
+        failures = [(t, e) for t, e in tqdm.tqdm(results, total=len(tasks), desc=desc) if e is not None]
+
+    else:
+
+        if chunksize is None:
+            chunksize = max(1, len(tasks) // (workers * 4))
+
+        with Pool(workers, initializer=_init_worker, initargs=(parse_file,)) as pool:
+            results = pool.imap_unordered(_run_task, tasks, chunksize)
+            failures = [(t, e) for t, e in tqdm.tqdm(results, total=len(tasks), desc=desc) if e is not None]
+
+    print("Parsed {0} of {1} files.".format(len(tasks) - len(failures), len(tasks)))
+
+    if len(failures) > 0:
+
+        print("Failed to parse {} files:".format(len(failures)))
+
+        for t, e in failures:
+            print("{0}\n\t{1}".format(", ".join(str(a) for a in t), e.split("\n")[0]))
+
+    return failures
@@ -1,10 +1,12 @@
 import argparse
-import tqdm
+
+from functools import partial
 
 from epub_conversion.utils import open_book, convert_epub_to_lines
 from html.parser import HTMLParser
 
 from parsing.utils import *
+from parsing.ingest import run_ingest, add_jobs_argument
 
 
 class Stripper(HTMLParser):
@@ -53,20 +55,31 @@ def _parse_book(epub_file):
     return ret
 
 
-def parse_books(input_dir, output_dir):
+def convert_book(epub_f, input_dir, output_dir):
+    """
+    Convert a single epub file to a text file.
+    """
+
+    book = _parse_book("{0}/{1}".format(input_dir, epub_f))
+
+    with open("{0}/{1}.txt".format(output_dir, epub_f[:-5]), 'w') as txt_out:
+
+        txt_out.write("\n".join(book))
+
+
+def parse_books(input_dir, output_dir, workers=1):
     """
     Convert a directory of epub files to a directory of text files.
     """
 
+    tasks = []
+
     for subdir, dirs, files in os.walk(input_dir):
-        for epub_f in tqdm.tqdm(files):
+        for epub_f in files:
             if epub_f[0] != "." and epub_f[-5:] == '.epub':
+                tasks.append((epub_f,))
 
-                book = _parse_book("{0}/{1}".format(input_dir, epub_f))
-
-                with open("{0}/{1}.txt".format(output_dir, epub_f[:-5]), 'w') as txt_out:
-
-                    txt_out.write("\n".join(book))
+    run_ingest(partial(convert_book, input_dir=input_dir, output_dir=output_dir), tasks, workers)
 
 
 if __name__ == '__main__':
@@ -74,6 +87,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", help="input directory", action="store")
     parser.add_argument("-o", help="output directory", action="store")
+    add_jobs_argument(parser)
 
     try:
         args = parser.parse_args()
@@ -82,5 +96,5 @@ if __name__ == '__main__':
 
     build_out(args.o)
 
-    parse_books(args.i, args.o)
+    parse_books(args.i, args.o, args.j)
 
@@ -1,6 +1,8 @@
-import csv, argparse, tqdm
+import csv, argparse
+from functools import partial
 from parsing.utils import *
 from parsing.parsed import Parsed
+from parsing.ingest import run_ingest, add_jobs_argument
 
 
 def parse_link(src):
@@ -52,37 +54,48 @@ def match_pub_info(idno, ids):
         if tup[0] == idno:
             return tup
 
-    fail("Could not match idno for {0}".format(str(idno)))
+    raise Exception("Could not match idno for {0}".format(str(idno)))
 
 
-def parse_txt(in_dir, ids, out_dir):
+def parse_file(txt_f, in_dir, ids, out_dir):
+    """
+    Parse a single Gutenberg text file to a JSON object.
+    """
+
+    reading = False
+    obj = Parsed()
+
+    with open(in_dir + txt_f, 'r', encoding='utf-8') as txt_in:
+        for line in txt_in:
+            if 'Posting Date' in line:
+                idno = get_idno(line)
+                pub_info = match_pub_info(idno, ids)
+                obj.a, obj.t, obj.y = pub_info[1], pub_info[2], pub_info[3]
+            if 'START OF THIS PROJECT GUTENBERG EBOOK' in line:
+                reading = True
+            if 'END OF THIS PROJECT GUTENBERG EBOOK' in line:
+                reading = False
+            if reading and 'START OF THIS PROJECT GUTENBERG EBOOK' not in line:
+                add_content(line, obj, 'german')
+
+    with open(out_dir + txt_f[:-4] + '.json', 'w', encoding='utf-8') as out:
+        out.write(build_json(obj))
+        out.close()
+
+
+def parse_txt(in_dir, ids, out_dir, workers=1):
     """
     Iterate over directory of Gutenberg text files, parse each volume to a JSON object.
     """
 
-    for subdir, dirs, files in os.walk(in_dir):
-        for txt_f in tqdm.tqdm(files):
+    tasks = []
 
+    for subdir, dirs, files in os.walk(in_dir):
+        for txt_f in files:
             if txt_f[0] != ".":
-                reading = False
-                obj = Parsed()
-
-                with open(in_dir + txt_f, 'r', encoding='utf-8') as txt_in:
-                    for line in txt_in:
-                        if 'Posting Date' in line:
-                            idno = get_idno(line)
-                            pub_info = match_pub_info(idno, ids)
-                            obj.a, obj.t, obj.y = pub_info[1], pub_info[2], pub_info[3]
-                        if 'START OF THIS PROJECT GUTENBERG EBOOK' in line:
-                            reading = True
-                        if 'END OF THIS PROJECT GUTENBERG EBOOK' in line:
-                            reading = False
-                        if reading and 'START OF THIS PROJECT GUTENBERG EBOOK' not in line:
-                            add_content(line, obj, 'german')
-
-                with open(out_dir + txt_f[:-4] + '.json', 'w', encoding='utf-8') as out:
-                    out.write(build_json(obj))
-                    out.close()
+                tasks.append((txt_f,))
+
+    run_ingest(partial(parse_file, in_dir=in_dir, ids=ids, out_dir=out_dir), tasks, workers)
 
 
 def main():
@@ -90,6 +103,7 @@ def main():
     parser.add_argument("-i", metavar='in-directory', action="store", help="input directory argument")
     parser.add_argument("-o", help="output directory argument", action="store")
     parser.add_argument("-csv", help="csv file with publication dates", action="store")
+    add_jobs_argument(parser)
 
     try:
         args = parser.parse_args()
@@ -103,7 +117,7 @@ def main():
     else:
         fail("Please specify input csv file path")
 
-    parse_txt(args.i, ids, args.o)
+    parse_txt(args.i, ids, args.o, args.j)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,9 @@
 import argparse, csv, zipfile
+from functools import partial
 import xml.etree.ElementTree as ET
 from parsing.utils import *
 from parsing.parsed import Parsed
+from parsing.ingest import run_ingest, add_jobs_argument
 
 
 def scan_for_htid(root):
@@ -44,36 +46,47 @@ def test_file_htid(htids, folder, xml_file):
         return [False, htid]
 
 
-def parse_files(in_dir, out_dir, htids, language):
+def parse_volume(folder, xml_file, htids, language, out_dir):
+    """
+    Parse a single HathiTrust volume (its METS XML file and the zipped pages in the same folder).
+    """
+
+    htid_test = test_file_htid(htids, folder, xml_file)
+
+    # test if htid in set of htids, store it and build file if true
+    if htid_test[0]:
+        htid = htid_test[1]
+        obj = Parsed()
+
+        # replace periods for file-naming
+        obj.h = htid.replace(".", "_")
+
+        try:
+            obj.a = htids[htid][0]
+            obj.t = htids[htid][1]
+            obj.y = htids[htid][2]
+        except KeyError:
+            print("File with HTID {0} not found in CSV reference file.".format(htid))
+        for zip_file in os.listdir(folder):
+            if zip_file[-4:] == ".zip":
+                with zipfile.ZipFile(folder + "/" + zip_file, 'r') as zf:
+                    for txt_file in zf.namelist():
+                        if txt_file[-4:] == ".txt":
+                            text = zf.read(txt_file).decode('utf-8')
+                            add_content(text, obj, language)
+        with open(out_dir + str(obj.h) + ".json", 'w', encoding='utf-8') as out:
+            out.write(build_json(obj))
+
+
+def parse_files(in_dir, out_dir, htids, language, workers=1):
+    tasks = []
     for folder, subfolders, files in os.walk(in_dir):
         if not subfolders:
             for xml_file in files:
                 if xml_file[-4:] == ".xml":
-                    htid_test = test_file_htid(htids, folder, xml_file)
-                    
-                    # test if htid in set of htids, store it and build file if true
-                    if htid_test[0]:
-                        htid = htid_test[1]
-                        obj = Parsed()
-                        
-                        # replace periods for file-naming
-                        obj.h = htid.replace(".", "_")
-                        
-                        try:
-                            obj.a = htids[htid][0]
-                            obj.t = htids[htid][1]
-                            obj.y = htids[htid][2]
-                        except KeyError:
-                            print("File with HTID {0} not found in CSV reference file.".format(htid))
-                        for zip_file in files:
-                            if zip_file[-4:] == ".zip":
-                                with zipfile.ZipFile(folder + "/" + zip_file, 'r') as zf:
-                                    for txt_file in zf.namelist():
-                                        if txt_file[-4:] == ".txt":
-                                            text = zf.read(txt_file).decode('utf-8')
-                                            add_content(text, obj, language)
-                            with open(out_dir + str(obj.h) + ".json", 'w', encoding='utf-8') as out:
-                                out.write(build_json(obj))
+                    tasks.append((folder, xml_file))
+
+    run_ingest(partial(parse_volume, htids=htids, language=language, out_dir=out_dir), tasks, workers)
 
 
 def main():
@@ -82,6 +95,7 @@ def main():
     parser.add_argument("-o", help='output directory', action="store")
     parser.add_argument("-x", help='in-directory for HT files', action="store")
     parser.add_argument("-lang", help='language corpus is in', action="store")
+    add_jobs_argument(parser)
 
     try:
         args = parser.parse_args()
@@ -97,7 +111,7 @@ def main():
     language = args.lang.lower()
     htids = build_htids(args.csv)
 
-    parse_files(args.x, args.o, htids, language)
+    parse_files(args.x, args.o, htids, language, args.j)
 
 
 if __name__ == '__main__':
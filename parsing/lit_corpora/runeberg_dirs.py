@@ -1,9 +1,11 @@
 import csv
 import argparse
-import tqdm
+
+from functools import partial
 
 from parsing.utils import *
 from parsing.parsed import Parsed
+from parsing.ingest import run_ingest, add_jobs_argument
 
 
 def csv_path(path_str):
@@ -34,42 +36,44 @@ def parse_csv(csv_in):
     return ids
 
 
-def parse_txt(in_dir, mappings, out_dir):
+def parse_vol(vol, in_dir, mappings, out_dir):
     """
-    Iterate over directory of Runeberg text files, parse each volume to a JSON object.
+    Parse a single Runeberg volume directory to a JSON object. Volumes missing from the mappings are skipped.
     """
 
-    for subdir, dirs, files in os.walk(in_dir):
-        for vol in tqdm.tqdm(dirs):
+    obj = Parsed()
+
+    try:
+        with open("{}/{}/title".format(in_dir, vol), 'r') as title_str:
+            id_str = title_str.read()
+        maps = mappings[id_str]
+    except KeyError:
+        return
 
-            if vol[0] != "." and vol != "":
+    obj.a = maps["AUTHOR"]
+    obj.t = maps["TITLE"]
+    obj.y = maps["PUBDATE"]
 
-                obj = Parsed()
+    for subdir, dirs, files in os.walk("{}/{}/Pages/".format(in_dir, vol)):
+        for text_f in files:
+            if text_f != "whole-page-ok.lst" and text_f[0] != ".":
+                with open("{}/{}/Pages/{}".format(in_dir, vol, text_f), 'r') as txt_in:
+                    for line in txt_in:
+                        add_content(line, obj, 'swedish')
 
-                try:
-                    with open("{}/{}/title".format(in_dir, vol), 'r') as title_str:
-                        id_str = title_str.read()
-                    maps = mappings[id_str]
-                    valid = True
-                except KeyError:
-                    valid = False
+    with open(out_dir + vol[:-4] + '.json', 'w', encoding='utf-8') as out:
+        out.write(build_json(obj))
+        out.close()
 
-                if valid:
 
-                    obj.a = maps["AUTHOR"]
-                    obj.t = maps["TITLE"]
-                    obj.y = maps["PUBDATE"]
+def parse_txt(in_dir, mappings, out_dir, workers=1):
+    """
+    Iterate over directory of Runeberg volume directories, parse each volume to a JSON object.
+    """
 
-                    for subdir, dirs, files in os.walk("{}/{}/Pages/".format(in_dir, vol)):
-                        for text_f in files:
-                            if text_f != "whole-page-ok.lst" and text_f[0] != ".":
-                                with open("{}/{}/Pages/{}".format(in_dir, vol, text_f), 'r') as txt_in:
-                                    for line in txt_in:
-                                        add_content(line, obj, 'swedish')
+    tasks = [(vol,) for vol in sorted(next(os.walk(in_dir))[1]) if vol[0] != "."]
 
-                    with open(out_dir + vol[:-4] + '.json', 'w', encoding='utf-8') as out:
-                        out.write(build_json(obj))
-                        out.close()
+    run_ingest(partial(parse_vol, in_dir=in_dir, mappings=mappings, out_dir=out_dir), tasks, workers)
 
 
 if __name__ == '__main__':
@@ -77,6 +81,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", help="input directory", action="store")
     parser.add_argument("-o", help="output directory", action="store")
+    add_jobs_argument(parser)
 
     try:
         args = parser.parse_args()
@@ -89,4 +94,4 @@ if __name__ == '__main__':
 
     mappings = parse_csv(csv_path(dir_path))
 
-    parse_txt(args.i, mappings, args.o)
\ No newline at end of file
+    parse_txt(args.i, mappings, args.o, args.j)
\ No newline at end of file
@@ -1,9 +1,11 @@
 import csv
 import argparse
-import tqdm
+
+from functools import partial
 
 from parsing.utils import *
 from parsing.parsed import Parsed
+from parsing.ingest import run_ingest, add_jobs_argument
 
 
 def csv_path(path_str):
@@ -34,35 +36,45 @@ def parse_csv(csv_in):
     return ids
 
 
-def parse_txt(in_dir, mappings, out_dir):
+def parse_file(txt_f, in_dir, mappings, out_dir):
     """
-    Iterate over directory of Runeberg text files, parse each volume to a JSON object.
+    Parse a single Runeberg text file to a JSON object. Files missing from the mappings are skipped.
     """
 
-    for subdir, dirs, files in os.walk(in_dir):
-        for txt_f in tqdm.tqdm(files):
+    obj = Parsed()
 
-            if txt_f[0] != ".":
+    id_str = txt_f[:-4]
+    try:
+        maps = mappings[id_str]
+    except KeyError:
+        return
+
+    obj.a = maps["AUTHOR"]
+    obj.t = maps["TITLE"]
+    obj.y = maps["PUBDATE"]
 
-                obj = Parsed()
+    with open(in_dir + txt_f, 'r', encoding='utf-8') as txt_in:
+        for line in txt_in:
+            add_content(line, obj, 'swedish')
 
-                id_str = txt_f[:-4]
-                try:
-                    maps = mappings[id_str]
+    with open(out_dir + txt_f[:-4] + '.json', 'w', encoding='utf-8') as out:
+        out.write(build_json(obj))
+        out.close()
 
-                    obj.a = maps["AUTHOR"]
-                    obj.t = maps["TITLE"]
-                    obj.y = maps["PUBDATE"]
 
-                    with open(in_dir + txt_f, 'r', encoding='utf-8') as txt_in:
-                        for line in txt_in:
-                            add_content(line, obj, 'swedish')
+def parse_txt(in_dir, mappings, out_dir, workers=1):
+    """
+    Iterate over directory of Runeberg text files, parse each volume to a JSON object.
+    """
+
+    tasks = []
+
+    for subdir, dirs, files in os.walk(in_dir):
+        for txt_f in files:
+            if txt_f[0] != ".":
+                tasks.append((txt_f,))
 
-                    with open(out_dir + txt_f[:-4] + '.json', 'w', encoding='utf-8') as out:
-                        out.write(build_json(obj))
-                        out.close()
-                except KeyError:
-                    pass
+    run_ingest(partial(parse_file, in_dir=in_dir, mappings=mappings, out_dir=out_dir), tasks, workers)
 
 
 if __name__ == '__main__':
@@ -70,6 +82,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", help="input directory", action="store")
     parser.add_argument("-o", help="output directory", action="store")
+    add_jobs_argument(parser)
 
     try:
         args = parser.parse_args()
@@ -82,4 +95,4 @@ if __name__ == '__main__':
 
     mappings = parse_csv(csv_path(dir_path))
 
-    parse_txt(args.i, mappings, args.o)
+    parse_txt(args.i, mappings, args.o, args.j)
@@ -1,8 +1,9 @@
 import argparse, csv
 import xml.etree.ElementTree as ET
-from multiprocessing import Pool
+from functools import partial
 from parsing.utils import *
 from parsing.parsed import Parsed
+from parsing.ingest import run_ingest, add_jobs_argument
 
 
 # This script navigates through a directory of XML files (organized according to
@@ -257,8 +258,7 @@ def get_pub_dates(csv_in):
     return refs
 
 
-def parse_threaded(xml_doc, input_doc, output_doc, csv_in):
-    refs = get_pub_dates(csv_in)
+def parse_file(xml_doc, input_doc, output_doc, refs):
     tree = ET.parse(input_doc + xml_doc)
     root = tree.getroot()
     obj = Parsed()
@@ -279,11 +279,17 @@ def parse_threaded(xml_doc, input_doc, output_doc, csv_in):
             pass
 
 
+def parse_threaded(xml_doc, input_doc, output_doc, csv_in):
+    refs = get_pub_dates(csv_in)
+    parse_file(xml_doc, input_doc, output_doc, refs)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", metavar='in-directory', action="store", help="input directory argument")
     parser.add_argument("-o", help="output directory argument", action="store")
     parser.add_argument("-csv", help="csv file with publication dates", action="store")
+    add_jobs_argument(parser, None)
 
     try:
         args = parser.parse_args()
@@ -307,12 +313,12 @@ def main():
     for subdir, dirs, files in os.walk(args.i):
         for xmldoc in files:
             if xmldoc[0] != ".":
-                thread_files.append((xmldoc, args.i, args.o, args.csv))
+                thread_files.append((xmldoc,))
+
+    # publication dates are read once, rather than once per file
+    refs = get_pub_dates(args.csv)
 
-    pool = Pool()
-    pool.starmap(parse_threaded, thread_files)
-    pool.close()
-    pool.join()
+    run_ingest(partial(parse_file, input_doc=args.i, output_doc=args.o, refs=refs), thread_files, args.j)
 
 
 if __name__ == '__main__':
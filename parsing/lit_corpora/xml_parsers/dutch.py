@@ -1,11 +1,12 @@
 import json
+import argparse
 
-from multiprocessing import Pool
 from bs4 import BeautifulSoup
 from pprint import pprint
 
 from parsing.utils import *
 from parsing.parsed import Parsed
+from parsing.ingest import run_ingest, add_jobs_argument
 
 
 class DutchParser:
@@ -138,34 +139,43 @@ class DutchParser:
 
         f.close()
 
-    def parse_files(self):
+    def parse_files(self, workers=1):
         """
-        Loop over a directory and parse all xml files.
+        Loop over a directory and parse all xml files, across <workers> processes.
         """
 
         os.makedirs(self.output_dir, exist_ok=True)
+        tasks = []
 
         for subdir, dirs, files in os.walk(self.input_dir):
             for xml_doc in files:
                 if xml_doc[-3:] == 'xml':
                     if xml_doc[:-4] in self.mapping:
-                        self._parse_files(xml_doc, subdir)
+                        tasks.append((xml_doc, subdir))
 
-    def parse_files_threaded(self):
+        return run_ingest(self._parse_files, tasks, workers)
+
+    def parse_files_threaded(self, workers=None):
         """
-        Same as above but multi-threaded.
+        Same as above but multi-process, across every core by default.
         """
 
-        os.makedirs(self.output_dir, exist_ok=True)
-        thread_files = []
+        return self.parse_files(workers)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", help="input directory", action="store")
+    parser.add_argument("-o", help="output directory", action="store", default="/tmp/DM_parsed/")
+    add_jobs_argument(parser)
+
+    try:
+        args = parser.parse_args()
+    except IOError:
+        fail("IOError")
+
+    DutchParser(args.i, args.o).parse_files(args.j)
 
-        for subdir, dirs, files in os.walk(self.input_dir):
-            for xml_doc in files:
-                if xml_doc[-3:] == 'xml':
-                    if xml_doc[:-9] in self.mapping:
-                        thread_files.append((xml_doc, subdir))
 
-        pool = Pool()
-        pool.starmap(self._parse_files, thread_files)
-        pool.close()
-        pool.join()
+if __name__ == '__main__':
+    main()
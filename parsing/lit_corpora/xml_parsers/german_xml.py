@@ -1,7 +1,9 @@
-import argparse, csv, tqdm
+import argparse, csv
 import xml.etree.ElementTree as ET
+from functools import partial
 from parsing.utils import *
 from parsing.parsed import Parsed
+from parsing.ingest import run_ingest, add_jobs_argument
 
 
 def get_text(root, file):
@@ -95,11 +97,26 @@ def get_pub_info(ids, base_url):
             return [author, title, year]
 
 
+def parse_file(xmldoc, in_dir, ids, out_dir):
+    tree = ET.parse(in_dir + xmldoc)
+    root = tree.getroot()
+    base_url = get_id(root)
+    obj = Parsed()
+    get_text(root, obj)
+    if len(obj.c) > 0:
+        pub_info = get_pub_info(ids, base_url)
+        obj.a, obj.t, obj.y = pub_info[0], pub_info[1], pub_info[2]
+        with open(out_dir + xmldoc[:-4] + '.json', 'w', encoding='utf-8') as out:
+            out.write(build_json(obj))
+            out.close()
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", metavar='in-directory', action="store", help="input directory argument")
     parser.add_argument("-o", help="output directory argument", action="store")
     parser.add_argument("-csv", help="csv file with publication dates", action="store")
+    add_jobs_argument(parser)
 
     try:
         args = parser.parse_args()
@@ -113,20 +130,14 @@ def main():
     else:
         fail("Please specify input csv file path")
 
+    tasks = []
+
     for subdir, dirs, files in os.walk(args.i):
-        for xmldoc in tqdm.tqdm(files):
+        for xmldoc in files:
             if xmldoc[0] != ".":
-                tree = ET.parse(args.i + xmldoc)
-                root = tree.getroot()
-                base_url = get_id(root)
-                obj = Parsed()
-                get_text(root, obj)
-                if len(obj.c) > 0:
-                    pub_info = get_pub_info(ids, base_url)
-                    obj.a, obj.t, obj.y = pub_info[0], pub_info[1], pub_info[2]
-                    with open(args.o + xmldoc[:-4] + '.json', 'w', encoding='utf-8') as out:
-                        out.write(build_json(obj))
-                        out.close()
+                tasks.append((xmldoc,))
+
+    run_ingest(partial(parse_file, in_dir=args.i, ids=ids, out_dir=args.o), tasks, args.j)
 
 
 if __name__ == '__main__':
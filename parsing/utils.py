@@ -2,12 +2,22 @@ import json
 import re
 import os
 import shutil
+import functools
 
 from nltk.stem.snowball import SnowballStemmer
 from nltk.corpus import stopwords
 from parsing.parsed import Parsed, RedditComment
 
 
+# number of distinct words whose stems are memoized, per language
+STEM_MEMO_SIZE = 2 ** 18
+
+# separators between words, and between sentences of plain text & of BeautifulSoup output
+TOKEN_SPLIT = re.compile(r'\W[0-9]*')
+SENTENCE_SPLIT = '(?<=[.!?]) +'
+BS_SENTENCE_SPLIT = '[.!?]'
+
+
 def fail(msg: str):
     """
     Print error and exit program.
@@ -107,38 +117,7 @@ def add_content(text: str, file: Parsed, language: str):
     Transforms text into raw/filtered/stemmed forms and adds it to a file object.
     """
 
-    sentences = re.split('(?<=[.!?]) +', text)
-
-    for sentence in sentences:
-        sentence = clean_text(sentence)
-
-        if len(sentence) > 1:
-            file.add_content_sent(" ".join(sentence))
-            sentence_stemmed = stem_text(sentence, language)
-            file.add_stemmed_sent(" ".join(sentence_stemmed))
-            sentence_filtered = filter_text(sentence, language)
-
-            if len(sentence_filtered) > 1:
-                file.add_filtered_sent(" ".join(sentence_filtered))
-                sentence_filtered_stemmed = stem_text(sentence_filtered, language)
-                file.add_filtered_stemmed_sent(" ".join(sentence_filtered_stemmed))
-
-    text_list = clean_text(text)
-
-    # full text
-    file.add_content(text_list)
-
-    # stem the full text
-    stemmed = stem_text(text_list, language)
-    file.add_stemmed(stemmed)
-
-    # filter the unstemmed full text
-    filtered = filter_text(text_list, language)
-    file.add_filtered(filtered)
-
-    # stem the filtered text
-    filtered_stemmed = stem_text(filtered, language)
-    file.add_filtered_stemmed(filtered_stemmed)
+    add_text(text, file, language, SENTENCE_SPLIT)
 
 
 def add_reddit_content(text: str, file: RedditComment):
@@ -146,22 +125,7 @@ def add_reddit_content(text: str, file: RedditComment):
     Add content to Reddit volume.
     """
 
-    text_list = clean_text(text)
-
-    # full text
-    file.add_content(text_list)
-
-    # stem the full text
-    stemmed = stem_text(text_list, "english")
-    file.add_stemmed(stemmed)
-
-    # filter the unstemmed full text
-    filtered = filter_text(text_list, "english")
-    file.add_filtered(filtered)
-
-    # stem the filtered text
-    filtered_stemmed = stem_text(filtered, "english")
-    file.add_filtered_stemmed(filtered_stemmed)
+    add_text(text, file, "english", None)
 
 
 def add_xml_content(root, file: Parsed, language: str):
@@ -177,75 +141,97 @@ def add_xml_content(root, file: Parsed, language: str):
         text += ' ' + root.tail
 
     if text != '':
-        sentences = re.split('(?<=[.!?]) +', text)
+        add_text(text, file, language, SENTENCE_SPLIT)
+
+
+def add_bs_xml_content(text: str, f: Parsed, lang: str):
+    """
+    Add content to Parsed object from BeautifulSoup XML parser output.
+    """
 
-        for sentence in sentences:
-            sentence = clean_text(sentence)
+    add_text(text, f, lang, BS_SENTENCE_SPLIT)
 
-            if len(sentence) > 1:
-                file.add_content_sent(" ".join(sentence))
-                sentence_stemmed = stem_text(sentence, language)
-                file.add_stemmed_sent(" ".join(sentence_stemmed))
-                sentence_filtered = filter_text(sentence, language)
 
-                if len(sentence_filtered) > 1:
-                    file.add_filtered_sent(" ".join(sentence_filtered))
-                    sentence_filtered_stemmed = stem_text(sentence_filtered, language)
-                    file.add_filtered_stemmed_sent(" ".join(sentence_filtered_stemmed))
+def add_text(text: str, file: [Parsed, RedditComment], language: str, sentence_split: [str, None]):
+    """
+    Tokenize text once and add its raw, stemmed, filtered and filtered stemmed forms to a
+    file object, for the full text and (unless sentence_split is None) for each sentence
+    of more than one word. All eight forms are slices of the same token and stem lists,
+    so each word is stemmed once.
+    """
 
-        text_list = clean_text(text)
+    processor = text_processor(language)
 
-        # full text
-        file.add_content(text_list)
+    tokens, starts = tokenize(text, sentence_split)
+    stems = processor.stem(tokens)
+    keep = [w not in processor.stop_words for w in tokens]
 
-        # stem the full text
-        stemmed = stem_text(text_list, language)
-        file.add_stemmed(stemmed)
+    if sentence_split is not None:
 
-        # filter the unstemmed full text
-        filtered = filter_text(text_list, language)
-        file.add_filtered(filtered)
+        bounds = starts + [len(tokens)]
 
-        # stem the filtered text
-        filtered_stemmed = stem_text(filtered, language)
-        file.add_filtered_stemmed(filtered_stemmed)
+        for i in range(len(starts)):
 
+            begin, end = bounds[i], bounds[i + 1]
 
-def add_bs_xml_content(text: str, f: Parsed, lang: str):
+            if end - begin > 1:
+
+                file.add_content_sent(" ".join(tokens[begin:end]))
+                file.add_stemmed_sent(" ".join(stems[begin:end]))
+
+                filtered = [j for j in range(begin, end) if keep[j]]
+
+                if len(filtered) > 1:
+                    file.add_filtered_sent(" ".join(tokens[j] for j in filtered))
+                    file.add_filtered_stemmed_sent(" ".join(stems[j] for j in filtered))
+
+    # full text
+    file.add_content(tokens)
+    file.add_stemmed(stems)
+    file.add_filtered([w for w, k in zip(tokens, keep) if k])
+    file.add_filtered_stemmed([w for w, k in zip(stems, keep) if k])
+
+
+def tokenize(text: str, sentence_split: [str, None] = None):
     """
-    Add content to Parsed object from BeautifulSoup XML parser output.
+    Split text into the same tokens as clean_text, along with the index of the first
+    token of each sentence, where sentences are separated by matches of sentence_split.
     """
 
-    sentences = re.split("[.!?]", text)
+    tokens = []
+    token_offsets = []
+    prev = 0
 
-    for sentence in sentences:
+    for m in TOKEN_SPLIT.finditer(text):
+        tokens.append(text[prev:m.start()])
+        token_offsets.append(prev)
+        prev = m.end()
 
-        s = clean_text(sentence)
+    tokens.append(text[prev:])
+    token_offsets.append(prev)
 
-        if len(s) > 1:
+    sentence_bounds = [m.end() for m in re.finditer(sentence_split, text)] if sentence_split is not None else []
 
-            f.add_content_sent(" ".join(s))
-            s_stem = stem_text(s, lang)
-            f.add_stemmed_sent(" ".join(s_stem))
-            s_filt = filter_text(s, lang)
+    ret = []
+    starts = [0]
+    sentence = 0
 
-            if len(s_filt) > 1:
+    for t, offset in zip(tokens, token_offsets):
 
-                f.add_filtered_sent(" ".join(s_filt))
-                s_filt_stem = stem_text(s_filt, lang)
-                f.add_filtered_stemmed_sent(" ".join(s_filt_stem))
+        if t == "" or t == "None":
+            continue
 
-    text_list = clean_text(text)
-    f.add_content(text_list)
+        # sentence bounds fall on separators, so a token never spans two sentences
+        while sentence < len(sentence_bounds) and offset >= sentence_bounds[sentence]:
+            sentence += 1
+            starts.append(len(ret))
 
-    stem = stem_text(text_list, lang)
-    f.add_stemmed(stem)
+        ret.append(t.lower())
 
-    filt = filter_text(text_list, lang)
-    f.add_filtered(filt)
+    while len(starts) <= len(sentence_bounds):
+        starts.append(len(ret))
 
-    filt_stem = stem_text(filt, lang)
-    f.add_filtered_stemmed(filt_stem)
+    return ret, starts
 
 
 def clean_text(text: str):
@@ -254,7 +240,7 @@ def clean_text(text: str):
     """
 
     # strip each word of non-alphabetic characters
-    text_list = re.split('\W[0-9]*', text)
+    text_list = TOKEN_SPLIT.split(text)
 
     for i in range(len(text_list) - 1, -1, -1):
 
@@ -267,17 +253,54 @@ def clean_text(text: str):
     return text_list
 
 
-def filter_text(text: list, language: str):
+class TextProcessor:
     """
-    Remove stop words from text
+    Stop word filtering and stemming for a single language. Stop words are loaded
+    once into a frozenset and a single stemmer is reused. Since a few words make up
+    most of any text, stems are memoized in a bounded LRU cache of <memo_size> words.
     """
 
-    filtered_words = set(stopwords.words(language))
+    def __init__(self, language: str, memo_size: [int, None] = STEM_MEMO_SIZE):
+
+        self.language = language
+        self.stop_words = frozenset(stopwords.words(language))
+        self.stemmer = SnowballStemmer(language)
+        self.stem_word = functools.lru_cache(maxsize=memo_size)(self.stemmer.stem)
+
+    def filter(self, text: list):
+        """
+        Return the words of a list of text that aren't stop words.
+        """
+
+        stop_words = self.stop_words
+
+        return [w for w in text if w not in stop_words]
+
+    def stem(self, text: list):
+        """
+        Return the stems of the words in a list of text.
+        """
+
+        stem_word = self.stem_word
 
-    for i in range(len(text) - 1, -1, -1):
+        return [stem_word(w) for w in text]
 
-        if text[i] in filtered_words:
-            del text[i]
+
+@functools.lru_cache(maxsize=None)
+def text_processor(language: str):
+    """
+    Return the TextProcessor of a language, built on first use.
+    """
+
+    return TextProcessor(language)
+
+
+def filter_text(text: list, language: str):
+    """
+    Remove stop words from text
+    """
+
+    text[:] = text_processor(language).filter(text)
 
     return text
 
@@ -287,10 +310,4 @@ def stem_text(text: list, language: str):
     Stem words in a list of text.
     """
 
-    stemmer = SnowballStemmer(language)
-    stemmed = []
-
-    for word in text:
-        stemmed.append(stemmer.stem(word))
-
-    return stemmed
+    return text_processor(language).stem(text)